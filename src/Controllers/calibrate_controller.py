@@ -12,6 +12,7 @@
 #             Department of Interior (DOI)
 #########################################################
 from Controllers import polyline_controller
+from Models import density_model
 from Models import rectangle_model
 from Models import zoom_model
 from Views import calibrate_view
@@ -40,6 +41,7 @@ class Controller():
         self.clicks = 0
         self.click_points = []
         self.averages = []
+        self.density_model = density_model.Model()
 
         # Setting pixels per unit cursor
         image = wx.Image(self.dicom_view.get_main_dir() + os.sep + "images" + os.sep + "cursor_ppu.png", wx.BITMAP_TYPE_PNG)
@@ -55,6 +57,11 @@ class Controller():
                                         self.density, self.min_thickness,
                                         self.max_thickness)
 
+    def get_extent(self):
+        if self.polyline_controller:
+            return self.polyline_controller.get_extent()
+        return self.model.get_extent()
+
     def rotate_lines(self, cx, cy, deg=-90):
         self.model.rotate_lines(cx, cy)
 
@@ -161,34 +168,8 @@ class Controller():
 
     def calculate_averages(self):
         """ Calculates the average grayscale value per column in the selected area. """
-        averages = []
-
-        # Find longest side
-        deltaX = int(math.fabs(self.model.sx - self.model.dx))
-        deltaY = int(math.fabs(self.model.sy - self.model.dy))
-
-        if deltaX > deltaY:
-            # Columns along X axis
-            # Rows along Y axis
-            for i in xrange(int(self.model.sx), int(self.model.dx)):
-                sum = 0.0
-                for j in xrange(int(self.model.sy), int(self.model.dy)):
-                    sum = sum + self.dicom_view.model.image_array[j][i][0]
-                sum = sum / (deltaY + 1)
-                sum = int(sum * 256) # 0 - 255 scale
-                averages.append(sum)
-        else:
-            # Columns along Y axis
-            # Rows along X axis
-            for i in xrange(int(self.model.sy), int(self.model.dy)):
-                sum = 0.0
-                for j in xrange(int(self.model.sx), int(self.model.dx)):
-                    sum = sum + self.dicom_view.model.image_array[j][i][0]
-                sum /= (deltaX + 1)
-                sum = int(sum * 256) # 0 - 255 scale
-                averages.append(sum)
-
-        return averages
+        return self.density_model.column_averages(self.dicom_view.model, self.model.sx, self.model.sy,
+                                                  self.model.dx, self.model.dy)
 
     def on_set_pixel_unit(self, event):
         if self.view is None:
@@ -203,13 +184,10 @@ class Controller():
         self.dicom_view.controller.calib = True
 
     def update_calib_data(self):
-        # Load in original dicom pixel data and normalize
-        calib_region = self.dicom_view.model.ds.pixel_array.astype(np.double)
-        calib_region = self.dicom_view.model.normalize_intensity(calib_region)
-
-        # Cut down dicom pixel data to user defined calibration region
+        # Load in the user defined calibration region of the original
+        # dicom pixel data, normalized
         x, y, dx, dy = self.dicom_view.controller.calib_region
-        calib_region = calib_region[y:dy-1, x:dx-1]
+        calib_region = self.dicom_view.model.get_normalized_region(x, y, dx-1, dy-1)
 
         # Find out which side of the rectangle is longer (width or height)
         if math.fabs(dx - x) > math.fabs(dy - y):
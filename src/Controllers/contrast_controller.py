@@ -4,15 +4,82 @@
 # @author:    Luke Mueller
 # @contact:   muellelj@eckerd.edu or lmueller62@gmail.com
 #
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
 # @copyright: owned and maintained by the
 #             US Geological Survey (USGS),
 #             Department of Interior (DOI)
 #########################################################
+from Models import contrast_model
+from Models import zoom_model
+from lib import profiler
 from Views import contrast_view
 
 class Controller():
-    
+    """ Controls the window/level and gamma of the displayed image. While
+    the user drags a slider, only the visible tiles of the display buffer
+    are re-rendered; the rest are rendered as they're scrolled into view.
+    """
+
     def __init__(self, dicom_view, model):
         self.dicom_view = dicom_view
+        self.dicom_controller = dicom_view.controller
         self.model = model
-        self.view = contrast_view.View(self, self.dicom_view, self.model)
+        self.zoom_model = zoom_model.Model()
+        self.contrast_model = contrast_model.Model(self.model.raw_array)
+        self.view = contrast_view.View(self, self.dicom_view, self.contrast_model)
+
+    def on_slider(self, event):
+        """ Invoked while the user drags one of the contrast sliders """
+        window, level, gamma, invert = self.view.get_values()
+        self.contrast_model.set_contrast(window, level, gamma, invert)
+        self.view.update_window()
+        self.render_visible()
+
+    def on_release(self, event):
+        """ Invoked when the user lets go of a slider """
+        event.Skip()
+        self.dicom_controller.refresh_overview()
+        self.dicom_controller.state_changed(True)
+
+    def on_reset(self, event):
+        self.contrast_model.reset()
+        self.contrast_model.invalidate()
+        self.view.set_values(self.contrast_model)
+        self.view.update_window()
+        self.render_visible()
+        self.dicom_controller.refresh_overview()
+
+    def on_rotate(self):
+        """ Keeps the native pixel data in step with the rotated display buffer """
+        self.contrast_model.set_raw(self.model.raw_array)
+
+    def render_visible(self, redraw=True):
+        """ Renders the dirty tiles within the viewable area and redraws
+        the canvas if any of them changed.
+
+        @var redraw - False if the caller redraws the canvas itself
+        """
+        rect = self.zoom_model.get_viewable_rect(self.dicom_view)
+        with profiler.Timer('contrast render'):
+            tiles = self.contrast_model.render(self.model.get_image(), rect)
+        profiler.count('contrast tiles rendered', tiles)
+        if tiles:
+            self.refresh(redraw)
+
+    def render_all(self):
+        """ Renders every remaining dirty tile. Used before anything that
+        needs the full display buffer (e.g. exporting the image).
+        """
+        if self.contrast_model.render(self.model.get_image()):
+            self.refresh()
+
+    def refresh(self, redraw=True):
+        for image in self.dicom_view.axes.images:
+            image.changed()
+        if redraw:
+            self.dicom_controller.cache_background()
+
+    def on_close(self, event):
+        self.view.Hide()
@@ -27,6 +27,9 @@ class Controller():
     def get_shape(self):
         return self.model.get_shape()
 
+    def get_extent(self):
+        return self.model.get_extent()
+
     def rotate_lines(self, cx, cy):
         self.model.rotate_lines(cx, cy)
 
@@ -0,0 +1,68 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+from lib import memory_tracker
+from lib import profiler
+from Views import debug_view
+import wx
+
+class Controller():
+    """ Shows the timers and counters collected by lib/profiler in a
+    debug panel (toggled with the 'd' key) and saves them as a JSON trace.
+    """
+
+    REFRESH_INTERVAL = 1000 # milliseconds
+
+    def __init__(self, dicom_controller):
+        self.dicom_controller = dicom_controller
+        self.view = debug_view.View(self, dicom_controller.view)
+        self.timer = wx.Timer(self.view)
+        self.view.Bind(wx.EVT_TIMER, self.on_timer, self.timer)
+        self.populate_table()
+        self.timer.Start(self.REFRESH_INTERVAL)
+
+    def populate_table(self):
+        rows = []
+        for name, count, total, mean, minimum, maximum, last in profiler.get_timers():
+            rows.append((name, str(count), '%.1f' % (total * 1000), '%.2f' % (mean * 1000),
+                         '%.2f' % (maximum * 1000), '%.2f' % (last * 1000)))
+        for name, value in profiler.get_counters():
+            rows.append((name, str(value), '', '', '', ''))
+        for subsystem, nbytes in memory_tracker.get_usage().items():
+            rows.append(('memory: ' + subsystem, '%.1f MB' % (nbytes / 1048576.0), '', '', '', ''))
+        self.view.set_rows(rows)
+
+    def on_timer(self, event):
+        if self.view.IsShown():
+            self.populate_table()
+
+    def on_reset(self, event):
+        profiler.reset()
+        self.populate_table()
+
+    def on_save(self, event):
+        dialog = wx.FileDialog(self.view, "Save Trace", style=wx.SAVE|wx.OVERWRITE_PROMPT, wildcard='JSON Trace (*.json)|*.json')
+        dialog.SetFilename('cxv_trace.json')
+        if dialog.ShowModal() == wx.ID_OK:
+            profiler.dump(dialog.GetPath())
+        dialog.Destroy()
+
+    def toggle(self):
+        """ Shows the debug panel if it's hidden; hides it otherwise """
+        if self.view.IsShown():
+            self.view.Hide()
+        else:
+            self.populate_table()
+            self.view.Show()
+            self.view.Raise()
+
+    def on_close(self, event):
+        self.view.Hide()
+        self.dicom_controller.debug = False
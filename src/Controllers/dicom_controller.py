@@ -11,33 +11,45 @@
 #             US Geological Survey (USGS),
 #             Department of Interior (DOI)
 #########################################################
-from Controllers import calibrate_controller
-from Controllers import contrast_controller
-from Controllers import coral_controller
-from Controllers import dxf_controller
-from Controllers import density_controller
-from Controllers import image_info_controller
-from Controllers import overlay_controller
-from Controllers import overview_controller
-from Controllers import polyline_controller
-from Controllers import xml_controller
+# The remaining controllers (and their scipy, yapsy, dxfwrite and chilkat
+# imports) are imported by the handlers that first need them, which keeps
+# them off of the startup path.
 from Controllers import zoom_controller
 from Models import dicom_model
+from Models import workspace_model
 from Models import zoom_model
-from lib import browse_dialog
+from Models.zoom_model import clamp_aspect
+from lib import buffer_pool
+from lib import jobs
+from lib import memory_tracker
+from lib import plugin_loader
+from lib import profiler
 from lib import progress_bar
-from lib import save_session
+from lib import redraw_scheduler
 from Views import dicom_view
+from matplotlib.transforms import Bbox
 #import Image # PIL (Python Image Library)
 import math
 import os
 import re
+import time
 import wx
 
 class Controller():
+
+    # Tools that need an open image
+    IMAGE_TOOLS = ['Image Overview', 'Image Information', 
+                   'Pan Image', 'Zoom In', 'Zoom Out', 
+                   'Adjust Contrast', 'Adjust Target Area', 'Draw Polylines',
+                   'Adjust Calibration Region', 'Rotate Image']
+    LOAD_STEPS = 10 # progress bar steps of a DICOM load
+    JOURNAL_INTERVAL = 60000 # milliseconds between compactions of the edit journal
+
+    MOMENTUM_WINDOW = 0.1      # seconds of mouse movement that set the release speed
+    MOMENTUM_FRICTION = 0.9    # fraction of the speed kept every frame
+    MOMENTUM_MIN_SPEED = 0.5   # pixels per frame below which panning stops
     
     def __init__(self):
-        self.ptr = None
         self.aspect_patt = re.compile('\d+')
         self.ztf_patt = re.compile('Zoom to fit')
         self.ztf = True
@@ -52,6 +64,14 @@ class Controller():
         self.pan_image = False # Is the user able to currently pan the image?
         self.toolbar_pan = False
         self.left_down = False # Is the user holding the left mouse button?
+        self.pan_origin = None # Screen position where the current pan started
+        self.pan_start = (0, 0) # Scroll position (pixels) where the current pan started
+        self.pan_samples = [] # Recent (time, screen position) samples of the current pan
+        self.pan_velocity = (0.0, 0.0) # Momentum after a pan (pixels per frame)
+        self.pan_position = (0, 0)
+        self.momentum_timer = None
+        self.wheel_steps = 0.0 # Mouse wheel notches not yet zoomed by
+        self.wheel_anchor = (0, 0) # Canvas position of the last mouse wheel event
         self.polyline_cursor_on = False
         self.debug = False
         self.set_pixels_per_unit = False
@@ -61,77 +81,384 @@ class Controller():
         self.polyline_controller = None
         self.calibrate_controller = None
         self.save_session = None
+        self.journal = None # Edit journal of the scan being shown
+        self.load_job = None # Background job loading the DICOM file, if any
+        self.filter_jobs = jobs.JobScheduler() # Filter plugin runs (see plugin_controller)
+        self.pb = None
         self.background = None
-        self.xml = None
-        self.plugin_directory = ""
+        self.cursors = {}
         self.model = dicom_model.Model()
         self.zoom_model = zoom_model.Model()
+        self.workspace = workspace_model.Model() # Scans open besides the one shown
         self.centerX = 0
         self.centerY = 0
         self.rotations = 0
         self.startrotation = 0;
         self.file_name = ""
+        self.annotation_bbox = None # Last drawn extent of the annotation being edited
+        self.redraw = redraw_scheduler.RedrawScheduler(self.draw_all)
 
         self.view = dicom_view.View(self, self.model)
         self.zoom_controller = zoom_controller.Controller(self, self.view, self.model)
 
-        # Check for the XML config file. If it's installed,
-        # read the corresponding data. If it's not installed,
+        # Check for the XML config file. If it's not installed,
         # install it to the user's home directory, setting
-        # default values.
-        path = os.path.expanduser('~')
-        if os.path.exists(r'' + path + os.sep + '.cxvrc.xml'):
-            self.xml = xml_controller.Controller(path + os.sep + '.cxvrc.xml')
-            self.xml.load_file()
-            self.plugin_directory = self.xml.get_plugin_directory()
-        else:
-            self.xml = xml_controller.Controller(path + os.sep + '.cxvrc.xml')
-            self.xml.create_config()
-
-        path = os.path.expanduser('~') + os.sep + "plugins" + os.sep
-        
-        self.cursor_hand = wx.CursorFromImage(wx.Image(self.view.get_main_dir() + os.sep + 'images' + os.sep + 'cursor_hand_open.gif', wx.BITMAP_TYPE_GIF))
-        self.cursor_hand_drag = wx.CursorFromImage(wx.Image(self.view.get_main_dir() + os.sep + 'images' + os.sep + 'cursor_hand_closed.gif', wx.BITMAP_TYPE_GIF))
-        image = wx.Image(self.view.get_main_dir() + os.sep + "images" + os.sep + "cursor_cross.png", wx.BITMAP_TYPE_PNG)
-        image.SetOptionInt(wx.IMAGE_OPTION_CUR_HOTSPOT_X, 9)
-        image.SetOptionInt(wx.IMAGE_OPTION_CUR_HOTSPOT_Y, 9)
-        self.cursor_polyline = wx.CursorFromImage(image)
+        # default values. It's read when it's first needed.
+        if not os.path.exists(plugin_loader.get_config_path()):
+            from Controllers import xml_controller
+            xml = xml_controller.Controller(plugin_loader.get_config_path())
+            xml.create_config()
+
+        # Compact the edit journal now and then, and offer to recover the
+        # edits of sessions that were interrupted
+        self.journal_timer = wx.Timer(self.view)
+        self.view.Bind(wx.EVT_TIMER, self.on_journal_timer, self.journal_timer)
+        self.journal_timer.Start(self.JOURNAL_INTERVAL)
+        wx.CallAfter(self.offer_recovery)
+
+    def get_cursor(self, name):
+        """ Returns the named cursor ('hand', 'hand_drag' or 'polyline'),
+        loading its image the first time it's used.
+        """
+        if name not in self.cursors:
+            directory = self.view.get_main_dir() + os.sep + 'images' + os.sep
+            if name == 'hand':
+                image = wx.Image(directory + 'cursor_hand_open.gif', wx.BITMAP_TYPE_GIF)
+            elif name == 'hand_drag':
+                image = wx.Image(directory + 'cursor_hand_closed.gif', wx.BITMAP_TYPE_GIF)
+            else:
+                image = wx.Image(directory + 'cursor_cross.png', wx.BITMAP_TYPE_PNG)
+                image.SetOptionInt(wx.IMAGE_OPTION_CUR_HOTSPOT_X, 9)
+                image.SetOptionInt(wx.IMAGE_OPTION_CUR_HOTSPOT_Y, 9)
+            self.cursors[name] = wx.CursorFromImage(image)
+        return self.cursors[name]
 
     def on_open(self, event):
         dialog = wx.FileDialog(None, wildcard='CXV files (*.DCM; *.xml; *.cxv)|*.DCM;*.xml;*.cxv|DICOM (*.DCM)|*.DCM|Saved session (*.cxv; *.xml)|*.cxv;*.xml', style=wx.FD_FILE_MUST_EXIST)
+        if self.load_job is not None: # still loading the previous file
+            return
         if dialog.ShowModal() == wx.ID_OK:
-            new = True
+            path = dialog.GetPath()
+            dicom_path = path
+            if (path[-4:] != '.dcm') and (path[-4:] != '.DCM'):
+                from lib import save_session
+                dicom_path = save_session.SaveSession(self, path).load_file()
+            if (path[-4:] == '.dcm') or (path[-4:] == '.DCM'):
+                if dicom_path == self.model.get_dicom_path(): # already shown
+                    return
+                if dicom_path in self.workspace.get_paths(): # already open; just switch to it
+                    self.switch_to(dicom_path)
+                    return
+            elif not self.replace_open_scan(dicom_path, path):
+                return
             if self.model.image_array is not None:  # opening a project on top of another
-                self.save_prompt()
+                self.stash_current()
                 self.close_current()
-                new = False
-            path = dialog.GetPath()
+            new = self.view.figure is None
             self.file_name = path[:-4]
-            savedsesh = False
             if (path[-4:] == '.dcm') or (path[-4:] == '.DCM'):
-                self.open_dicom_file(path, new)
+                self.open_dicom_file(path, new, on_loaded=lambda: self.on_image_opened(False))
             else:
                 self.open_saved_session(path, new)
-                savedsesh = True
-            self.view.aspect_cb.Enable()
-            tools = ['Image Overview', 'Image Information', 
-                     'Pan Image', 'Zoom In', 'Zoom Out', 
-                     'Adjust Target Area', 'Draw Polylines',
-                     'Adjust Calibration Region', 'Rotate Image']
-            self.enable_tools(tools, True)
-            self.enable_tools(['&Save\tCtrl+S'], False)
-            self.view.menubar.FindItemById(self.view.menubar_ids['Save As...']).Enable(True)
-            self.view.menubar.FindItemById(self.view.menubar_ids['Export']).Enable(True)
 
-            # If the user loads a saved session, we don't want to set these to None!
-            if not savedsesh:
-                self.coral_controller = None
-                self.overlay_controller = None
-                self.polyline_controller = None
-                self.calibrate_controller = None
-            self.centerX, self.centerY = self.model.get_image_shape()
+    def replace_open_scan(self, dicom_path, session_path):
+        """ Makes way for a saved session of a scan that may already be
+        open. If the scan was opened from (or saved to) that session, it's
+        simply switched to. Otherwise the user is asked whether the
+        session's annotations should replace the open scan's.
+
+        @return - True if the session should be opened
+        """
+        shown = dicom_path == self.model.get_dicom_path()
+        if shown:
+            source = self.save_session
+        elif self.workspace.get(dicom_path) is not None:
+            source = self.workspace.get(dicom_path).save_session
+        else:
+            return True
+        if source is not None and source.path == session_path: # already open
+            self.switch_to(dicom_path)
+            return False
+
+        msg = dicom_path.split(os.sep)[-1] + ' is already open.\n\n' + \
+        'Do you want to replace its annotations with those of ' + session_path.split(os.sep)[-1] + '?'
+        dialog = wx.MessageDialog(self.view, msg, 'CXV', style=wx.YES_NO)
+        if dialog.ShowModal() != wx.ID_YES:
+            self.switch_to(dicom_path)
+            return False
+        if shown:
+            if self.save_prompt() == -1:
+                return False
+            self.record_edit()
+            if self.journal is not None:
+                self.journal.close()
+            self.close_current()
+        else:
+            scan = self.workspace.take(dicom_path)
+            if scan.changed and scan.save_session is not None:
+                if self.ask_to_save(scan.save_session.path, scan.save) == -1:
+                    self.workspace.store(scan)
+                    return False
+            if scan.journal is not None:
+                scan.journal.close()
+            self.view.update_window_menu(self.model.get_dicom_path(), self.workspace.get_paths())
+        return True
+
+    def on_image_opened(self, savedsesh):
+        """ Enables the tools once the image (and session) has loaded """
+        self.view.aspect_cb.Enable()
+        self.enable_tools(self.IMAGE_TOOLS, True)
+        self.enable_tools(['&Save\tCtrl+S'], False)
+        self.view.menubar.FindItemById(self.view.menubar_ids['Save As...']).Enable(True)
+        self.view.menubar.FindItemById(self.view.menubar_ids['Export']).Enable(True)
+        self.view.menubar.FindItemById(self.view.menubar_ids['Detect Regions']).Enable(True)
+        self.view.menubar.FindItemById(self.view.menubar_ids['Trace Bands']).Enable(True)
+
+        # If the user loads a saved session, we don't want to set these to None!
+        if not savedsesh:
+            self.coral_controller = None
+            self.overlay_controller = None
+            self.polyline_controller = None
+            self.calibrate_controller = None
+        self.centerX, self.centerY = self.model.get_image_shape()
+        if self.journal is None:
+            self.start_journal()
+        self.view.update_window_menu(self.model.get_dicom_path(), self.workspace.get_paths())
+        if not savedsesh and self.get_detect_regions():
+            self.detect_regions()
+
+    def get_detect_regions(self):
+        """ Returns whether the regions are detected when a DICOM file is
+        opened, from the user's XML config file; True if it hasn't been set
+        """
+        from Controllers import xml_controller
+        xml = xml_controller.Controller(plugin_loader.get_config_path())
+        xml.load_file()
+        return (xml.get_detect_regions() or 'true').strip().lower() != 'false'
+
+    def on_detect_regions(self, event):
+        """ Tools menu callback: proposes the target area and calibration
+        region, replacing the current ones
+        """
+        self.detect_regions()
 
-    def open_dicom_file(self, path, new):
+    def detect_regions(self):
+        """ Sets the target area and calibration region to the ones
+        detection_model proposes, for the user to review and adjust
+        """
+        from Models import detection_model
+        regions = detection_model.Model().detect(self.model)
+        if regions['coral'] is None:
+            self.view.statusbar.SetStatusText('No target area was detected', 0)
+            return
+        if self.coral_locked: # the overlays are of the old target area
+            self.on_coral(None)
+        if not self.coral_controller:
+            from Controllers import coral_controller
+            self.coral_controller = coral_controller.Controller(self.view, self.background)
+            self.enable_tools(['Filtered Overlays'], True)
+        self.coral_controller.model.set_rect_pos(*regions['coral'])
+        self.coral_controller.refresh_area()
+        message = 'Detected the target area'
+        if regions['calibration'] is not None:
+            if not self.calibrate_controller:
+                from Controllers import calibrate_controller
+                self.calibrate_controller = calibrate_controller.Controller(self.view, self.background)
+                self.enable_tools(['Set Calibration Parameters'], True)
+            self.calibrate_controller.model.set_rect_pos(*regions['calibration'])
+            self.calibrate_controller.refresh_area()
+            message += ' and calibration region'
+        self.view.statusbar.SetStatusText(message + '; please review them', 0)
+        self.draw_all()
+        self.state_changed(True)
+
+    def start_journal(self):
+        """ Starts the edit journal of the scan being shown from its
+        current (saved) state
+        """
+        from lib import journal
+        from lib import save_session
+        if self.journal is None:
+            self.journal = journal.Journal(journal.get_journal_path(self.model.get_dicom_path()))
+        source = self.save_session.path if self.save_session else None
+        self.journal.start(save_session.SaveSession(self, None).get_session(), source)
+
+    def record_edit(self):
+        """ Appends the changes to the scan being shown to its journal """
+        if self.journal is None or self.model.image_array is None:
+            return
+        from lib import save_session
+        self.journal.record(save_session.SaveSession(self, None).get_session())
+
+    def on_journal_timer(self, event):
+        """ Compacts the journals that have grown, which also writes any
+        saved sessions to their session files
+        """
+        for journal in [self.journal] + self.workspace.get_journals():
+            if journal is not None and journal.needs_compaction():
+                journal.compact()
+
+    def close_journals(self):
+        """ Closes the journal of every open scan; CXV is exiting normally """
+        self.record_edit()
+        for journal in [self.journal] + self.workspace.get_journals():
+            if journal is not None:
+                journal.close()
+        self.journal = None
+
+    def offer_recovery(self, paths=None):
+        """ Offers to recover the edits of each session left behind in a
+        journal when CXV last exited unexpectedly, one at a time.
+
+        @var paths - journals still to be offered; all of them if None
+        """
+        from lib import journal
+        if paths is None:
+            paths = journal.find_journals()
+        while paths:
+            path, paths = paths[0], paths[1:]
+            try:
+                recovered = journal.replay(path)
+                session = recovered.get_session()
+                filename = session['filename']
+            except (IOError, ValueError, KeyError): # unreadable; nothing to recover
+                journal.remove(path)
+                continue
+            if recovered.is_saved():
+                recovered.close() # writes the saved state if it hadn't been yet
+                continue
+            msg = 'CXV exited while ' + filename.split(os.sep)[-1] + \
+            ' had unsaved changes.\n\n Do you want to recover them?'
+            dialog = wx.MessageDialog(self.view, msg, 'CXV', style=wx.YES_NO)
+            if dialog.ShowModal() != wx.ID_YES:
+                recovered.close()
+                continue
+            if self.model.image_array is not None:
+                self.stash_current()
+                self.close_current()
+            self.file_name = filename[:-4]
+            self.open_dicom_file(filename, self.view.figure is None,
+                                 on_loaded=lambda: self.on_recovered(recovered, paths))
+            return
+
+    def on_recovered(self, recovered, paths):
+        """ Applies the recovered session once its image has loaded and
+        continues with the remaining journals
+        """
+        from lib import save_session
+        self.save_session = save_session.SaveSession(self, recovered.source)
+        self.journal = recovered
+        self.on_session_image_loaded(recovered.get_session())
+        if recovered.source is None:
+            self.save_session = None
+        self.state_changed(True)
+        self.offer_recovery(paths)
+
+    def stash_current(self):
+        """ Puts the scan being shown aside in the workspace, along with
+        its annotations, overlays and unsaved changes, so switching back
+        to it doesn't decode the file or run the filter plugins again.
+        """
+        from lib import save_session
+        try: self.contrast_controller.render_all() # keep the contrast the user applied
+        except AttributeError: pass
+        self.record_edit()
+        session = save_session.SaveSession(self, None).get_session()
+        overlays = None
+        if self.overlay_controller is not None and self.overlay_controller.overlays:
+            overlays = {'overlays': self.overlay_controller.overlays,
+                        'alphas': list(self.overlay_controller.alphas),
+                        'shown': self.overlay_controller.view.IsShown()}
+        self.workspace.store(workspace_model.Scan(self.model.get_dicom_path(), session,
+                                                  self.model.get_state(self.rotations), overlays,
+                                                  self.changed, self.save_session, self.journal))
+
+    def on_switch_scan(self, event, path):
+        """ Window menu item of an open scan """
+        self.switch_to(path)
+
+    def switch_to(self, path):
+        """ Shows the scan of the given file from the workspace, putting
+        the scan being shown aside. A scan whose arrays were evicted is
+        decoded from the file again; its annotations are kept either way.
+        """
+        if self.load_job is not None or path == self.model.get_dicom_path():
+            self.view.update_window_menu(self.model.get_dicom_path(), self.workspace.get_paths())
+            return
+        scan = self.workspace.take(path)
+        if scan is None:
+            return
+        if self.model.image_array is not None:
+            self.stash_current()
+            self.close_current()
+        new = self.view.figure is None
+        self.file_name = path[:-4]
+        if scan.is_loaded():
+            self.model.set_state(scan.state)
+            self.view.init_plot(new)
+            self.cache_background()
+            self.restore_scan(scan)
+            self.cleanup()
+        else:
+            self.open_dicom_file(scan.path, new,
+                                 on_loaded=lambda: self.restore_scan(scan),
+                                 on_error=lambda error: self.on_scan_missing(error, scan),
+                                 on_cancelled=lambda: self.put_back(scan))
+
+    def restore_scan(self, scan):
+        """ Re-applies the annotations, overlays and unsaved changes of a
+        scan from the workspace once its image is shown
+        """
+        from lib import save_session
+        self.save_session = save_session.SaveSession(self, None)
+        self.journal = scan.journal
+        self.on_session_image_loaded(scan.session)
+        self.save_session = scan.save_session
+        if scan.overlays is not None:
+            self.restore_overlays(scan.overlays)
+        self.state_changed(scan.changed)
+
+    def restore_overlays(self, overlays):
+        """ Shows the filtered overlays of a scan from the workspace
+        without running the filter plugins again
+        """
+        from Controllers import overlay_controller
+        self.coral = False
+        self.coral_locked = True
+        self.enable_tools(['Filtered Overlays'], True)
+        self.overlay_controller = overlay_controller.Controller(self.view, self, self.model, self.background,
+                                                               overlays['shown'], self.rotations,
+                                                               alphas=overlays['alphas'])
+        self.overlay_controller.overlays = overlays['overlays']
+        self.overlay_controller.display()
+        if overlays['shown']:
+            self.overlay_controller.view.Show()
+        self.draw_all()
+
+    def put_back(self, scan):
+        """ Returns a scan that couldn't be shown to the workspace, so its
+        annotations aren't lost
+        """
+        self.workspace.store(scan)
+        self.view.update_window_menu(None, self.workspace.get_paths())
+
+    def on_scan_missing(self, error, scan):
+        """ The file of an evicted scan couldn't be loaded again """
+        self.put_back(scan)
+        wx.MessageBox('The DICOM file could not be loaded:\n\n' + str(error), 'Invalid DICOM File', wx.OK | wx.ICON_ERROR)
+
+    def open_dicom_file(self, path, new, on_loaded=None, on_error=None, on_cancelled=None):
+        """ Loads the DICOM file on a background job, keeping the window
+        responsive. The thumbnail is shown, stretched to the image's size,
+        as soon as the pixel data is decoded and is replaced by the full
+        resolution image once the display buffer is filled. The load can
+        be cancelled from the progress dialog.
+
+        @var on_loaded - called once the full resolution image is shown
+        @var on_error - called with the exception if the file can't be
+                        loaded; shows an error message if None
+        @var on_cancelled - called if the user cancels the load
+        """
         p = path.split(os.sep)
         p = p[:3] + p[-2:]
         p[2] = '...'
@@ -139,42 +466,124 @@ class Controller():
         for each in p:
             label += (each + os.sep)
         label = label[:-1]
-        self.pb = progress_bar.ProgressBar('Loading DICOM', label, 7, self.view)
-        self.model.image_array = self.model.load_dicom_image(path)
-        self.pb.update(label)
+        self.enable_tools(self.IMAGE_TOOLS, False)
+        self.view.menubar.FindItemById(self.view.menubar_ids['Detect Regions']).Enable(False)
+        self.view.menubar.FindItemById(self.view.menubar_ids['Trace Bands']).Enable(False)
+        self.enforce_memory_budget()
+        self.pb = progress_bar.ProgressBar('Loading DICOM', label, self.LOAD_STEPS, self.view, cancellable=True)
+        self.load_job = jobs.Job('load dicom', lambda token: self.load_image(path, new, token),
+                                 on_done=lambda rgba: self.on_load_finished(rgba, on_loaded),
+                                 on_error=lambda error: self.on_load_failed(error, on_error),
+                                 on_cancelled=lambda: self.on_load_cancelled(on_cancelled))
+        self.load_job.start()
+        self.poll_load()
+
+    def load_image(self, path, new, token):
+        """ The load job's work; runs on the job's thread, so anything
+        shown on screen goes through job.post().
+        """
+        job = self.load_job
+        self.model.read_dicom(path)
+        token.check()
+        job.post(self.show_preview, new, self.model.get_thumbnail())
         y, x = self.model.get_image_shape()
-        self.pb.update(label)
-        try: rgba, self.ptr = self.model.allocate_array((y, x, 4))
-        except ValueError: rgba, self.ptr = self.model.allocate_array((y, x, 4))
-        self.pb.update(label)
-        self.model.image_array = self.model.normalize_intensity(self.model.image_array)
-        self.pb.update(label)
-        self.model.image_array = self.model.invert_grayscale(self.model.image_array)
-        self.pb.update(label)
-        self.model.image_array = self.model.set_display_data(rgba, self.model.image_array, 1.0)
-        self.pb.update(label)
-        self.view.init_plot(new)
-        self.pb.finish(label)
+        rgba = buffer_pool.acquire((y, x, 4))
+        # The remaining steps of the progress bar follow the fill
+        steps = self.LOAD_STEPS - 2
+        progress = lambda fraction: job.post(self.set_load_progress, 2 + int(fraction * steps))
+        return self.model.fill_display_data(rgba, token, progress)
+
+    def show_preview(self, new, thumbnail):
+        self.pb.update('Filling display buffer')
+        self.view.init_plot(new, preview=thumbnail)
+        self.cleanup()
+
+    def set_load_progress(self, step):
+        if self.pb is not None:
+            self.pb.counter = step
+            self.pb.poll()
+
+    def poll_load(self):
+        """ Keeps the progress dialog's Cancel button responsive while
+        the load job is running
+        """
+        if self.load_job is None or self.pb is None:
+            return
+        if not self.pb.poll():
+            self.cancel_load()
+        else:
+            wx.CallLater(100, self.poll_load)
+
+    def cancel_load(self):
+        if self.load_job is not None:
+            self.load_job.cancel()
+
+    def on_load_finished(self, rgba, on_loaded):
+        self.load_job = None
+        self.model.image_array = rgba
+        memory_tracker.track('image', 'display', self.model.image_array)
+        self.view.set_image(self.model.image_array)
+        self.cache_background()
+        self.pb.finish('Finished')
         self.cleanup()
         self.pb = None
+        self.enforce_memory_budget()
+        if on_loaded is not None:
+            on_loaded()
+
+    def on_load_failed(self, error, on_error):
+        self.end_load()
+        if on_error is not None:
+            on_error(error)
+        else:
+            wx.MessageBox('The DICOM file could not be loaded:\n\n' + str(error), 'Invalid DICOM File', wx.OK | wx.ICON_ERROR)
+
+    def on_load_cancelled(self, on_cancelled=None):
+        self.end_load()
+        self.save_session = None
+        self.view.statusbar.SetStatusText('Loading cancelled', 0)
+        if on_cancelled is not None:
+            on_cancelled()
+
+    def end_load(self):
+        """ Discards a load that didn't finish, along with its preview """
+        self.load_job = None
+        if self.pb is not None:
+            self.pb.Destroy()
+            self.pb = None
+        self.model.close()
+        try:
+            self.view.axes.cla()
+            self.view.figure.delaxes(self.view.axes)
+            self.view.canvas.draw()
+        except (AttributeError, KeyError, ValueError): # no preview was shown
+            pass
 
     def open_saved_session(self, path, new):
         if self.view.figure is not None:
             self.view.figure.clear()
+        from lib import save_session
         self.save_session = save_session.SaveSession(self, path)
-        try:
-            self.open_dicom_file(self.save_session.load_file(), new)
-        except IOError:
-            self.save_session = None
-            self.pb.Destroy()
-            self.pb = None
-            # Image path not found, prompt user to edit XML file with correct path to image
-            # TODO: Add section number from manual to this messageBox text
-            wx.MessageBox('Image location not found! Please edit the saved session XML file and add the correct image location between the "filename" tags. ' +
-                            'For more information on this issue, please consult the CXV manual under section SECTION_NUMBER.', 'Invalid Image Path', wx.OK | wx.ICON_ERROR)
+        self.open_dicom_file(self.save_session.load_file(), new,
+                             on_loaded=self.on_session_image_loaded,
+                             on_error=self.on_session_image_missing)
+
+    def on_session_image_missing(self, error):
+        self.save_session = None
+        if not isinstance(error, IOError):
+            wx.MessageBox('The DICOM file could not be loaded:\n\n' + str(error), 'Invalid DICOM File', wx.OK | wx.ICON_ERROR)
             return
+        # Image path not found, prompt user to edit XML file with correct path to image
+        # TODO: Add section number from manual to this messageBox text
+        wx.MessageBox('Image location not found! Please edit the saved session XML file and add the correct image location between the "filename" tags. ' +
+                        'For more information on this issue, please consult the CXV manual under section SECTION_NUMBER.', 'Invalid Image Path', wx.OK | wx.ICON_ERROR)
+
+    def on_session_image_loaded(self, session=None):
+        """ Applies the saved session, or the given session dictionary,
+        once its image has loaded
+        """
         self.pb = progress_bar.ProgressBar('Loading Session values', "Loading Session values", 7, self.view)
-        self.save_session.load(self.pb)
+        self.save_session.load(self.pb, session)
         self.pb.finish("Finished")
         self.pb = None
         self.changed = False
@@ -184,117 +593,324 @@ class Controller():
             self.centerX = self.centerY
             self.centerY = temp
         self.startrotation = self.rotations
+        self.on_image_opened(True)
+
+    def get_memory_budget(self):
+        """ Returns the memory budget (MB) from the user's XML config file,
+        or memory_tracker.DEFAULT_BUDGET if it hasn't been set.
+        """
+        from Controllers import xml_controller
+        xml = xml_controller.Controller(plugin_loader.get_config_path())
+        xml.load_file()
+        try:
+            return float(xml.get_memory_budget())
+        except (TypeError, ValueError):
+            return memory_tracker.DEFAULT_BUDGET
+
+    def get_filter_cache_size(self):
+        """ Returns the size limit (MB) of the filter overlay cache from the
+        user's XML config file, or filter_cache.DEFAULT_SIZE if it hasn't
+        been set.
+        """
+        from Controllers import xml_controller
+        from lib import filter_cache
+        xml = xml_controller.Controller(plugin_loader.get_config_path())
+        xml.load_file()
+        try:
+            return float(xml.get_filter_cache_size())
+        except (TypeError, ValueError):
+            return filter_cache.DEFAULT_SIZE
+
+    def get_overlay_precision(self):
+        """ Returns the precision of the filtered overlays from the user's
+        XML config file, or overlay_model.DEFAULT_PRECISION if it hasn't
+        been set (or isn't one of overlay_model.PRECISIONS).
+        """
+        from Controllers import xml_controller
+        from Models import overlay_model
+        xml = xml_controller.Controller(plugin_loader.get_config_path())
+        xml.load_file()
+        precision = xml.get_overlay_precision()
+        if precision not in overlay_model.PRECISIONS:
+            return overlay_model.DEFAULT_PRECISION
+        return precision
+
+    def enforce_memory_budget(self):
+        """ Evicts cached data until the tracked memory fits within the
+        user's budget, warning if the open image alone exceeds it.
+        """
+        budget = self.get_memory_budget()
+        memory_tracker.enforce(budget)
+        total = memory_tracker.get_total()
+        if total > budget * 1024 * 1024:
+            profiler.count('memory budget exceeded')
+            self.view.statusbar.SetStatusText('%d MB in use exceeds the memory budget of %d MB' % (total / 1048576, budget), 0)
 
     def close_current(self):
-        self.model.deallocate_array(self.ptr)
+        self.redraw.cancel()
+        self.filter_jobs.cancel_all()
+        self.stop_momentum()
+        self.pan_origin = None
+        # Drop every reference to the image and its derived arrays so
+        # their memory is freed now, not whenever the next image replaces them
+        self.view.axes.cla()
         self.view.figure.delaxes(self.view.axes)
+        self.background = None
         self.coral_controller = None
+        self.coral_locked = False
+        try:
+            self.overlay_controller.view.Destroy()
+        except AttributeError:
+            pass
         self.overlay_controller = None
         self.polyline_controller = None
         self.save_session = None
+        self.journal = None # kept by the workspace
         self.changed = False
+        try:
+            self.contrast_controller.view.Destroy()
+            del self.contrast_controller
+        except AttributeError:
+            pass
+        try:
+            self.image_info_controller.view.Destroy()
+            del self.image_info_controller
+        except AttributeError:
+            pass
+        try:
+            self.overview_controller.view.Destroy()
+            del self.overview_controller
+        except AttributeError:
+            pass
+        self.model.close()
+        memory_tracker.untrack('overlays')
+        memory_tracker.untrack('plugins')
+        buffer_pool.trim(0) # the closed image's display buffers are idle now
         self.enable_tools(['Filtered Overlays'], False)
+        self.view.update_window_menu(None, self.workspace.get_paths())
 
     def on_quit(self, event):
-        if self.save_prompt() is not -1: # Cancel button
+        if self.save_prompt() is not -1 and self.save_workspace_prompt() is not -1: # Cancel button
+            self.close_journals()
             wx.Exit()
 
     def save_prompt(self):
         if self.save_session and self.changed:
-            msg = 'The contents of ' + self.save_session.path.split(os.sep)[-1] + \
-            ' has changed.\n\n Do you want to save the changes?'
-            dialog = wx.MessageDialog(self.view, msg, 'CXV', style=wx.YES_NO|wx.CANCEL)
-            choice = dialog.ShowModal()
-            if choice==wx.ID_YES:
-                self.save_session.write()
-            elif choice == wx.ID_CANCEL:
+            return self.ask_to_save(self.save_session.path, self.save_current)
+
+    def save_workspace_prompt(self):
+        """ Asks to save every scan in the workspace that was opened from
+        (or saved to) a session file and has changed since
+        """
+        for scan in self.workspace.get_changed():
+            if scan.save_session is None:
+                continue
+            if self.ask_to_save(scan.save_session.path, scan.save) == -1:
                 return -1
 
+    def ask_to_save(self, path, write):
+        msg = 'The contents of ' + path.split(os.sep)[-1] + \
+        ' has changed.\n\n Do you want to save the changes?'
+        dialog = wx.MessageDialog(self.view, msg, 'CXV', style=wx.YES_NO|wx.CANCEL)
+        choice = dialog.ShowModal()
+        if choice==wx.ID_YES:
+            write()
+        elif choice == wx.ID_CANCEL:
+            return -1
+
     def enable_tools(self, tools, enable):
         for tool in tools:
             self.view.toolbar.EnableTool(self.view.toolbar_ids[tool], enable)
             self.view.menubar.FindItemById(self.view.menubar_ids[tool]).Enable(enable)
 
-    def pan_view(self, x, y):
+    def start_pan(self):
+        """ Grabs the image at the current mouse position. Panning follows
+        the mouse in screen pixels, so it doesn't depend on the image
+        coordinates under the mouse, which change as the image scrolls.
         """
-        Pans the user's scrollpane in the direction that they're moving their mouse.
-        
-        @var x: the x position that the mouse has moved to
-        @var y: the y position that the mouse has moved to
+        self.stop_momentum()
+        self.pan_origin = wx.GetMousePosition()
+        self.pan_start = self.view.scroll.GetViewStart()
+        self.pan_samples = [(time.time(), self.pan_origin)]
+
+    def pan_view(self):
+        """ Scrolls the image by the exact pixel distance the mouse has
+        moved since the pan started. Scheduled by on_mouse_motion, so it
+        runs once per frame no matter how many motion events arrive.
+        """
+        if self.pan_origin is None:
+            return
+        mx, my = wx.GetMousePosition()
+        ox, oy = self.pan_origin
+        sx, sy = self.pan_start
+        self.scroll_to(sx - (mx - ox), sy - (my - oy))
+
+    def end_pan(self):
+        """ Releases the image, letting it glide on with the speed the
+        mouse had over the last MOMENTUM_WINDOW seconds.
         """
-        # Get the current position of the scrollbars
-        init_pos_x, init_pos_y = self.view.scroll.GetViewStart()
-
-        # Find the direction that the user is dragging their mouse
-        # Negative = Scrolling: DOWN or LEFT, Dragging: UP or RIGHT
-        # Positive = Scrolling: UP or RIGHT, Dragging: DOWN or LEFT
-        x_delta = self.previous_x - x
-        y_delta = self.previous_y - y
-
-        # Increase or decrease the scrollbars depending on which
-        # direction the user is dragging their mouse
-        if (x_delta > 0): # Left
-            init_pos_x += 1
-        elif (x_delta < 0): # Right
-            init_pos_x -= 1
-        if (y_delta > 0): # Down
-            init_pos_y += 1
-        elif (y_delta < 0): # Up
-            init_pos_y -= 1
-
-        # Update the scrollbar with the new position
-        self.view.scroll.Scroll(init_pos_x, init_pos_y)
+        if self.pan_origin is None:
+            return
+        self.redraw.flush() # apply the last motion before measuring
+        now = time.time()
+        samples = [(t, p) for t, p in self.pan_samples if now - t <= self.MOMENTUM_WINDOW]
+        self.pan_origin = None
+        self.pan_samples = []
+        self.state_changed(True)
+        if len(samples) < 2:
+            return
+        (t0, (x0, y0)), (t1, (x1, y1)) = samples[0], samples[-1]
+        frames = max(t1 - t0, 1e-3) * 1000.0 / self.redraw.FRAME_INTERVAL
+        self.start_momentum(-(x1 - x0) / frames, -(y1 - y0) / frames)
+
+    def start_momentum(self, vx, vy):
+        """ Keeps scrolling by (vx, vy) pixels per frame, slowing down by
+        MOMENTUM_FRICTION every frame until the image comes to rest.
+        """
+        if math.hypot(vx, vy) < self.MOMENTUM_MIN_SPEED:
+            return
+        self.pan_velocity = (vx, vy)
+        self.pan_position = self.view.scroll.GetViewStart()
+        if self.momentum_timer is None:
+            self.momentum_timer = wx.Timer(self.view)
+            self.view.Bind(wx.EVT_TIMER, self.on_momentum, self.momentum_timer)
+        self.momentum_timer.Start(self.redraw.FRAME_INTERVAL)
+
+    def stop_momentum(self):
+        if self.momentum_timer is not None:
+            self.momentum_timer.Stop()
+        self.pan_velocity = (0.0, 0.0)
+
+    def on_momentum(self, event):
+        vx, vy = self.pan_velocity
+        x, y = self.pan_position
+        self.pan_position = (x + vx, y + vy)
+        before = self.view.scroll.GetViewStart()
+        self.scroll_to(*self.pan_position)
+        vx *= self.MOMENTUM_FRICTION
+        vy *= self.MOMENTUM_FRICTION
+        self.pan_velocity = (vx, vy)
+        # Stop once the image has slowed down or hit the edge
+        if math.hypot(vx, vy) < self.MOMENTUM_MIN_SPEED or self.view.scroll.GetViewStart() == before:
+            self.stop_momentum()
+
+    def scroll_to(self, x, y):
+        """ Scrolls the top-left corner of the view to the given pixel
+        position and redraws the viewport there.
+        """
+        self.view.scroll.Scroll(max(int(round(x)), 0), max(int(round(y)), 0))
+        self.update_viewport()
+        self.update_overview()
+
+    def on_mouse_wheel(self, event):
+        """ Zooms in (wheel up) or out (wheel down) by ZOOM_STEP per notch,
+        keeping the image point under the mouse in place. Notches that
+        arrive within the same frame are zoomed by at once.
+        """
+        if self.model.image_array is None:
+            return
+        self.wheel_steps += event.GetWheelRotation() / float(event.GetWheelDelta() or 120)
+        self.wheel_anchor = event.GetPositionTuple()
+        self.redraw.schedule(self.apply_wheel_zoom)
+
+    def apply_wheel_zoom(self):
+        steps, self.wheel_steps = self.wheel_steps, 0.0
+        self.zoom_at(self.view.aspect * zoom_model.ZOOM_STEP ** steps, *self.wheel_anchor)
+
+    def zoom_at(self, aspect, x, y):
+        """ Zooms to the given zoom factor, keeping the image point at
+        canvas position (x, y) in place.
+        """
+        aspect = clamp_aspect(aspect)
+        if aspect == self.view.aspect:
+            return
+        self.stop_momentum()
+        sx, sy = self.zoom_model.anchored_scroll(self.view.scroll.GetViewStart(), (x, y), self.view.aspect, aspect)
+        self.view.aspect = aspect
+        self.ztf = False
+        self.view.aspect_cb.SetValue(str(int(round(aspect*100.0)))+'%')
+        self.resize_image(sx, sy, hide=False)
+        self.view.toggle_selector.update_background(None)
         self.state_changed(True)
 
     def resize_image(self, sx=0, sy=0, hide=True, always_hide=False):
-        self.resize_mpl_widgets()
         if hide:
             self.view.scroll.Hide()
         self.set_scrollbars(sx, sy)
-        self.cache_background()
+        self.resize_mpl_widgets()
+        self.update_viewport()
         if hide and not always_hide:
             self.view.scroll.Show()
         self.cleanup()
         self.update_overview()
 
+    def refresh_viewport(self):
+        """ Resizes the viewport to the window, keeping the scroll position """
+        sx, sy = self.view.scroll.GetViewStart()
+        self.resize_image(sx, sy, hide=False)
+
     def resize_mpl_widgets(self):
-        y, x = self.model.get_image_shape()
-        self.view.canvas.resize(x*self.view.aspect, y*self.view.aspect) # canvas gets set in pixels
-        self.view.figure.set_size_inches((x*self.view.aspect)/72.0, (y*self.view.aspect)/72.0)  # figure gets set in inches
+        """ Sizes the canvas to the visible part of the image: the window's
+        client area, or the whole image if it's smaller. Only this viewport
+        is ever rendered, whatever the zoom.
+        """
+        y, x = self.model.get_display_shape()
+        cx, cy = self.view.scroll.GetClientSizeTuple()
+        w = max(min(int(x*self.view.aspect), cx), 1)
+        h = max(min(int(y*self.view.aspect), cy), 1)
+        self.view.canvas.resize(w, h) # canvas gets set in pixels
+        self.view.figure.set_size_inches(w/72.0, h/72.0)  # figure gets set in inches
+
+    def set_view_limits(self):
+        """ Points the axes at the part of the image scrolled into view """
+        sx, sy = self.view.scroll.GetViewStart()
+        w, h = self.view.canvas.get_width_height()
+        aspect = self.view.aspect
+        self.view.axes.set_xlim(sx/aspect - 0.5, (sx + w)/aspect - 0.5)
+        self.view.axes.set_ylim((sy + h)/aspect - 0.5, sy/aspect - 0.5)
+
+    def update_viewport(self):
+        """ Redraws the canvas for the current scroll position and zoom,
+        rendering any contrast tiles and overlay that came into view first.
+        """
+        try: self.contrast_controller.render_visible(redraw=False)
+        except AttributeError: pass
+        if self.overlay_controller is not None:
+            self.overlay_controller.render_visible(redraw=False)
+        self.cache_background()
+        if self.view.toggle_selector is not None:
+            self.view.toggle_selector.update_background(None)
 
     def set_scrollbars(self, sx=0, sy=0):
-        y, x = self.model.get_image_shape()
+        y, x = self.model.get_display_shape()
 
         # Setting to (0, 0) first eludes the cropping of the image.
         # If this isn't here, the image will sometimes be cropped and the canvas size
         # will totally change. Weird error... Hopefully there's a better workaround than
         # this.
         self.view.scroll.Scroll(0, 0)
-        scroll_unit = self.view.aspect*100.0
-        self.su = scroll_unit
-        try:
-            self.view.scroll.SetScrollbars(scroll_unit, scroll_unit,
-                                          (x*self.view.aspect)/scroll_unit,
-                                          (y*self.view.aspect)/scroll_unit)
-        except ZeroDivisionError:
-            # Thrown if the user resizes the entire frame to be too
-            # small (less than 0 on either axis). Still may abort
-            # the program, however. Minimum size of frame has been
-            # set to (100, 100).
-            pass
-        self.view.scroll.Scroll(sx, sy)
+        # One scroll unit per pixel, so panning and the scroll position
+        # (sx, sy) are pixel accurate
+        self.view.scroll.SetScrollbars(1, 1, int(x*self.view.aspect), int(y*self.view.aspect))
+        self.view.scroll.Scroll(max(sx, 0), max(sy, 0)) # -1 would leave the position as it is
         self.state_changed(True)
 
+    @profiler.timed('cache_background')
     def cache_background(self):
+        self.set_view_limits()
         self.view.canvas.draw() # cache clean slate background
         self.background = self.view.canvas.copy_from_bbox(self.view.axes.bbox)
         self.draw_all()
 
-    def draw_all(self):
+    @profiler.timed('draw_all')
+    def draw_all(self, bbox=None):
         """ Restores the canvas with the cached background,
         then redraws the enabled widgets and finally blits
         the contents of the AGG buffer back to the canvas for
         the user to see.
+
+        @var bbox - only blit this region (display coordinates) of the
+                    canvas; blits the entire axes if None
         """
         self.view.canvas.restore_region(self.background)
         if self.coral_controller:
@@ -310,8 +926,42 @@ class Controller():
                     if self.calibrate_controller.polyline_controller is not None:
                         self.calibrate_controller.polyline_controller.draw_polylines(self.polyline, self.polyline_locked, False)
 
-        self.view.canvas.Refresh()
-        self.view.canvas.blit(self.view.axes.bbox)
+        if bbox is None:
+            self.view.canvas.Refresh()
+            self.view.canvas.blit(self.view.axes.bbox)
+        else:
+            self.view.canvas.blit(bbox)
+
+    def get_dirty_bbox(self):
+        """ Returns the region of the canvas (display coordinates) that
+        changed while the user edits an annotation: the union of where the
+        annotation was last drawn and where it is now. Returns None if it
+        can't be determined, meaning the entire canvas should be redrawn.
+        """
+        extent = None
+        if self.polyline and self.polyline_controller:
+            extent = self.polyline_controller.get_extent()
+        elif self.coral and self.coral_controller:
+            extent = self.coral_controller.get_extent()
+        elif self.calib and self.calibrate_controller:
+            extent = self.calibrate_controller.get_extent()
+        if extent is None:
+            self.annotation_bbox = None
+            return None
+
+        x1, y1, x2, y2 = extent
+        (x1, y1), (x2, y2) = self.view.axes.transData.transform([[x1, y1], [x2, y2]])
+        pad = 30 # vertex markers, line widths and polyline labels
+        bbox = Bbox.from_extents(min(x1, x2) - pad, min(y1, y2) - pad,
+                                 max(x1, x2) + pad, max(y1, y2) + pad)
+        bbox = Bbox.intersection(bbox, self.view.axes.bbox)
+        if bbox is None: # annotation is outside of the canvas
+            return self.annotation_bbox
+        dirty = bbox
+        if self.annotation_bbox is not None:
+            dirty = Bbox.union([self.annotation_bbox, bbox])
+        self.annotation_bbox = bbox
+        return dirty
 
     def draw_lines(self):
         """ Draws only the rects and polylines on the canvas.
@@ -350,12 +1000,33 @@ class Controller():
     """Events and Tool handlers"""
     def on_overview(self, event):
         try: self.overview_controller.view.Raise()
-        except AttributeError: self.overview_controller = overview_controller.Controller(self.model, self.view)
+        except AttributeError:
+            from Controllers import overview_controller
+            self.overview_controller = overview_controller.Controller(self.model, self.view, self.get_transfer())
+
+    def refresh_overview(self):
+        """ Re-draws the overview thumbnail after the image has changed """
+        try: self.overview_controller.refresh_image(self.get_transfer())
+        except AttributeError: pass
+
+    def get_transfer(self):
+        """ Returns the function mapping native pixel values to display
+        intensities, or None if the user hasn't adjusted the contrast.
+        """
+        try: return self.contrast_controller.contrast_model.transfer
+        except AttributeError: return None
 
     def update_overview(self):
         try: self.overview_controller.update_viewable_area()
         except AttributeError: pass
 
+    def update_contrast(self):
+        """ Renders any tiles that were scrolled into view since the
+        contrast was last changed.
+        """
+        try: self.contrast_controller.render_visible()
+        except AttributeError: pass
+
     def on_show_popup(self, event):
         if not self.ztf and not self.zoom:
             if not self.polyline:
@@ -378,54 +1049,31 @@ class Controller():
 
     def on_popup_item_selected(self, event):
         self.ztf = True
-        self.on_resize(event)
+        self.fit_to_window()
         self.view.canvas.Refresh()
 
     def on_mouse_motion(self, event):
-        if self.pan_image and self.left_down:
-            aspect = (self.view.aspect*100.0)
-            try:
-                x = int(event.xdata)
-                y = int(event.ydata)
-            except TypeError: 
-                # This is thrown if the user clicks just barely
-                # outside of the image bounds (a few pixels at most),
-                # when the coordinates show (x, y) in the status bar.
-                return
-
-            try:
-                total_x = math.fabs(x - self.previous_x) # total x plane mouse movement
-                total_y = math.fabs(y - self.previous_y) # total y plane mouse movement
-            except AttributeError:
-                total_x = 0;
-                total_y = 0;
-
-            # Force the method to only run if the user has moved their mouse
-            # more than 'aspect' number of pixels. This ensures that the mouse
-            # moves relative to the scroll units of the scrollbar.
-            if (total_x > aspect or total_y > aspect):
-                if (total_x < aspect):
-                    self.pan_view(self.previous_x, y)
-                elif (total_y < aspect):
-                    self.pan_view(x, self.previous_y)
-                else:
-                    self.pan_view(x, y)
+        if self.pan_image and self.left_down and self.pan_origin is not None:
+            self.pan_samples.append((time.time(), wx.GetMousePosition()))
+            del self.pan_samples[:-8]
+            # Coalesce motion events; scroll at most once per frame
+            self.redraw.schedule(self.pan_view)
 
         if event.inaxes == self.view.axes:
             try:
                 self.view.statusbar.SetStatusText("Pixel Position: (%i, %i)" % (event.xdata, event.ydata), 0)
-                self.view.statusbar.SetStatusText("Pixel Intensity: %.4f" % self.model.image_array[event.ydata][event.xdata][0], 1)
+                self.view.statusbar.SetStatusText("Pixel Intensity: %.4f" % self.model.get_intensity(int(event.ydata), int(event.xdata)), 1)
             except:
                 self.view.statusbar.SetStatusText("Pixel Position: (x, y)", 0)
                 self.view.statusbar.SetStatusText("Pixel Intensity", 1)
-        elif event.inaxes == self.view.ov_axes: # check if mouse is in the overlay axes
-            x = event.xdata + self.coral_slab[0]
-            y = event.ydata + self.coral_slab[1]
-            self.view.statusbar.SetStatusText("Pixel Position: (%i, %i)" % (x, y), 0)
-            try:
-                self.view.statusbar.SetStatusText("Pixel Intensity: %.4f" % self.overlay_controller.overlay[event.ydata][event.xdata], 1)
-            except IndexError:
-                pass
+            # Over the overlay, show the overlay's intensity instead
+            if self.overlay_controller is not None and self.overlay_controller.overlay_image is not None:
+                x, y, dx, dy = self.coral_slab
+                if x <= event.xdata < dx and y <= event.ydata < dy:
+                    try:
+                        self.view.statusbar.SetStatusText("Pixel Intensity: %.4f" % self.overlay_controller.get_intensity(int(event.ydata)-y, int(event.xdata)-x), 1)
+                    except IndexError:
+                        pass
 
         if not self.pan_image:
             if self.polyline:
@@ -439,26 +1087,19 @@ class Controller():
                 self.calibrate_controller.on_mouse_motion(event)
 
             if not self.zoom:
-                self.draw_all()
+                # Coalesce motion events; redraw at most once per frame
+                self.redraw.invalidate(self.get_dirty_bbox())
 
     def on_mouse_press(self, event):
         if event.button == 1: # Left mouse button
             self.left_down = True
-            # Set the prev_x and prev_y to the mouse click position
-            try :
-                self.previous_x = int(event.xdata)
-                self.previous_y = int(event.ydata)
-            except TypeError:
-                # This is thrown if the user clicks just barely
-                # outside of the image bounds (a few pixels at most),
-                # when the coordinates show (x, y) in the status bar.
-                pass
             if self.pan_image:
-                self.view.canvas.SetCursor(self.cursor_hand_drag)
+                self.start_pan()
+                self.view.canvas.SetCursor(self.get_cursor('hand_drag'))
             elif self.zoom:
                 self.view.canvas.SetCursor(wx.StockCursor(wx.CURSOR_MAGNIFIER))
             elif self.polyline_cursor_on:
-                self.view.canvas.SetCursor(self.cursor_polyline)
+                self.view.canvas.SetCursor(self.get_cursor('polyline'))
             else:
                 self.view.canvas.SetCursor(wx.StockCursor(wx.CURSOR_DEFAULT))
         elif event.button == 2: # Scroll-wheel button??
@@ -481,6 +1122,7 @@ class Controller():
 
     def on_mouse_release(self, event):
         self.left_down = False
+        self.end_pan()
         if not self.pan_image and not self.zoom:
             if self.polyline:
                 self.polyline_controller.on_mouse_release(event)
@@ -494,11 +1136,11 @@ class Controller():
 
         # Set the cursor accordingly
         if (event.button == 1 or event.button == 3) and self.pan_image:
-            self.view.canvas.SetCursor(self.cursor_hand)
+            self.view.canvas.SetCursor(self.get_cursor('hand'))
         elif (event.button == 1 or event.button == 3) and self.zoom:
             self.view.canvas.SetCursor(wx.StockCursor(wx.CURSOR_MAGNIFIER))
         elif (event.button == 1 or event.button == 3) and self.polyline_cursor_on:
-            self.view.canvas.SetCursor(self.cursor_polyline)
+            self.view.canvas.SetCursor(self.get_cursor('polyline'))
         else:
             if event.button is not 2:
                 self.view.canvas.SetCursor(wx.StockCursor(wx.CURSOR_DEFAULT))
@@ -511,18 +1153,17 @@ class Controller():
         if event.key == ' ' and not self.zoom: # Is the user pressing the SPACE BAR?
             if not self.pan_image:
                 self.pan_image = True
-                self.view.canvas.SetCursor(self.cursor_hand)
+                self.view.canvas.SetCursor(self.get_cursor('hand'))
                 self.view.toolbar.ToggleTool(self.view.toolbar_ids['Pan Image'], True)
         elif event.key == 'shift': # Holding SHIFT while setting pixel_per_unit
             if self.calibrate_controller.polyline_controller is not None:
                 self.calibrate_controller.polyline_controller.shift_down = True
         elif event.key == 'd': # DEBUG
-            if not self.debug:
-                self.debug = True
-                print "DEBUG Activated..."
-            else:
-                self.debug = False
-                print "DEBUG De-Activated..."
+            self.debug = not self.debug
+            try: self.debug_controller.toggle()
+            except AttributeError:
+                from Controllers import debug_controller
+                self.debug_controller = debug_controller.Controller(self)
 
     def on_key_release(self, event):
         if not self.toolbar_pan:
@@ -539,36 +1180,50 @@ class Controller():
  
     def on_scroll(self, event):
         event.Skip()
-        self.update_overview()
+        # The scroll position isn't updated until after this event, and
+        # scrolling fires many events per frame; handle them all at once.
+        self.redraw.schedule(self.update_viewport)
+        self.redraw.schedule(self.update_overview)
         self.state_changed(True)
 
     def on_resize(self, event):
         if event is not None:
             event.Skip()
+        # Dragging the frame's border fires a resize event per pixel;
+        # only resize the image once per frame.
         if self.ztf:
-            try: # ignore first few events before controller instantiation
-                y, = self.view.scroll.GetSizeTuple()[-1:]
-                iHt, = self.model.get_image_shape()[:-1]
-                self.view.aspect = (float(y)/float(iHt))
-                self.resize_image(hide=False)
-                self.view.aspect_cb.SetValue('Zoom to fit')
-                # Update toggle_selector's background. Otherwise, next time we try to
-                # drag zoom, the objects overlaying the image will disappear during drag
-                self.view.toggle_selector.update_background(event)
-                self.view.canvas.Refresh()
-            except AttributeError:
-                pass
+            self.redraw.schedule(self.fit_to_window)
         else:
-            self.cleanup()
-            self.update_overview()
+            self.redraw.schedule(self.refresh_viewport)
+
+    def fit_to_window(self):
+        """ Resizes the image to fit the height of the window (Zoom to fit) """
+        try: # ignore first few events before controller instantiation
+            y, = self.view.scroll.GetSizeTuple()[-1:]
+            iHt, = self.model.get_display_shape()[:-1]
+            self.view.aspect = (float(y)/float(iHt))
+            self.resize_image(hide=False)
+            self.view.aspect_cb.SetValue('Zoom to fit')
+            # Update toggle_selector's background. Otherwise, next time we try to
+            # drag zoom, the objects overlaying the image will disappear during drag
+            self.view.toggle_selector.update_background(None)
+            self.view.canvas.Refresh()
+        except AttributeError:
+            pass
 
-    def on_aspect(self, event, x=0, y=0, always_hide=False):
+    def on_aspect(self, event, x=None, y=None, always_hide=False):
+        """ Resizes the image to the aspect ratio in the combobox, scrolled
+        to pixel position (x, y), or to the same part of the image as
+        before if (x, y) isn't given.
+        """
+        self.stop_momentum()
+        previous_aspect = self.view.aspect
         m = self.ztf_patt.match(self.view.aspect_cb.GetValue()) # Zoom to fit
         if m:
             if self.ztf:
                 return
             self.ztf = True
-            self.on_resize(event)
+            self.fit_to_window()
             self.view.canvas.SetFocus() # Sets focus back to the canvas, otherwise combobox still has keyboard focus
             return
         else: self.ztf = False
@@ -576,24 +1231,18 @@ class Controller():
         m = self.aspect_patt.match(self.view.aspect_cb.GetValue()) # percent
         if not m: self.view.aspect_cb.SetValue(str(int(self.view.aspect*100.0))+'%')
         else:
-            if int(m.group(0)) > 120:
-                self.view.aspect = 1.20
-                self.view.aspect_cb.SetValue('120%')
-            elif int(m.group(0)) < 10:
-                self.view.aspect = 0.1
-                self.view.aspect_cb.SetValue('10%')
-            else:
-                aspect = float(m.group(0))/100.0
-                self.view.aspect = aspect
-                self.view.aspect_cb.SetValue(str(int(m.group(0)))+'%')
+            self.view.aspect = clamp_aspect(float(m.group(0))/100.0)
+            self.view.aspect_cb.SetValue(str(int(round(self.view.aspect*100.0)))+'%')
 
         # Center the screen on the old screen
-        if x == 0 and y == 0:
+        if x is None or y is None:
             # Get the previous locations of the scrollbars and set the
             # new scrollbar positions to the same value when the image
             # is resized.
-            prev_vertical = self.view.scroll.GetScrollPos(wx.VERTICAL)
-            prev_horizontal = self.view.scroll.GetScrollPos(wx.HORIZONTAL)
+            # The scroll position is in pixels, so scale it to the new size.
+            scale = self.view.aspect / previous_aspect
+            prev_vertical = int(self.view.scroll.GetScrollPos(wx.VERTICAL) * scale)
+            prev_horizontal = int(self.view.scroll.GetScrollPos(wx.HORIZONTAL) * scale)
 
             self.resize_image(prev_horizontal, prev_vertical, always_hide=always_hide)
         else:
@@ -608,7 +1257,9 @@ class Controller():
 
     def on_image_info(self, event):
         try: self.image_info_controller.view.Raise()
-        except AttributeError: self.image_info_controller = image_info_controller.Controller(self, self.model)
+        except AttributeError:
+            from Controllers import image_info_controller
+            self.image_info_controller = image_info_controller.Controller(self, self.model)
 
     def on_coral_menu(self, event):
         """ Menu callback event for drawing coral slab rects """
@@ -623,16 +1274,18 @@ class Controller():
         self.toggle_pan(pan_off)
         self.coral = self.view.toolbar.GetToolState(self.view.toolbar_ids['Adjust Target Area'])
         self.coral_locked = False
+        self.filter_jobs.cancel_all() # the region is moving; the running filters are stale
         self.polyline = False
         self.calib = False
         self.view.toolbar.ToggleTool(self.view.toolbar_ids['Draw Polylines'], False)
         self.view.toolbar.ToggleTool(self.view.toolbar_ids['Adjust Calibration Region'], False)
         if not self.coral_controller: # first open
+            from Controllers import coral_controller
             self.coral_controller = coral_controller.Controller(self.view, self.background)
             self.enable_tools(['Filtered Overlays'], True)
         else:
             try: # remove overlay if already added
-                self.view.figure.delaxes(self.view.ov_axes)
+                self.overlay_controller.remove_overlays()
                 self.overlay_controller.view.Destroy()
                 del self.overlay_controller
                 self.overlay_controller = None
@@ -650,6 +1303,7 @@ class Controller():
         self.enable_tools(['Filtered Overlays'], True)
         if alg:
             if not self.overlay_controller:
+                from Controllers import overlay_controller
                 self.overlay_controller = overlay_controller.Controller(self.view, self, self.model, self.background, show, self.rotations, alphas=alphas)
         self.draw_all()
         if alg:
@@ -657,8 +1311,12 @@ class Controller():
         self.cleanup()
 
     def on_contrast(self, event):
-        try: self.contrast_controller.view.Raise()
-        except AttributeError: self.contrast_controller = contrast_controller.Controller(self.view, self.model)
+        try:
+            self.contrast_controller.view.Show()
+            self.contrast_controller.view.Raise()
+        except AttributeError:
+            from Controllers import contrast_controller
+            self.contrast_controller = contrast_controller.Controller(self.view, self.model)
 
     def on_overlay(self, event, alphas=None):
         if not self.coral_locked:
@@ -694,21 +1352,15 @@ class Controller():
                     return
 
             pb = progress_bar.ProgressBar('Exporting Image', 'Initiating export', 5, self.view)
-            temp = self.view.aspect
-            
-            # Change to ZTF first to stop memory issues
-            self.view.aspect_cb.SetValue('Zoom to fit')
-            self.on_aspect(None, 0, 0, always_hide=True) # Set to 100% size
-            
-            self.view.aspect = 1.00
-            self.view.aspect_cb.SetValue(str(int(self.view.aspect*100.0))+'%')
+            try: self.contrast_controller.render_all()
+            except AttributeError: pass
             pb.update('Calculating image size')
-            self.on_aspect(None, 0, 0, always_hide=True) # Set to 100% size
 
             filename = dialog.GetFilename().split(".")[-1]
             if dialog.GetFilterIndex() == 1:
                 pb.update('Saving DXF file')
                 filename = (dialog.GetDirectory() + os.sep + filename + ".dxf")
+                from Controllers import dxf_controller
                 dxf_controller.Controllers().get_model().create_dxf(filename, self.polyline_controller, self.model, self.calibrate_controller)
             else:
                 pb.update('Saving PNG image')
@@ -718,17 +1370,31 @@ class Controller():
 
                 # Save the figure
                 filename = (dialog.GetDirectory() + os.sep + filename + ".png")
-                self.view.figure.savefig(filename, dpi=self.view.figure.dpi)
+                self.save_figure(filename)
 
                 # Toggle polyline animation on
                 self.polyline_controller.set_animated(True, lw)
 
-            self.view.aspect_cb.SetValue(str(int(temp*100.0))+'%')
             pb.update('Finishing up...')
-            self.on_aspect(None, 0, 0) # Set back to current size
-            self.view.scroll.Show()
+            self.cache_background()
             pb.finish('Complete!')
 
+    def save_figure(self, path):
+        """ Saves the whole image, at 100%, to the given path. The canvas
+        only covers the viewport, so the figure is temporarily sized to
+        the whole image; the window itself isn't resized.
+        """
+        y, x = self.model.get_display_shape()
+        size = self.view.figure.get_size_inches()
+        self.view.figure.set_size_inches(x/72.0, y/72.0)
+        self.view.axes.set_xlim(-0.5, x - 0.5)
+        self.view.axes.set_ylim(y - 0.5, -0.5)
+        try:
+            self.view.figure.savefig(path, dpi=self.view.figure.dpi)
+        finally:
+            self.view.figure.set_size_inches(*size)
+            self.set_view_limits()
+
     def on_polyline_menu(self, event):
         """ Menu callback event for drawing polylines """
         if not self.polyline:
@@ -737,6 +1403,19 @@ class Controller():
             self.view.toolbar.ToggleTool(self.view.toolbar_ids['Draw Polylines'], False)
         self.on_polyline(event)
 
+    def on_trace_menu(self, event):
+        """ Menu callback event for tracing growth bands: while on,
+        dragging along a band (or clicking on it) in polyline mode traces
+        it as a polyline
+        """
+        if not self.polyline:
+            self.on_polyline_menu(event)
+        self.polyline_controller.tracing = not self.polyline_controller.tracing
+        if self.polyline_controller.tracing:
+            self.view.statusbar.SetStatusText('Drag along a growth band, or click on one, to trace it', 0)
+        else:
+            self.view.statusbar.SetStatusText('', 0)
+
     def on_polyline(self, event, zoom_off=True, pan_off=True):
         self.toggle_zoom(zoom_off)
         self.toggle_pan(pan_off)
@@ -746,7 +1425,7 @@ class Controller():
         self.calib = False
 
         if not self.polyline_cursor_on:
-            self.view.canvas.SetCursor(self.cursor_polyline)
+            self.view.canvas.SetCursor(self.get_cursor('polyline'))
             self.polyline_cursor_on = True
         else:
             self.view.canvas.SetCursor(wx.StockCursor(wx.CURSOR_DEFAULT))
@@ -755,13 +1434,17 @@ class Controller():
         self.view.toolbar.ToggleTool(self.view.toolbar_ids['Adjust Target Area'], False)
         self.view.toolbar.ToggleTool(self.view.toolbar_ids['Adjust Calibration Region'], False)
         if not self.polyline_controller:
+            from Controllers import polyline_controller
             self.polyline_controller = polyline_controller.Controller(self, self.view, self.background)
+        if not self.polyline:
+            self.polyline_controller.tracing = False
         self.draw_all()
         self.state_changed(True)
 
     def on_lock_polyline(self, event):
         self.polyline = False
         self.polyline_locked = True
+        self.polyline_controller.tracing = False
         self.view.toolbar.ToggleTool(self.view.toolbar_ids['Draw Polylines'], False)
         self.draw_all()
 
@@ -788,6 +1471,7 @@ class Controller():
         self.view.toolbar.ToggleTool(self.view.toolbar_ids['Adjust Target Area'], False)
         self.view.toolbar.ToggleTool(self.view.toolbar_ids['Draw Polylines'], False)
         if not self.calibrate_controller:
+            from Controllers import calibrate_controller
             self.calibrate_controller = calibrate_controller.Controller(self.view, self.background)
             self.enable_tools(['Set Calibration Parameters'], True)
         self.draw_all()
@@ -809,15 +1493,28 @@ class Controller():
         if self.density_controller is not None:
             self.density_controller.view.Show()
         else:
+            from Controllers import density_controller
             self.density_controller = density_controller.Controller(self, self.calibrate_controller.averages)
 
     def on_save(self, event):
         if not self.save_session:
             self.on_save_as(event)
         else:
-            self.save_session.write()
+            self.save_current()
             self.state_changed(False)
 
+    def save_current(self):
+        """ Saves the session of the scan being shown by journaling the
+        edits since it was last saved; the session file itself is written
+        when the journal is next compacted.
+        """
+        if self.journal is None:
+            self.save_session.write()
+            return
+        self.record_edit()
+        self.journal.mark_saved()
+        self.changed = False
+
     def on_save_as(self, event):
         """ Shows a save as dialog where the user choose to save the file
         on their system with a specific filename and extension.
@@ -834,13 +1531,16 @@ class Controller():
             else:
                 dialog.SetFilename(self.model.get_image_name().split('.')[0]+'.xml')
 
+            from lib import save_session
             self.save_session = save_session.SaveSession(self, path)
             self.save_session.write()
+            self.start_journal() # from the newly written session file
             self.state_changed(False)
         else:
             self.state_changed(True)
 
     def on_plugin_properties(self, event=None):
+        from lib import browse_dialog
         browse = browse_dialog.BrowseDialog(None, title='Default Plugin Directory')
         browse.ShowModal()
         browse.Destroy()
@@ -898,7 +1598,7 @@ class Controller():
             self.view.toolbar.ToggleTool(self.view.toolbar_ids['Zoom In'], False)
             self.zoom = False
             self.view.toggle_selector.set_active(False)
-            self.view.canvas.SetCursor(self.cursor_hand)
+            self.view.canvas.SetCursor(self.get_cursor('hand'))
         else:
             self.pan_image = False
             self.view.canvas.SetCursor(wx.StockCursor(wx.CURSOR_DEFAULT))
@@ -925,6 +1625,8 @@ class Controller():
         cy = self.centerY / 2
 
         self.model.rotate_image(self.model.get_image())
+        try: self.contrast_controller.on_rotate()
+        except AttributeError: pass
 
         self.view.axes.cla()
         self.view.init_plot(False) # Redraw
@@ -945,6 +1647,8 @@ class Controller():
                 self.on_overlay(event, alphas=alp)
 
         self.cache_background()
+        self.update_contrast()
+        self.refresh_overview()
 
         if self.startrotation == 0 or self.startrotation == 2:
             # Swap the center's X and Y coordinates to correctly rotate image multiple times
@@ -1023,6 +1727,8 @@ class Controller():
         """
         if changed:
             self.enable_tools(['&Save\tCtrl+S'], True)
+            if self.journal is not None:
+                self.redraw.schedule(self.record_edit)
         else:
             self.enable_tools(['&Save\tCtrl+S'], False)
         self.changed = changed
\ No newline at end of file
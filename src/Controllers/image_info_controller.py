@@ -8,6 +8,7 @@
 #             US Geological Survey (USGS),
 #             Department of Interior (DOI)
 #########################################################
+from Models import metadata_model
 from Views import image_info_view
 
 class Controller():
@@ -15,21 +16,23 @@ class Controller():
     def __init__(self, dicom_controller, model):
         self.dicom_controller = dicom_controller
         self.model = model
-        self.view = image_info_view.View(self, self.model)
+        self.metadata_model = metadata_model.Model()
+        self.elements = self.metadata_model.get_elements(self.model.get_dicom_path())
+        self.view = image_info_view.View(self, len(self.elements))
         self.populate_table()
         self.view.Show()
         
     def populate_table(self):
         self.view.grid.SetColLabelValue(0, "Value")
+        self.view.grid.SetRowLabelSize(185)
         i = 0
-        for data_element in self.model.ds:
-            self.view.grid.SetRowLabelSize(185)
-            self.view.grid.SetRowLabelValue(i, self.model.get_meta_description(data_element))
-            self.view.grid.SetCellValue(i, 0, self.model.get_meta_value(data_element))
+        for description, value in self.elements:
+            self.view.grid.SetRowLabelValue(i, description)
+            self.view.grid.SetCellValue(i, 0, value)
             self.view.grid.SetReadOnly(i, 0, True)
             if (i % 2) == 0:
                 self.view.grid.SetCellBackgroundColour(i, 0, 'light blue')
             i += 1
             
         self.view.grid.AutoSizeColumns()
-        self.view.grid.AutoSizeRows()
\ No newline at end of file
+        self.view.grid.AutoSizeRows()
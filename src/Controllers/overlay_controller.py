@@ -12,24 +12,45 @@
 #             Department of Interior (DOI)
 #########################################################
 from Controllers import plugin_controller
-from Controllers import xml_controller
+from Models import overlay_model
+from lib import buffer_pool
+from lib import memory_tracker
+from lib import profiler
 from lib import progress_bar
 from Views import overlay_view
-from yapsy.PluginManager import PluginManager
 import numpy as np
-import os
 import re
 import wx
 
 class Controller():
-    
+    """ Controls the filtered overlays of the locked coral region. While
+    the user drags an opacity slider, a reduced proxy of the overlays is
+    composited and shown (at most once per frame); the full resolution
+    composite follows when the slider is released or has been still for
+    IDLE_DELAY.
+
+    Only the part of the slab within the viewport (and a MARGIN around it)
+    is composited and drawn at full resolution; the rest is composited as
+    it's scrolled into view (see render_visible()).
+    """
+
+    IDLE_DELAY = 250   # milliseconds
+    MARGIN = 0.5       # of the viewport's size, composited beyond each side of it
+    BUFFER_STEP = 512  # pixels the display buffer grows by (see get_buffer())
+
     def __init__(self, dicom_view, dicom_controller, model, background, show, rotations=0, alphas=None):
         self.dicom_view = dicom_view
         self.dicom_controller = dicom_controller
         self.model = model
+        self.overlay_model = overlay_model.Model(model, dicom_controller.get_overlay_precision())
         self.patt = re.compile('\d+')
         self.overlay = 0.0
         self.overlays = []
+        self.overlay_image = None # the overlay's artist in the image axes
+        self.idle_timer = None    # shows the full resolution composite once dragging stops
+        self.displayed = False    # has the overlay been displayed?
+        self.overlay_rect = None  # [x1, y1, x2, y2] of the slab in self.overlay
+        self.rgba = None          # display buffer, reused from one display to the next
         if alphas is not None:
             self.alphas = alphas
         else:
@@ -45,30 +66,6 @@ class Controller():
             np.rot90(self.overlays[i]) # Rotate the region
         np.rot90(self.overlay)
 
-    def getPluginCount(self):
-        # Get the default plugin directory, using XML
-        path = os.path.expanduser('~')
-        xml = xml_controller.Controller(path + '\.cxvrc.xml')
-        xml.load_file()
-
-        if os.path.exists(os.path.expanduser('~') + os.sep + "plugins"):
-            default_dir = os.path.expanduser('~') + os.sep + "plugins"
-        else:
-            default_dir = self.dicom_view.get_main_dir() + os.sep + "plugins"
-
-        if xml.get_plugin_directory() == "" or xml.get_plugin_directory() is None:
-            directory = [default_dir]
-        else:
-            directory = [default_dir, xml.get_plugin_directory()]
-
-        # Load the plugins from the plugin directory.
-        manager = PluginManager()
-        manager.setPluginPlaces(directory)
-        manager.setPluginInfoExtension('plugin')
-        manager.collectPlugins()
-
-        return len(manager.getAllPlugins())
-        
     def find_items(self, event):
         for tuple in self.view.ids:
             for id in tuple:
@@ -82,6 +79,31 @@ class Controller():
         elif type(wx.FindWindowById(event.GetId())) == wx._controls.TextCtrl:
             self.on_text_ctrl(i, tc, s)
         self.on_slider(i, s, tc)
+        if type(wx.FindWindowById(event.GetId())) == wx._controls.Slider and self.overlays:
+            self.dicom_controller.redraw.schedule(self.display_proxy)
+            if self.idle_timer is None:
+                self.idle_timer = wx.CallLater(self.IDLE_DELAY, self.on_idle)
+            else:
+                self.idle_timer.Restart(self.IDLE_DELAY)
+
+    def on_release(self, event):
+        """ Invoked when the user lets go of an opacity slider """
+        event.Skip()
+        if self.idle_timer is not None:
+            self.idle_timer.Stop()
+        self.on_idle()
+
+    def on_idle(self):
+        """ Replaces the proxy with the full resolution composite """
+        self.idle_timer = None
+        if self.overlays:
+            self.display()
+
+    def display_proxy(self):
+        """ Shows the composite of the reduced proxies of the overlays """
+        if not self.overlays or self.idle_timer is None: # released meanwhile
+            return
+        self.show_composite(self.overlay_model.composite_proxy(self.overlays, self.alphas))
         
     def on_checkbox(self, i, cb, tc, s):
         if cb.GetValue():
@@ -134,87 +156,155 @@ class Controller():
             self.alphas[len(self.alphas) - 1] = 100
 
     def create_overlays(self, alphas=None):
-        """ Initializes the progress bar.
+        """ Initializes the progress bar, which follows the filters' progress
+        and lets the user cancel them.
         
-        Sets the total number of progress bar units to the total
-        ((number of plugins * 2) + 1) for the initial progress bar message
-        (This means that each plugin should send an update message twice; once
-        each for beginning and ending the algorithm).
-        
-        Initializes the plugin controller, which then runs the plugin algorithms.
+        Initializes the plugin controller, which then runs the plugin
+        algorithms as a background job, superseding any still running.
         """
-        pb = progress_bar.ProgressBar('Creating Overlays', 'Locking coral region', ((self.getPluginCount() * 2) + 1), self.dicom_view)
+        pb = progress_bar.ProgressBar('Creating Overlays', 'Locking coral region', plugin_controller.Controller.STEPS,
+                                      self.dicom_view, cancellable=True)
         plugin_controller.Controller(pb, self, self.dicom_controller, self.model, self.rotations, alphas=alphas)
         
         if alphas is not None:
             self.alphas = alphas
 
     def remove_overlays(self):
-        self.dicom_view.figure.delaxes(self.dicom_view.ov_axes)
+        if self.overlay_image is not None:
+            try: self.overlay_image.remove()
+            except ValueError: pass # the axes have since been cleared
+            self.overlay_image = None
 
     def add_overlay(self):
-        x, y, dx, dy = self.dicom_controller.coral_slab
-        iH, iW = self.model.get_image_shape()
-
-        # Swap x and y if image is rotated to correctly
-        # position the filter (otherwise wont be inside bbox)
-        if self.dicom_controller.rotations == 1 or self.dicom_controller.rotations == 3:
-            temp = iH
-            iH = iW
-            iW = temp
-
-        x = float(x)
-        y = float(y)
-        dx = float(dx)
-        dy = float(dy)
-        iH = float(iH)
-        iW = float(iW)
-        l = x/iW
-        b = 1.0 - (dy/iH)
-        w = (dx-x)/iW
-        h = (dy-y)/iH
-        self.dicom_view.ov_axes = self.dicom_view.figure.add_axes((l,b,w,h))
-        self.dicom_view.ov_axes.set_axis_off()
-        self.dicom_view.ov_axes.patch.set_facecolor('none')
-        self.dicom_view.canvas.draw() # cache new axes
         self.dicom_controller.coral_controller.draw_rect(False, True)
 
-    def calc_overlay(self, alphas):
+    def get_extent(self, rect=None):
+        """ Returns the extent (left, right, bottom, top) of the overlay in
+        image coordinates: the locked coral slab, or the given
+        [x1, y1, x2, y2] rect of it.
+        """
+        x, y, dx, dy = self.dicom_controller.coral_slab
+        if rect is not None:
+            x1, y1, x2, y2 = rect
+            return (x + x1 - 0.5, x + x2 - 0.5, y + y2 - 0.5, y + y1 - 0.5)
+        return (x - 0.5, dx - 0.5, dy - 0.5, y - 0.5)
+
+    def get_visible_rect(self, margin=0):
+        """ Returns the [x1, y1, x2, y2] rect of the slab (in the slab's
+        coordinates) within the viewport, grown by margin times the
+        viewport's size on each side, or None if the slab isn't in view.
+        """
+        vx1, vy1, vx2, vy2 = self.dicom_controller.zoom_model.get_viewable_rect(self.dicom_view)
+        mx = int((vx2 - vx1) * margin)
+        my = int((vy2 - vy1) * margin)
+        x, y, dx, dy = self.dicom_controller.coral_slab
+        h, w = self.overlays[0].shape[:2]
+        x1 = max(vx1 - mx - x, 0)
+        y1 = max(vy1 - my - y, 0)
+        x2 = min(vx2 + mx - x, w)
+        y2 = min(vy2 + my - y, h)
+        if x1 >= x2 or y1 >= y2:
+            return None
+        return [x1, y1, x2, y2]
+
+    def render_visible(self, redraw=True):
+        """ Composites and draws the overlay again if part of the slab
+        that isn't composited yet has been scrolled (or zoomed) into view.
+
+        @var redraw - False if the caller redraws the canvas itself
+        """
+        if not self.displayed or not self.overlays or self.idle_timer is not None:
+            return
+        needed = self.get_visible_rect()
+        if needed is None:
+            return
+        rect = self.overlay_rect
+        if rect is not None and rect[0] <= needed[0] and rect[1] <= needed[1] \
+                            and needed[2] <= rect[2] and needed[3] <= rect[3]:
+            return
+        self.display(redraw=redraw)
+
+    def get_intensity(self, row, col):
+        """ Returns the composite's intensity at (col, row) of the slab;
+        raises IndexError where it isn't composited
+        """
+        x1, y1, x2, y2 = self.overlay_rect
+        if not (y1 <= row < y2 and x1 <= col < x2):
+            raise IndexError(row, col)
+        return self.overlay[row - y1][col - x1]
+
+    def calc_overlay(self, alphas, rect=None):
         """ Calculates the visible overlay, depending on the transparency
         levels set for each of the overlays.
+
+        @var rect - the [x1, y1, x2, y2] of the slab to composite
         """
         # Use linear combination for displaying overlay
-        self.overlay = 0.0 # Reset to 0.0; if we don't the new overlays are appended to the old!
         if alphas is None:
-            for ov in range(len(self.overlays)):
-                self.overlay += (self.alphas[ov]/100.0) * self.overlays[ov]
-        else:
-            for ov in range(len(self.overlays)):
-                self.overlay += (alphas[ov]/100.0) * self.overlays[ov]
-        self.overlay = self.model.invert_grayscale(self.overlay)
+            alphas = self.alphas
+        self.overlay = self.overlay_model.composite(self.overlays, alphas, rect=rect)
+        self.overlay_rect = rect
+        for i in xrange(len(self.overlays)):
+            memory_tracker.track('overlays', 'overlay %d' % i, self.overlays[i])
+        memory_tracker.track('overlays', 'composite', self.overlay)
+
+    @profiler.timed('overlay display')
+    def display(self, event=None, alphas=None, dx=0, dy=0, redraw=True):
+        """ Composites the overlay within (and around) the viewport and
+        draws it over the slab
 
-    def display(self, event=None, alphas=None, dx=0, dy=0):
-        self.calc_overlay(alphas)
+        @var redraw - False if the caller redraws the canvas itself
+        """
+        if not self.overlays:
+            return
+        self.displayed = True
+        rect = self.get_visible_rect(self.MARGIN)
+        if rect is None: # scrolled out of view
+            self.overlay = None
+            self.overlay_rect = None
+            self.remove_overlays()
+            if redraw:
+                self.dicom_controller.cache_background()
+            return
+        self.calc_overlay(alphas, rect)
 
         if dx > 0:
             x = dx
             y = dy
         else:
-            try:
-                y, x = self.overlay.shape
-            except AttributeError:
-                return
-
-        rgba, ptr = self.model.allocate_array((y, x, 4))
-        rgba = self.model.set_display_data(rgba, self.overlay, 1.0)
-
-        # Restore the canvas to what the background should be. Otherwise, when re-opening
-        # the overlay view after it's been closed, and we're zoomed in, the zoom to fit
-        # background is shown over our zoomed image.
-        self.dicom_view.canvas.restore_region(self.dicom_controller.background)
-        self.dicom_view.ov_axes.draw_artist(self.dicom_view.ov_axes.imshow(rgba, animated=True))
-        self.dicom_view.canvas.blit(self.dicom_view.ov_axes.bbox)
-        self.dicom_controller.background = self.dicom_view.canvas.copy_from_bbox(self.dicom_view.axes.bbox)
-        self.dicom_controller.draw_all()
-
-        self.model.deallocate_array(ptr)
\ No newline at end of file
+            y, x = self.overlay.shape
+        self.show_composite(self.overlay, (y, x), rect, redraw)
+
+    def get_buffer(self, y, x):
+        """ Returns a y by x RGBA view of the overlay's display buffer.
+        The visible rect changes size with every zoom and with pans at the
+        slab's edges, so rather than a pooled buffer of each size, one
+        buffer is kept and only replaced by a larger one (rounded up to
+        BUFFER_STEP) when the rect no longer fits in it.
+        """
+        rgba = self.rgba
+        if rgba is None or rgba.shape[0] < y or rgba.shape[1] < x:
+            step = self.BUFFER_STEP
+            shape = (-(-y // step) * step, -(-x // step) * step)
+            if rgba is not None:
+                shape = (max(shape[0], rgba.shape[0]), max(shape[1], rgba.shape[1]))
+                buffer_pool.discard(rgba) # freed, not kept idle
+            self.rgba = rgba = buffer_pool.acquire(shape + (4,))
+        return rgba[:y, :x]
+
+    def show_composite(self, overlay, shape=None, rect=None, redraw=True):
+        """ Shows the given composite over the coral slab, or the given
+        [x1, y1, x2, y2] rect of it, stretched to its extent (so a reduced
+        proxy covers it too)
+        """
+        y, x = shape or overlay.shape
+
+        # Drop the previous overlay's artist before its buffer is refilled
+        self.remove_overlays()
+        rgba = self.model.set_display_data(self.get_buffer(y, x), overlay, 1.0)
+
+        # The overlay is drawn over the coral slab in the image axes, so it
+        # pans and zooms with the image and is part of the cached background.
+        self.overlay_image = self.dicom_view.axes.imshow(rgba, extent=self.get_extent(rect), aspect='auto')
+        if redraw:
+            self.dicom_controller.cache_background()
\ No newline at end of file
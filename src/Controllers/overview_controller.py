@@ -8,27 +8,52 @@
 #             US Geological Survey (USGS),
 #             Department of Interior (DOI)
 #########################################################
+from matplotlib.patches import Rectangle
 from Views import overview_view
+import wx
 
 class Controller():
+
+    FRAME_INTERVAL = 16 # milliseconds between indicator redraws (~60 Hz)
     
-    def __init__(self, model, dicom_view):
+    def __init__(self, model, dicom_view, transfer=None):
         self.model = model
         self.dicom_view = dicom_view
-        self.view = overview_view.View(self, self.model)
+        self.view = overview_view.View(self, self.model, transfer)
         self.canvas = self.view.canvas
         self.axes = self.view.axes
+        self.timer = None
+        self.create_indicator()
         self.canvas.draw()  # cache clean slate canvas background
         self.background = self.canvas.copy_from_bbox(self.axes.bbox)
         self.drag = False
         self.update_viewable_area()
         
+    def refresh_image(self, transfer=None):
+        """ Re-draws the thumbnail (e.g. after a rotation or contrast change) """
+        self.view.show_image(transfer)
+        self.create_indicator()
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.axes.bbox)
+        self.update_viewable_area()
+
     def update_viewable_area(self):
+        """ Schedules a redraw of the viewable area indicator. Redraws are
+        throttled to the display's refresh rate, so any number of scroll or
+        resize events within one frame cost a single blit.
+        """
+        if self.timer is None:
+            self.timer = wx.CallLater(self.FRAME_INTERVAL, self.draw_viewable_area)
+
+    def draw_viewable_area(self):
+        self.timer = None
+        if not self.view: # closed before the frame was drawn
+            return
         self.canvas.restore_region(self.background)
         for each in self.calculate_viewable_rect():
             self.draw_viewable_rect(*each)
         self.canvas.blit(self.axes.bbox)
-        
+
     def calculate_viewable_rect(self):
         cx, cy = self.dicom_view.scroll.GetClientSizeTuple()
         cx *= (1.0/self.dicom_view.aspect)
@@ -42,30 +67,27 @@ class Controller():
         if sy == 0.0: sy = 20.0
         return [(cx, cy, sx, sy)]
         
+    def create_indicator(self):
+        """ Adds the viewable area indicator to the axes. The same two
+        rectangles (a wide white outline under a thin blue line) are
+        re-used for every update; only their bounds change.
+        """
+        self.outline = Rectangle((0, 0), 0, 0, fill=False, edgecolor='w', linewidth=2, animated=True)
+        self.inline = Rectangle((0, 0), 0, 0, fill=False, edgecolor='b', linewidth=1, animated=True)
+        self.axes.add_patch(self.outline)
+        self.axes.add_patch(self.inline)
+
     def draw_viewable_rect(self, cx, cy, sx, sy):
-        y, x = self.model.get_image_shape()
+        y, x = self.model.get_image().shape[:2]
         dx = sx+cx
         dy = sy+cy
-        if ((dx) > x) and ((dy) > y): # viewable area > x and y image bounds
-            self.axes.draw_artist(self.axes.hlines([sy, y-20], sx, x, colors='w', linestyles='solid', linewidth=2, animated=True))
-            self.axes.draw_artist(self.axes.hlines([sy, y-20], sx, x, colors='b', linestyles='solid', linewidth=1, animated=True))
-            self.axes.draw_artist(self.axes.vlines([sx, x-20], sy, y, colors='w', linestyles='solid', linewidth=2, animated=True))
-            self.axes.draw_artist(self.axes.vlines([sx, x-20], sy, y, colors='b', linestyles='solid', linewidth=1, animated=True))
-        elif (dx) > x:   # viewable area > x image bounds
-            self.axes.draw_artist(self.axes.hlines([sy, dy], sx, x, colors='w', linestyles='solid', linewidth=2, animated=True))
-            self.axes.draw_artist(self.axes.hlines([sy, dy], sx, x, colors='b', linestyles='solid', linewidth=1, animated=True))
-            self.axes.draw_artist(self.axes.vlines([sx, x-20], sy, dy, colors='w', linestyles='solid', linewidth=2, animated=True))
-            self.axes.draw_artist(self.axes.vlines([sx, x-20], sy, dy, colors='b', linestyles='solid', linewidth=1, animated=True))
-        elif (dy) > y:   # viewable area > y image bounds
-            self.axes.draw_artist(self.axes.hlines([sy, y-20], sx, dx, colors='w', linestyles='solid', linewidth=2, animated=True))
-            self.axes.draw_artist(self.axes.hlines([sy, y-20], sx, dx, colors='b', linestyles='solid', linewidth=1, animated=True))
-            self.axes.draw_artist(self.axes.vlines([sx, dx], sy, y, colors='w', linestyles='solid', linewidth=2, animated=True))
-            self.axes.draw_artist(self.axes.vlines([sx, dx], sy, y, colors='b', linestyles='solid', linewidth=1, animated=True))
-        else:   # viewable area < image bounds
-            self.axes.draw_artist(self.axes.hlines([sy, dy], sx, dx, colors='w', linestyles='solid', linewidth=2, animated=True))
-            self.axes.draw_artist(self.axes.hlines([sy, dy], sx, dx, colors='b', linestyles='solid', linewidth=1, animated=True))
-            self.axes.draw_artist(self.axes.vlines([sx, dx], sy, dy, colors='w', linestyles='solid', linewidth=2, animated=True))
-            self.axes.draw_artist(self.axes.vlines([sx, dx], sy, dy, colors='b', linestyles='solid', linewidth=1, animated=True))
+        if dx > x: # viewable area > x image bounds
+            dx = x-20
+        if dy > y: # viewable area > y image bounds
+            dy = y-20
+        for rect in (self.outline, self.inline):
+            rect.set_bounds(sx, sy, dx-sx, dy-sy)
+            self.axes.draw_artist(rect)
             
     def on_mouse_motion(self, event):
         if not self.drag: return
@@ -77,7 +99,10 @@ class Controller():
         y -= self.mouse_offset_y
         y /= (1.0/self.dicom_view.aspect)
         y /= float(self.dicom_view.scroll.GetScrollPixelsPerUnit()[1])
-        self.dicom_view.scroll.Scroll(x, y)
+        self.dicom_view.scroll.Scroll(int(x), int(y))
+        # Redraw the image's viewport at most once per frame
+        controller = self.dicom_view.controller
+        controller.redraw.schedule(controller.update_viewport)
         self.update_viewable_area()
     
     def on_mouse_press(self, event):
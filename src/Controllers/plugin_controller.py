@@ -8,117 +8,130 @@
 #             US Geological Survey (USGS),
 #             Department of Interior (DOI)
 #########################################################
-from Controllers import xml_controller
 from Views import overlay_view
+from lib import filter_cache
+from lib import filter_pipeline
+from lib import jobs
+from lib import memory_tracker
+from lib import plugin_loader
 from lib import progress_bar
-from yapsy.PluginManager import PluginManager
 import numpy as np
-import os
-import threading
 import wx
 
-class Controller(threading.Thread):
+class Controller():
     """ The plugin_controller allows the user to write their
     own Python scripts for the manipulation of the images, via
     image manipulation algorithms. This class facilitates the
     loading of the files, the running of the scripts, etc.
+
+    The filters run as a background job of the dicom_controller's
+    filter_jobs; locking a coral region again supersedes the job, and
+    the overlays of a superseded job are never shown.
     """
 
+    JOB = 'filters' # kind of job in the dicom_controller's filter_jobs
+    STEPS = 100     # steps of the progress bar
+
     def __init__(self, pb, overlay_controller, dicom_controller, model, rotations, alphas=None):
-        threading.Thread.__init__(self)
         self.pb = pb # progress bar
         self.controller = overlay_controller
         self.dicom_controller = dicom_controller
         self.model = model
         self.rotations = rotations
         self.alphas = alphas
-        self.start()
+        self.coral_slab = dicom_controller.coral_slab # as locked when the job started
+        self.job = jobs.Job('filter plugins', self.run, on_done=self.on_done,
+                            on_error=self.on_error, on_cancelled=self.on_cancelled)
+        dicom_controller.filter_jobs.submit(self.JOB, self.job)
+        self.poll()
+
+    def run(self, token):
+        """ Runs the given algorithms; the job's work, so the overlay
+        controller is left alone until on_done()
+        """
+        self.job.post(self.set_progress, 0.0, 'Retrieving coral region')
+
+        # Load in the user defined coral slab region of the original
+        # dicom pixel data, normalized
+        x, y, dx, dy = self.coral_slab
+        coral_slab = self.model.get_normalized_region(x, y, dx, dy, self.rotations)
+        memory_tracker.track('plugins', 'coral_slab', coral_slab)
+        token.check()
+
+        # Run every plugin's filter over the slab; the overlays come back
+        # in the order of the plugins. Overlays of the same image, slab and
+        # rotation are loaded from the disk cache instead.
+        plugins = plugin_loader.get_plugins(self.dicom_controller.view.get_main_dir())
+        cache = filter_cache.get_cache(self.dicom_controller.get_filter_cache_size())
+        pipeline = filter_pipeline.Pipeline(filter_pipeline.get_filters(plugins, self.model), cache)
+        digest = self.model.get_digest() + repr((x, y, dx, dy, self.rotations % 4))
+        progress = lambda fraction, message: self.job.post(self.set_progress, fraction, message)
+        store = self.controller.overlay_model.store # kept in the user's precision
+        overlays = pipeline.run(coral_slab, progress=progress, token=token, digest=digest, store=store)
 
-    def run(self):
-        """ Runs the given algorithms """
-        self.controller.overlays = []
-        if self.alphas is None:
-            self.controller.alphas = []
+        # Add the original coral_slab to the overlay
+        return overlays + [store(coral_slab)]
 
+    def set_progress(self, fraction, message):
         if self.pb is not None:
-            wx.CallAfter(self.pb.update, 'Retrieving coral region')
-
-        # Load in original dicom pixel data and normalize
-        coral_slab = self.model.ds.pixel_array.astype(np.double)
-        coral_slab = np.rot90(coral_slab, self.rotations)
-        coral_slab = self.model.normalize_intensity(coral_slab)
-
-        # Cut down dicom pixel data to user defined coral slab region
-        x, y, dx, dy = self.dicom_controller.coral_slab
-        coral_slab = coral_slab[y:dy, x:dx]
-
-        # Get the default plugin directory, using XML
-        path = os.path.expanduser('~')
-        xml = xml_controller.Controller(path + '\.cxvrc.xml')
-        xml.load_file()
-
-        if os.path.exists(os.path.expanduser('~') + os.sep + "plugins"):
-            default_dir = os.path.expanduser('~') + os.sep + "plugins"
-        else:
-            default_dir = self.dicom_controller.view.get_main_dir() + os.sep + "plugins"
-
-        if xml.get_plugin_directory() == "" or xml.get_plugin_directory() is None:
-            directory = [default_dir]
+            self.pb.counter = 1 + int(fraction * (self.STEPS - 1))
+            self.pb.poll(message or '')
+
+    def poll(self):
+        """ Keeps the progress dialog's Cancel button responsive while
+        the job is running
+        """
+        if self.pb is None:
+            return
+        if not self.pb.poll():
+            self.job.cancel()
         else:
-            directory = [default_dir, xml.get_plugin_directory()]
-
-        # Load the plugins from the default plugin directory.
-        manager = PluginManager()
-        manager.setPluginPlaces(directory)
-        manager.setPluginInfoExtension('plugin')
-        manager.collectPlugins()
-    
-        # Loop over all plugins that have been found
-        count = 0;
-        for plugin in manager.getAllPlugins():
-            # Initialize the plugin so that we can call it's methods
-            plugin.plugin_object.initPlugin(self.controller, coral_slab, self.model, self.pb, count, self.alphas)
-
-            # Run the plugin's algorithm
-            plugin.plugin_object.calc_filter()
-
-            # Update count so that the next filter will be added to the next overlay
-            count += 1
+            wx.CallLater(100, self.poll)
 
-        # Add the original coral_slab to the overlay
-        self.controller.overlays.append(coral_slab)
+    def end(self):
+        self.dicom_controller.filter_jobs.finished(self.JOB, self.job)
+        if self.pb is not None:
+            self.pb.Destroy()
+            self.pb = None
 
+    def on_done(self, overlays):
+        self.dicom_controller.filter_jobs.finished(self.JOB, self.job)
+        self.controller.overlays = overlays
         if self.alphas is None:
-            self.controller.alphas.append(100)
+            self.controller.alphas = [0] * (len(overlays) - 1) + [100]
         else:
-            self.controller.alphas = []
             self.controller.alphas = self.alphas
 
-        wx.CallAfter(self.controller.add_overlay)
+        self.controller.add_overlay()
 
         # Update the progress bar to let the user know we've finished
         # running the algorithms
         if self.pb is not None:
-            wx.CallAfter(self.pb.finish, 'Finishing up')
+            pb, self.pb = self.pb, None
+            pb.finish('Finishing up')
 
         # Display the filters
+        self.controller.display()
         if self.controller.show and self.alphas is None:
-            # Get the size of alphas (number of filters) minus one.
-            # The last alpha should be 0. Set all the alphas to the same
-            # value (except for the last one), so divide 100 by the number
-            # of alphas minus one.
-#            value = 100 / (len(self.controller.alphas) - 1)
-            value = 0
-            for i in range(len(self.controller.alphas) - 1):
-                self.controller.alphas[i] = int(value)
-
-            # Set the last one to 0 ourselves just to make sure
-            self.controller.alphas[len(self.controller.alphas) - 1] = 100
-
-            wx.CallAfter(self.controller.display)
-            wx.CallAfter(self.controller.view.Show)
-        else:
-            wx.CallAfter(self.controller.display)
-
-    def calc_filter(self):
-        raise NotImplementedError( "Algorithm needs to be implemented!" )
\ No newline at end of file
+            self.controller.view.Show()
+
+    def on_error(self, error):
+        superseded = self.job.superseded
+        self.end()
+        if superseded:
+            return
+        self.unlock()
+        wx.MessageBox('The filter plugins could not be run:\n\n' + str(error), 'Filter Error', wx.OK | wx.ICON_ERROR)
+
+    def on_cancelled(self):
+        self.end()
+        if not self.job.superseded: # cancelled by the user
+            self.unlock()
+            self.dicom_controller.view.statusbar.SetStatusText('Filtering cancelled', 0)
+
+    def unlock(self):
+        """ Leaves the coral region unlocked, so the filters are run again
+        the next time the overlays are asked for
+        """
+        self.dicom_controller.coral_locked = False
+        self.dicom_controller.draw_all()
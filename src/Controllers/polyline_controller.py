@@ -10,6 +10,7 @@
 #             US Geological Survey (USGS),
 #             Department of Interior (DOI)
 #########################################################
+from Models import band_trace_model
 from Models import polyline_model as pl
 import numpy as np
 import math
@@ -35,6 +36,9 @@ class Controller():
         self.shift_down = False
         self.polylines = []
         self.curr_pl = None
+        self.tracing = False # left-drags trace growth bands (see trace_stroke())
+        self.stroke = None   # (x, y) points of the stroke being drawn
+        self.tracer = band_trace_model.Model()
         self.color_map = {'Red' : '#FF0000',
                           'Green' : '#00FF00',
                           'Blue' : '#0000FF',
@@ -66,10 +70,10 @@ class Controller():
         self.calib = calib
 
     def on_mouse_motion(self, event):
+        if self.stroke is not None:
+            self.extend_stroke(event)
+            return
         if len(self.polylines) == 0: return
-        if event.inaxes == self.dicom_view.ov_axes:
-            event.xdata += self.dicom_controller.coral_slab[0]
-            event.ydata += self.dicom_controller.coral_slab[1]
         if self.drag_v:
             self.dicom_view.canvas.SetCursor(self.cursor)
             self.drag_vertex(event)
@@ -150,9 +154,6 @@ class Controller():
         except: pass
 
     def on_mouse_press(self, event, vert=True):
-        if event.inaxes == self.dicom_view.ov_axes:
-            event.xdata += self.dicom_controller.coral_slab[0]
-            event.ydata += self.dicom_controller.coral_slab[1]
         if event.button == 1:
             self.on_left_click(event, vert)
         elif event.button == 3:
@@ -161,6 +162,8 @@ class Controller():
     def on_mouse_release(self, event):
         self.drag_v = False
         self.drag_pl = False
+        if self.stroke is not None:
+            self.trace_stroke()
 
     def on_key_press(self, event, shift=False):
         self.shift_down = shift
@@ -173,13 +176,16 @@ class Controller():
             if vert:
                 self.dicom_view.canvas.SetCursor(self.cursor)
             return
+        if self.tracing and not self.connect:
+            self.start_stroke(event)
+            return
         if self.connect:
             self.append_tmp_line()
         else:
             self.curr_pl = pl.Polyline(self, self.axes)
             self.polylines.append(self.curr_pl)
             self.connect = True
-            self.dicom_controller.changed = True
+            self.dicom_controller.state_changed(True)
         self.curr_pl.add_vertex(event.xdata, event.ydata)
 
     def on_right_click(self, event, vert=True):
@@ -220,6 +226,7 @@ class Controller():
 
         for pl in self.polylines:
             self.curr_pl = pl
+            pl.trace = None
             v = 0
             for line in pl.lines:
                 # Get the vertices of the line
@@ -279,6 +286,29 @@ class Controller():
 
         return (A * B * C * D)
         
+    def get_extent(self):
+        """ Returns the (x1, y1, x2, y2) data extent of the polyline being
+        edited, including the temporary line following the mouse, or None
+        if no polyline is being edited.
+        """
+        xs = []
+        ys = []
+        artists = [self.tmp_line, self.left_line, self.right_line]
+        if self.curr_pl:
+            artists.extend(self.curr_pl.verticies)
+            x, y = self.curr_pl.label.get_position()
+            xs.append(x)
+            ys.append(y)
+        for artist in artists:
+            if artist is not None:
+                xs.extend(artist.get_xdata())
+                ys.extend(artist.get_ydata())
+        xs = [x for x in xs if x is not None]
+        ys = [y for y in ys if y is not None]
+        if not xs or not ys:
+            return None
+        return (min(xs), min(ys), max(xs), max(ys))
+
     def over_polyline(self, event):
         self.picked = None
         for polyline in self.polylines:
@@ -294,7 +324,7 @@ class Controller():
     def delete_polyline(self, event):
         self.drag_v = False
         self.drag_pl = False
-        self.dicom_controller.changed = True
+        self.dicom_controller.state_changed(True)
         self.polylines.remove(self.curr_pl)
         for i in range(len(self.polylines)):
             self.polylines[i].set_label(i)
@@ -302,7 +332,8 @@ class Controller():
     def add_vertex(self, event):
         self.drag_v = False
         self.drag_pl = False
-        self.dicom_controller.changed = True
+        self.dicom_controller.state_changed(True)
+        self.curr_pl.trace = None # edited by hand; no longer the traced band
         line_index = self.curr_pl.get_line_index(self.picked)
         new_line = self.curr_pl.insert_line(line_index+1, [0,0], [0,0])
         new_vertex = self.curr_pl.insert_vertex(line_index+1,
@@ -321,7 +352,8 @@ class Controller():
     def delete_vertex(self, event):
         self.drag_v = False
         self.drag_pl = False
-        self.dicom_controller.changed = True
+        self.dicom_controller.state_changed(True)
+        self.curr_pl.trace = None
         if self.curr_pl.is_first(self.picked):
             self.curr_pl.remove_vertex(0)
             self.curr_pl.remove_line(0)
@@ -356,7 +388,8 @@ class Controller():
             self.curr_pl = None
 
     def drag_vertex(self, event):
-        self.dicom_controller.changed = True
+        self.dicom_controller.state_changed(True)
+        self.curr_pl.trace = None
         i = self.curr_pl.get_vertex_index(self.picked)
         self.curr_pl.set_vertex(self.picked, event.xdata, event.ydata)
         if not self.curr_pl.is_first(self.picked):
@@ -371,7 +404,8 @@ class Controller():
                                   [event.ydata, line.get_ydata()[1]])
 
     def drag_polyline(self, event):
-        self.dicom_controller.changed = True
+        self.dicom_controller.state_changed(True)
+        self.curr_pl.trace = None
 
         # TODO: TypeError thrown here when the user's mouse
         # goes outside of the canvas while dragging polyline
@@ -423,6 +457,8 @@ class Controller():
         else:
             for each in self.popup_vertex_data():
                 self.add_option(self.menu, *each)
+        if self.curr_pl.trace is not None:
+            self.add_option(self.menu, 'Vertex Spacing...', self.set_spacing)
         color_menu = wx.Menu()
         for each in self.popup_color_data():
             self.add_option(color_menu, *each)
@@ -460,6 +496,118 @@ class Controller():
                 ('Black', self.set_color)
                 ]
 
+    def start_stroke(self, event):
+        """ Starts the stroke the user draws along a growth band """
+        if event.xdata is None or event.ydata is None:
+            return
+        self.stroke = [(event.xdata, event.ydata)]
+        self.tmp_line, = self.axes.plot([event.xdata], [event.ydata],
+                                        c='#00FF00', linestyle='--',
+                                        zorder=1, animated=True)
+
+    def extend_stroke(self, event):
+        if event.xdata is None or event.ydata is None:
+            return
+        self.stroke.append((event.xdata, event.ydata))
+        xs, ys = zip(*self.stroke)
+        self.tmp_line.set_data(xs, ys)
+
+    def trace_stroke(self):
+        """ Traces the growth band along the stroke the user has drawn
+        and adds it as a polyline. A click, rather than a drag, is a seed
+        the band has to cross; the band is traced across the target area
+        through it (see get_seed_stroke()).
+        """
+        stroke, self.stroke = self.stroke, None
+        self.tmp_line = None
+        seed = None
+        xs, ys = zip(*stroke)
+        if max(max(xs) - min(xs), max(ys) - min(ys)) < 3: # a click
+            seed = stroke[0]
+            stroke = self.get_seed_stroke(seed)
+        image, origin = self.get_trace_image(*self.tracer.get_corridor(stroke))
+        if image is None:
+            return
+        path = self.tracer.trace(image, origin, stroke, seed=seed)
+        self.create_polyline(path)
+        self.dicom_controller.view.statusbar.SetStatusText('Traced polyline ' + self.curr_pl.get_label(), 0)
+
+    def get_seed_stroke(self, seed):
+        """ Returns the stroke through the seed across the short side of
+        the target area (or of the image, if there's no target area): the
+        direction the growth bands of a slab run in
+        """
+        y, x = self.dicom_controller.model.get_display_shape()
+        x1, y1, x2, y2 = 0, 0, x, y
+        if self.dicom_controller.coral_controller is not None:
+            sx, sy, dx, dy = self.dicom_controller.coral_slab
+            x1, y1, x2, y2 = min(sx, dx), min(sy, dy), max(sx, dx), max(sy, dy)
+        if x2 - x1 < y2 - y1:
+            return [(x1, seed[1]), (x2, seed[1])]
+        return [(seed[0], y1), (seed[0], y2)]
+
+    def get_trace_image(self, x1, y1, x2, y2):
+        """ Returns the intensities of the [x1, y1, x2, y2] rect the band
+        is traced on, and the (x, y) of its top-left pixel: the filtered
+        overlay, as composited, within the locked target area, the image
+        elsewhere. Returns (None, None) if the rect is outside of both.
+        """
+        y, x = self.dicom_controller.model.get_display_shape()
+        overlays = self.dicom_controller.overlay_controller
+        if self.dicom_controller.coral_locked and overlays is not None and overlays.overlays:
+            sx, sy, dx, dy = self.dicom_controller.coral_slab
+            y, x = overlays.overlays[0].shape[:2]
+            rect = [max(x1 - sx, 0), max(y1 - sy, 0), min(x2 - sx, x), min(y2 - sy, y)]
+            if rect[0] < rect[2] and rect[1] < rect[3]:
+                image = overlays.overlay_model.composite(overlays.overlays, overlays.alphas, 'trace', rect)
+                return image, (sx + rect[0], sy + rect[1])
+        x1, y1, x2, y2 = max(x1, 0), max(y1, 0), min(x2, x), min(y2, y)
+        if x1 >= x2 or y1 >= y2:
+            return None, None
+        image = self.dicom_controller.model.get_normalized_region(x1, y1, x2, y2, self.dicom_controller.rotations)
+        return 1 - image, (x1, y1) # inverted, as displayed
+
+    def create_polyline(self, path, spacing=band_trace_model.Model.SPACING):
+        """ Adds the traced path as a polyline with a vertex about every
+        spacing pixels along it. The path is kept with the polyline, so
+        its vertex spacing can be changed later (see set_spacing()).
+        """
+        polyline = pl.Polyline(self, self.axes)
+        polyline.trace = path
+        self.set_vertices(polyline, self.tracer.get_vertices(path, spacing))
+        self.polylines.append(polyline)
+        polyline.set_label(self.polylines.index(polyline))
+        self.curr_pl = polyline
+        self.dicom_controller.state_changed(True)
+
+    def set_vertices(self, polyline, vertices):
+        """ Replaces the vertices (and lines) of the polyline """
+        polyline.verticies = []
+        polyline.remove_lines()
+        for x, y in vertices:
+            if polyline.verticies:
+                prev_vertex = polyline.verticies[-1]
+                polyline.add_line([prev_vertex.get_xdata()[0], x],
+                                  [prev_vertex.get_ydata()[0], y])
+            polyline.add_vertex(x, y)
+        polyline.color = '#FF0000'
+        polyline.set_colors()
+
+    def set_spacing(self, event):
+        """ Popup menu callback: re-places the vertices of the traced
+        polyline the given number of pixels apart along its band
+        """
+        self.drag_v = False
+        self.drag_pl = False
+        spacing = wx.GetNumberFromUser('Pixels between the vertices along the band:', '',
+                                       'Vertex Spacing', self.tracer.SPACING, 2, 1000, self.dicom_view)
+        if spacing < 0: # cancelled
+            return
+        self.set_vertices(self.curr_pl, self.tracer.get_vertices(self.curr_pl.trace, spacing))
+        self.curr_pl.set_label(self.polylines.index(self.curr_pl))
+        self.dicom_controller.state_changed(True)
+        self.dicom_controller.draw_all()
+
     def get_line_width(self):
         """ Returns the current width of the polylines. We only
         need to check the first one, since they should all be the
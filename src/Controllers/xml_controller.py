@@ -9,7 +9,6 @@
 #             Department of Interior (DOI)
 #########################################################
 import chilkat # XML API
-import wx
 
 class Controller():
     """ xml_controller controls all xml file querying. Methods
@@ -36,65 +35,66 @@ class Controller():
         self.xml.NewChild2("plugin_directory", "")
         return self.xml.SaveXml(self.file_path)
 
-    def create_session(self, dc):
+    def create_session(self, session):
         """ Creates an XML file with data from the user's current session.
         This method is called when the user attempts to save their session.
         
-        @var dc - dicom_controller instance
+        @var session - session dictionary (see SaveSession.get_session())
         @return - True if the file has saved successfully
         """
         # Root element
         self.xml.put_Tag("session")
 
         # File path/name
-        self.xml.NewChild2("filename", dc.model.get_dicom_path().encode('ascii', 'ignore'))
+        self.xml.NewChild2("filename", session['filename'].encode('ascii', 'ignore'))
 
         # Zoom factor/viewable area of screen
         screen = self.xml.NewChild("screen", "")
-        screen.NewChild2("aspect", str(dc.view.aspect))
+        screen.NewChild2("aspect", str(session['aspect']))
         scrollbars = screen.NewChild("scrollbars", "")
-        vertical = dc.view.scroll.GetScrollPos(wx.VERTICAL)
-        horizontal = dc.view.scroll.GetScrollPos(wx.HORIZONTAL)
+        scrollbars.AddAttribute("units", "pixels")
+        horizontal, vertical = session['scroll']
         scrollbars.NewChild2("x_pos", str(horizontal))
         scrollbars.NewChild2("y_pos", str(vertical))
 
         # Image rotations
-        self.xml.NewChild2("rotations", str(dc.rotations))
+        self.xml.NewChild2("rotations", str(session['rotations']))
 
         # Calibration Region
+        calibration = session['calibration']
         calib = self.xml.NewChild("calibration_region", "")
-        calib.AddAttribute("exists", str(dc.calibrate_controller is not None))
-        if dc.calibrate_controller:
-            if dc.calibrate_controller.dw_grayscales is not None:
+        calib.AddAttribute("exists", str(calibration is not None))
+        if calibration:
+            if calibration.get('dw_grayscales') is not None:
                 thickness = calib.NewChild("thickness_range", "")
-                thickness.NewChild2("min", str(dc.calibrate_controller.min_thickness))
-                thickness.NewChild2("max", str(dc.calibrate_controller.max_thickness))
+                thickness.NewChild2("min", str(calibration['min_thickness']))
+                thickness.NewChild2("max", str(calibration['max_thickness']))
 
                 grayscale = calib.NewChild("al_grayscale_range", "")
                 i = 0
-                for each in dc.calibrate_controller.dw_grayscales:
+                for each in calibration['dw_grayscales']:
                     grayscale.NewChild2(str(i), str(each))
                     i = i + 1
         
                 grayscale_al_thick = calib.NewChild("grayscale_to_al_thick", "")
                 i = 0
-                for each in dc.calibrate_controller.dw_linfit:
+                for each in calibration['dw_linfit']:
                     grayscale_al_thick.NewChild2(str(i), str(each))
                     i = i + 1
         
                 grayscale_relative_density = calib.NewChild("grayscale_to_relative_density", "")
                 i = 0
-                for each in dc.calibrate_controller.dw_reldenfit:
+                for each in calibration['dw_reldenfit']:
                     grayscale_relative_density.NewChild2(str(i), str(each))
                     i = i + 1
     
-                calib.NewChild2("density", str(dc.calibrate_controller.density))
+                calib.NewChild2("density", str(calibration['density']))
                 
-                calib.NewChild2("pixels_per_unit", str(dc.calibrate_controller.pixels_per_unit))
+                calib.NewChild2("pixels_per_unit", str(calibration['pixels_per_unit']))
                 
-                calib.NewChild2("unit_selected", str(dc.calibrate_controller.unit))
+                calib.NewChild2("unit_selected", str(calibration['unit']))
     
-            x, y, dx, dy = dc.calib_region
+            x, y, dx, dy = calibration['region']
             w = dx-x
             h = dy-y
             coords = [x, y, w, h]
@@ -106,9 +106,9 @@ class Controller():
 
         # Target Area
         target = self.xml.NewChild("target_area", "")
-        target.AddAttribute("exists", str(dc.coral_controller is not None))
-        if dc.coral_controller:
-            x, y, dx ,dy = dc.coral_slab
+        target.AddAttribute("exists", str(session['target_area'] is not None))
+        if session['target_area']:
+            x, y, dx ,dy = session['target_area']
             w = dx - x
             h = dy - y
             coords = [x, y, w, h]
@@ -119,16 +119,14 @@ class Controller():
 
         # Polylines
         polylines = self.xml.NewChild("polylines", "")
-        polylines.AddAttribute("exists", str(dc.polyline_controller is not None))
-        if dc.polyline_controller:
-            for polyline in dc.polyline_controller.polylines:
+        polylines.AddAttribute("exists", str(session['polylines'] is not None))
+        if session['polylines'] is not None:
+            for polyline in session['polylines']:
                 poly = polylines.NewChild("poly", "")
-                poly.AddAttribute("name", polyline.label.get_text())
-                poly.AddAttribute("color", polyline.get_color())
+                poly.AddAttribute("name", polyline['name'])
+                poly.AddAttribute("color", polyline['color'])
                 i = 0
-                for vertex in polyline.verticies:
-                    x, = vertex.get_xdata()
-                    y, = vertex.get_ydata()
+                for x, y in polyline['vertices']:
                     vert = poly.NewChild("vertex", "")
                     vert.AddAttribute("num", str(i))
                     vert.NewChild2("x_pos", str(x))
@@ -139,6 +137,134 @@ class Controller():
         file_path = self.file_path.encode('ascii', 'ignore')
         return self.xml.SaveXml(file_path)
 
+    def load_session(self):
+        """ Reads a saved session file into a session dictionary, in the
+        same form that create_session() writes. Numbers are converted;
+        the calibration fits are left as the strings that were saved.
+
+        @return - the session dictionary
+        """
+        self.load_file()
+        xml = self.xml
+        session = {'filename': xml.getChildContent("filename"),
+                   'rotations': int(xml.getChildContent("rotations")),
+                   'calibration': None,
+                   'target_area': None,
+                   'polylines': None}
+
+        # Calibration Region
+        calib = xml.SearchForContent(xml, "calibration_region", "")
+        if calib.attr("exists") == "True":
+            calib = xml.SearchForTag(xml, "calibration_region") # Reset calib
+            calibration = {}
+
+            # Thickness Range
+            thickness = xml.SearchForTag(calib, "thickness_range")
+            if thickness is not None:
+                calibration['min_thickness'] = float(thickness.getChildContent("min"))
+                calibration['max_thickness'] = float(thickness.getChildContent("max"))
+
+            # AL Grayscale Range, Grayscale to AL Thickness, Grayscale to Relative Density
+            for key, tag in (('dw_grayscales', "al_grayscale_range"),
+                             ('dw_linfit', "grayscale_to_al_thick"),
+                             ('dw_reldenfit', "grayscale_to_relative_density")):
+                range = xml.SearchForTag(calib, tag)
+                if range is not None:
+                    i = 0
+                    data = []
+                    while xml.SearchForTag(range, str(i)) is not None:
+                        data.append(range.getChildContent(str(i)))
+                        i = i + 1
+                    calibration[key] = data
+
+            # Density
+            if xml.SearchForTag(calib, "density") is not None:
+                calibration['density'] = float(calib.getChildContent("density"))
+
+            # Pixels Per Unit
+            if xml.SearchForTag(calib, "pixels_per_unit") is not None:
+                calibration['pixels_per_unit'] = float(calib.getChildContent("pixels_per_unit"))
+
+            # Unit selected
+            if xml.SearchForTag(calib, "unit_selected") is not None:
+                calibration['unit'] = calib.getChildContent("unit_selected")
+    
+            # Region (x, y, width, height)
+            region = xml.SearchForTag(calib, "region")
+            if region is not None:
+                x = float(region.getChildContent("x_pos"))
+                y = float(region.getChildContent("y_pos"))
+                calibration['region'] = [x, y,
+                                         float(region.getChildContent("width")) + x,
+                                         float(region.getChildContent("height")) + y]
+            session['calibration'] = calibration
+
+        # Target Area
+        target = xml.SearchForContent(xml, "target_area", "")
+        if target.attr("exists") == 'True':
+            target = xml.SearchForTag(xml, "target_area") # Reset target
+            x = float(target.getChildContent("x_pos"))
+            y = float(target.getChildContent("y_pos"))
+            session['target_area'] = [x, y,
+                                      float(target.getChildContent("width")) + x,
+                                      float(target.getChildContent("height")) + y]
+
+        # Polylines
+        poly = xml.SearchForContent(xml, "polylines", "")
+        if poly.attr("exists") == 'True':
+            poly = xml.SearchForTag(xml, "polylines")
+            polylines = []
+            # Loop over all the lines in the XML file
+            for i in xrange(poly.NumChildrenHavingTag("poly")):
+                line = poly.GetNthChildWithTag("poly", i)
+                vertices = []
+                # Loop over all the vertices for each line
+                for v in xrange(line.NumChildrenHavingTag("vertex")):
+                    vertex = line.GetNthChildWithTag("vertex", v)
+                    vertices.append((float(vertex.getChildContent("x_pos")),
+                                     float(vertex.getChildContent("y_pos"))))
+                polylines.append({'name': line.attr("name"),
+                                  'color': line.attr("color"),
+                                  'vertices': vertices})
+            session['polylines'] = polylines
+
+        # Zoom ratio and scrollbar positions
+        screen = xml.SearchForTag(xml, "screen")
+        scrollbars = xml.SearchForTag(screen, "scrollbars")
+        session['aspect'] = float(screen.getChildContent("aspect"))
+        session['scroll'] = (int(scrollbars.getChildContent("x_pos")),
+                             int(scrollbars.getChildContent("y_pos")))
+        if scrollbars.attr("units") != "pixels":
+            # Older sessions saved the position in scroll units of 100 pixels at 100%
+            unit = session['aspect'] * 100.0
+            session['scroll'] = tuple(int(pos * unit) for pos in session['scroll'])
+        return session
+
+    def get_memory_budget(self):
+        """ Returns the user's memory budget (MB) as a string, or None if
+        it hasn't been set.
+        """
+        return self.xml.childContent('memory_budget')
+
+    def get_filter_cache_size(self):
+        """ Returns the size limit (MB) of the user's filter overlay cache
+        as a string, or None if it hasn't been set.
+        """
+        return self.xml.childContent('filter_cache_size')
+
+    def get_overlay_precision(self):
+        """ Returns the precision the user's filtered overlays are kept in
+        ('double', 'float32' or 'uint16'), or None if it hasn't been set.
+        """
+        return self.xml.childContent('overlay_precision')
+
+    def get_detect_regions(self):
+        """ Returns whether the target area and calibration region are
+        detected when a DICOM file is opened ('true' or 'false') as a
+        string, or None if it hasn't been set.
+        """
+        return self.xml.childContent('detect_regions')
+
     def get_plugin_directory(self):
         """ Returns the user's default plugin directory as a string """
         return self.xml.childContent('plugin_directory')
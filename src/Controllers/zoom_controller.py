@@ -45,30 +45,13 @@ class Controller():
         ratio = self.model.rect_ratio(rect_width, rect_height, scroll_width, scroll_height)
 
         # Zoom the image accordingly
-        if ratio > 1.20:
-            self.view.aspect = 1.20
-            self.view.aspect_cb.SetValue('120%')
-        elif ratio < 0.1:
-            self.view.aspect = 0.1
-            self.view.aspect_cb.SetValue('10%')
-        else:
-            self.view.aspect = ratio
-            self.view.aspect_cb.SetValue(str(int(ratio*100.0))+'%')
-
-        # Resize behind the scenes so we can calculate scrollbar positions correctly
-        self.dicom_controller.resize_mpl_widgets()
-
-        # Get the center point of the view
-        c = self.model.get_viewable_rect(self.view)
-        vX, vY = self.model.center_of_rect(c[0], c[1], c[2], c[3])
+        self.view.aspect = zoom_model.clamp_aspect(ratio)
+        self.view.aspect_cb.SetValue(str(int(round(self.view.aspect*100.0)))+'%')
 
-        # Calculate how many scroll units they're apart by
-        x1 = math.fabs(vX - dX) / 100
-        y1 = math.fabs(vY - dY) / 100
-
-        # Round these values and cast them as integers
-        x1 = int(round(x1))
-        y1 = int(round(y1))
+        # Scroll (in pixels) so the center of the selected area
+        # is in the center of the view
+        x1 = int(round(dX * self.view.aspect - scroll_width / 2.0))
+        y1 = int(round(dY * self.view.aspect - scroll_height / 2.0))
 
         # Resize and scroll the image
         self.dicom_controller.on_aspect(None, x1, y1)
@@ -141,7 +124,7 @@ class Controller():
         """ Invoked when the user presses the zoom out button
         in the toolbar or menubar.
         """
-        if self.view.aspect == 0.1: # Limit the size to 10%
+        if self.view.aspect <= zoom_model.MIN_ASPECT: # Limit the size to 10%
             return
 
         self.dicom_controller.zoom = False
@@ -149,13 +132,9 @@ class Controller():
         self.view.toolbar.ToggleTool(self.view.toolbar_ids['Zoom In'], False)
         self.view.canvas.SetCursor(wx.StockCursor(wx.CURSOR_DEFAULT))
         self.view.toggle_selector.set_active(False)
-        self.view.aspect -= 0.1
-        if self.view.aspect < 0.1:
-            self.view.aspect = 0.1
-            self.view.aspect_cb.SetValue('10%')
-        else:
-            self.view.aspect_cb.SetValue(str(int(self.view.aspect*100.0))+'%')
-        self.dicom_controller.on_aspect(None)
+        # Zoom out by one wheel notch, keeping the center of the view in place
+        w, h = self.view.canvas.GetSizeTuple()
+        self.dicom_controller.zoom_at(self.view.aspect / zoom_model.ZOOM_STEP, w / 2, h / 2)
         # Update toggle_selector's background. Otherwise, next time we try to
         # drag zoom, the objects overlaying the image will disappear during drag
         self.view.toggle_selector.update_background(event)
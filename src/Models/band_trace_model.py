@@ -0,0 +1,162 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+from lib import profiler
+import numpy as np
+
+class Model():
+    """ Traces a growth band near a coarse stroke drawn by the user.
+
+    The stroke is resampled every pixel, and the image is sampled along
+    the stroke's normal within WIDTH pixels on either side of it: a
+    corridor that's straightened into a (samples, offsets) cost matrix.
+    Dynamic programming then finds the path through the corridor of least
+    cost that moves at most one offset per sample, i.e. the band's ridge
+    (or valley) followed smoothly from one end of the stroke to the other.
+    Only the corridor is ever searched, however large the image is.
+    """
+
+    WIDTH = 15        # pixels searched on either side of the stroke
+    SPACING = 20      # pixels along the band between the vertices of a traced polyline
+    STIFFNESS = 0.05  # cost of straying the whole WIDTH from the stroke, relative to the band's contrast
+
+    def get_centerline(self, stroke):
+        """ Returns the stroke's points resampled every pixel, and the
+        unit normal at each of them, as two (N, 2) arrays of (x, y)
+        """
+        stroke = np.asarray(stroke, dtype=np.double)
+        steps = np.hypot(*np.diff(stroke, axis=0).T)
+        keep = np.concatenate(([True], steps > 0)) # drop repeated points
+        stroke = stroke[keep]
+        lengths = np.concatenate(([0], np.cumsum(steps[steps > 0])))
+        at = np.arange(0, lengths[-1] + 1e-9, 1.0)
+        if lengths[-1] - at[-1] > 0.5:
+            at = np.append(at, lengths[-1])
+        points = np.column_stack((np.interp(at, lengths, stroke[:, 0]),
+                                  np.interp(at, lengths, stroke[:, 1])))
+
+        # The tangents, smoothed over a few pixels so a shaky stroke
+        # doesn't twist the corridor
+        tangents = np.empty(points.shape)
+        tangents[:] = (1.0, 0.0)
+        if len(points) > 1: # central differences; one-sided at the ends
+            tangents[1:-1] = (points[2:] - points[:-2]) / 2.0
+            tangents[0] = points[1] - points[0]
+            tangents[-1] = points[-1] - points[-2]
+        kernel = np.ones(min(9, len(points))) / min(9, len(points))
+        tangents = np.column_stack([np.convolve(tangents[:, i], kernel, mode='same') for i in (0, 1)])
+        tangents /= np.maximum(np.hypot(*tangents.T), 1e-9)[:, np.newaxis]
+        normals = np.column_stack((-tangents[:, 1], tangents[:, 0]))
+        return points, normals
+
+    def get_corridor(self, stroke, width=WIDTH):
+        """ Returns the [x1, y1, x2, y2] rect of the image the corridor
+        around the stroke lies in
+        """
+        stroke = np.asarray(stroke, dtype=np.double)
+        x1, y1 = np.floor(stroke.min(axis=0) - width - 1).astype(int)
+        x2, y2 = np.ceil(stroke.max(axis=0) + width + 2).astype(int)
+        return [x1, y1, x2, y2]
+
+    def sample(self, image, origin, points, normals, width):
+        """ Returns the (N, 2 * width + 1) values of the image along the
+        normals; NaN beyond the image
+
+        @var origin - (x, y) of the image's top-left pixel
+        """
+        offsets = np.arange(-width, width + 1)
+        xs = np.rint(points[:, 0, np.newaxis] + normals[:, 0, np.newaxis] * offsets - origin[0]).astype(int)
+        ys = np.rint(points[:, 1, np.newaxis] + normals[:, 1, np.newaxis] * offsets - origin[1]).astype(int)
+        inside = (xs >= 0) & (ys >= 0) & (xs < image.shape[1]) & (ys < image.shape[0])
+        values = np.empty(xs.shape)
+        values.fill(np.nan)
+        values[inside] = image[ys[inside], xs[inside]]
+        return values
+
+    def get_cost(self, values):
+        """ Returns the cost matrix of the sampled values: low along the
+        band. The band is a ridge if the stroke runs over brighter values
+        than the corridor around it, a valley otherwise.
+        """
+        width = values.shape[1] // 2
+        known = ~np.isnan(values)
+        if not known.any():
+            return np.zeros(values.shape)
+        center = values[:, width][known[:, width]]
+        if center.size and center.mean() < values[known].mean():
+            values = -values # a valley
+        low, high = np.nanmin(values), np.nanmax(values)
+        cost = (high - values) / max(high - low, 1e-9)
+        cost[np.isnan(cost)] = 2.0 # beyond the image; avoided, but passable
+        cost += self.STIFFNESS * np.abs(np.arange(-width, width + 1)) / float(max(width, 1))
+        return cost
+
+    def find_path(self, cost, fixed=None):
+        """ Returns the offset (column) of each sample (row) of the path of
+        least total cost through the cost matrix that changes its offset
+        by at most one from one sample to the next
+
+        @var fixed - index of a sample the path has to cross at the
+                     stroke itself (e.g. the user's seed), or None
+        """
+        rows, cols = cost.shape
+        if fixed is not None:
+            cost = cost.copy()
+            center = cost[fixed, cols // 2]
+            cost[fixed] = np.inf
+            cost[fixed, cols // 2] = center
+        total = cost[0].copy()
+        moves = np.zeros((rows, cols), dtype=np.int8)
+        padded = np.empty(cols + 2)
+        padded[0] = padded[-1] = np.inf
+        for i in xrange(1, rows):
+            padded[1:-1] = total
+            choices = np.vstack((padded[:-2], padded[1:-1], padded[2:])) # from offset -1, 0, +1
+            move = np.argmin(choices, axis=0)
+            moves[i] = move - 1
+            total = cost[i] + choices[move, np.arange(cols)]
+
+        path = np.empty(rows, dtype=int)
+        path[-1] = np.argmin(total)
+        for i in xrange(rows - 1, 0, -1):
+            path[i - 1] = path[i] + moves[i, path[i]]
+        return path
+
+    @profiler.timed('band trace')
+    def trace(self, image, origin, stroke, width=WIDTH, seed=None):
+        """ Returns the (N, 2) points, every pixel or so, of the band
+        followed along the stroke
+
+        @var image - 2D array of the displayed intensities, of at least
+                     the get_corridor() rect of the stroke
+        @var origin - (x, y) of the image's top-left pixel
+        @var stroke - the (x, y) points the user drew along the band
+        @var seed - an (x, y) point on the stroke the band has to cross
+        """
+        points, normals = self.get_centerline(stroke)
+        cost = self.get_cost(self.sample(image, origin, points, normals, width))
+        fixed = None
+        if seed is not None:
+            fixed = int(np.argmin(np.hypot(*(points - seed).T)))
+        offsets = self.find_path(cost, fixed) - width
+        return points + normals * offsets[:, np.newaxis]
+
+    def get_vertices(self, path, spacing=SPACING):
+        """ Returns the path's points about spacing pixels apart along it,
+        both ends included: the vertices of the traced polyline
+        """
+        if len(path) < 2:
+            return [tuple(point) for point in path]
+        lengths = np.concatenate(([0], np.cumsum(np.hypot(*np.diff(path, axis=0).T))))
+        count = max(int(round(lengths[-1] / float(max(spacing, 1)))), 1)
+        at = np.linspace(0, lengths[-1], count + 1)
+        indices = np.searchsorted(lengths, at)
+        indices = np.unique(np.clip(indices, 0, len(path) - 1))
+        return [(float(x), float(y)) for x, y in path[indices]]
@@ -0,0 +1,147 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+import numpy as np
+
+class Model():
+    """ Window/level and gamma contrast engine. Native DICOM pixel
+    values are mapped through a precomputed lookup table straight into
+    the RGBA display buffer, one tile at a time, so a contrast change
+    only has to touch the tiles that are currently visible.
+    """
+
+    TILE_SIZE = 512
+
+    def __init__(self, raw):
+        """ @var raw - the native (integer) DICOM pixel array, rotated
+        the same way as the display buffer
+        """
+        self.raw = raw
+        self.vmin = int(raw.min())
+        self.vmax = int(raw.max())
+        self.offset = min(self.vmin, 0)
+        self.gamma = 1.0
+        self.invert = True
+        self.lut = None
+        self.dirty = set()
+        self.reset()
+
+    def reset(self):
+        """ Resets the window to the full range of the image, which
+        matches the normalized, inverted default display.
+        """
+        self.window = float(max(self.vmax - self.vmin, 1))
+        self.level = self.vmin + (self.window / 2.0)
+        self.gamma = 1.0
+        self.invert = True
+        self.build_lut()
+
+    def set_contrast(self, window, level, gamma, invert):
+        """ Sets the window/level, gamma and inversion, rebuilds the lookup
+        table and marks every tile as needing to be re-rendered.
+        """
+        self.window = float(max(window, 1))
+        self.level = float(level)
+        self.gamma = float(max(gamma, 0.01))
+        self.invert = invert
+        self.build_lut()
+        self.invalidate()
+
+    def set_raw(self, raw):
+        """ Replaces the native pixel array (e.g. after a rotation). The
+        lookup table stays valid since the pixel values don't change.
+        """
+        self.raw = raw
+        self.invalidate()
+
+    def transfer(self, values):
+        """ Maps the given native values to display intensities (0.0 - 1.0) """
+        low = self.level - (self.window / 2.0)
+        out = (np.asarray(values, dtype=np.float32) - low) / self.window
+        np.clip(out, 0.0, 1.0, out)
+        if self.gamma != 1.0:
+            out **= (1.0 / self.gamma)
+        if self.invert:
+            out = 1.0 - out
+        return out
+
+    def build_lut(self):
+        """ Precomputes the display intensity of every native pixel value.
+        Non-integer pixel data has no finite domain, so it falls back to
+        evaluating the transfer function per tile.
+        """
+        if self.raw.dtype.kind not in 'iu':
+            self.lut = None
+            return
+        self.lut = self.transfer(np.arange(self.offset, self.vmax + 1))
+
+    def lookup(self, values):
+        """ Returns the display intensities of the given native values """
+        if self.lut is None:
+            return self.transfer(values)
+        if self.offset:
+            values = np.subtract(values, self.offset, dtype=np.int32) # int16 would wrap
+        return self.lut.take(values)
+
+    def invalidate(self):
+        """ Marks every tile of the image as dirty """
+        rows, cols = self.tile_grid()
+        self.dirty = set((r, c) for r in xrange(rows) for c in xrange(cols))
+
+    def tile_grid(self):
+        """ Returns the number of (rows, columns) of tiles in the image """
+        y, x = self.raw.shape
+        return (-(-y // self.TILE_SIZE), -(-x // self.TILE_SIZE))
+
+    def tile_bounds(self, tile):
+        """ Returns the (y1, y2, x1, x2) pixel bounds of the given tile """
+        r, c = tile
+        y, x = self.raw.shape
+        return (r * self.TILE_SIZE, min((r + 1) * self.TILE_SIZE, y),
+                c * self.TILE_SIZE, min((c + 1) * self.TILE_SIZE, x))
+
+    def tiles_in_rect(self, rect):
+        """ Returns the tiles that intersect the given [x1, y1, x2, y2] rect """
+        rows, cols = self.tile_grid()
+        x1, y1, x2, y2 = rect
+        r1 = max(int(y1) // self.TILE_SIZE, 0)
+        r2 = min(int(y2) // self.TILE_SIZE, rows - 1)
+        c1 = max(int(x1) // self.TILE_SIZE, 0)
+        c2 = min(int(x2) // self.TILE_SIZE, cols - 1)
+        return [(r, c) for r in xrange(r1, r2 + 1) for c in xrange(c1, c2 + 1)]
+
+    def render(self, rgba, rect=None):
+        """ Renders the dirty tiles into the RGBA display buffer.
+
+        @var rgba - the display buffer to write the RGB bands of
+        @var rect - only render dirty tiles within this [x1, y1, x2, y2]
+                    rect (the viewable area). Renders all dirty tiles if None.
+        @return - the number of tiles rendered
+        """
+        if rect is None:
+            tiles = list(self.dirty)
+        else:
+            tiles = [t for t in self.tiles_in_rect(rect) if t in self.dirty]
+        for tile in tiles:
+            y1, y2, x1, x2 = self.tile_bounds(tile)
+            rgba[y1:y2, x1:x2, :3] = self.lookup(self.raw[y1:y2, x1:x2])[..., np.newaxis]
+            self.dirty.discard(tile)
+        return len(tiles)
+
+    def histogram(self):
+        """ Returns the (values, counts) histogram of the native pixel data """
+        if self.lut is None:
+            counts, edges = np.histogram(self.raw, 1000)
+            return edges[:-1], counts
+        data = self.raw.ravel()
+        if self.offset:
+            data = np.subtract(data, self.offset, dtype=np.int32)
+        counts = np.bincount(data)
+        return np.arange(self.offset, self.offset + len(counts)), counts
@@ -0,0 +1,212 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+from lib import profiler
+from scipy import stats
+import collections
+import math
+import numpy as np
+
+class Model():
+    """ Calibration and density profile calculations. Converts grayscale
+    values along the user's polylines into equivalent aluminum thickness,
+    using the column averages of the aluminum wedge in the calibration region.
+    """
+
+    @profiler.timed('calibration averages')
+    def column_averages(self, model, sx, sy, dx, dy):
+        """ Calculates the average grayscale value per column in the given
+        region (0 - 255 scale). Columns run along the longest side.
+
+        @var model - the dicom_model of the image
+        """
+        averages = []
+
+        # Find longest side
+        deltaX = int(math.fabs(sx - dx))
+        deltaY = int(math.fabs(sy - dy))
+
+        if deltaX > deltaY:
+            # Columns along X axis
+            # Rows along Y axis
+            for i in xrange(int(sx), int(dx)):
+                sum = 0.0
+                for j in xrange(int(sy), int(dy)):
+                    sum = sum + model.get_intensity(j, i)
+                sum = sum / (deltaY + 1)
+                sum = int(sum * 256) # 0 - 255 scale
+                averages.append(sum)
+        else:
+            # Columns along Y axis
+            # Rows along X axis
+            for i in xrange(int(sy), int(dy)):
+                sum = 0.0
+                for j in xrange(int(sx), int(dx)):
+                    sum = sum + model.get_intensity(i, j) # y, x
+                sum /= (deltaX + 1)
+                sum = int(sum * 256) # 0 - 255 scale
+                averages.append(sum)
+
+        return averages
+
+    def lin_regress(self, arr, line=True):
+        """ Calculates the linear regression line of the array provided
+        
+        @return the line if bool is True
+        @return the slope, intercept, etc that make up the line if bool is False
+        """
+        x = np.arange(0, len(arr))
+        
+        slope, intercept, r_value, p_value, std_dev = stats.linregress(x, arr)
+
+        if line: # return an array of values that make up the regression line
+            return slope * x + intercept
+        return slope, intercept
+
+    def grayscale_to_thickness(self, gs, regression, min_thick, max_thick, length):
+        """ Calculates the equivalent aluminum thickness for
+        a given grayscale value
+        
+        @param gs The grayscale value
+        @param regression The (slope, intercept) of the wedge column averages
+        @param length The length of the wedge (pixels)
+        """
+        
+        # Calculate which column, in our regression line, the grayscale value is
+        # x = column #
+        m, b = regression
+        x = (gs - b) / m
+
+        # Calculate slope of wedge
+        m = (min_thick - max_thick) / length
+        
+        # Calculate intercept of wedge
+        b = max_thick
+
+        return (m * x) + b
+
+    def bresenham_line(self, x0, y0, x1, y1):
+        """ Calculates the bresenham line between two given points on the
+            geometry plane. Essentially, draws a straight line from A - B,
+            giving the coordinates in between.
+                
+            Algorithm (Simplicity section):
+            http://en.wikipedia.org/wiki/Bresenham%27s_line_algorithm
+                
+            @param x0, y0 - Starting point
+            @param x1, y1 - End point
+        """
+        coords = []
+        dx = math.fabs(x1 - x0)
+        dy = math.fabs(y1 - y0)
+        if x0 < x1:
+            sx = 1
+        else:
+            sx = -1
+        if y0 < y1:
+            sy = 1
+        else:
+            sy = -1
+        err = dx - dy
+        while True:
+            coords.append((x0, y0))
+            if x0 == x1 and y0 == y1:
+                break
+            e2 = 2 * err
+            if e2 > -dy:
+                err = err - dy
+                x0 = x0 + sx
+            if x0 == x1 and y0 == y1:
+                coords.append((x0, y0))
+                break
+            if e2 < dx:
+                err = err + dx
+                y0 = y0 + sy
+        return coords
+
+    def flatten(self, l):
+        for el in l:
+            if isinstance(el, collections.Iterable) and not isinstance(el, basestring):
+                for sub in self.flatten(el):
+                    yield sub
+            else:
+                yield el
+
+    @profiler.timed('density profile')
+    def profiles(self, model, polylines, averages, min_thick, max_thick, length):
+        """ Calculates the density profile (aluminum thickness) along each
+        of the given polylines.
+
+        @var model - the dicom_model of the image
+        @var polylines - a list of [(x, y), ...] vertex lists
+        @var averages - the column averages of the calibration wedge
+        @var length - the length of the wedge (pixels)
+        @return - (profiles, pixels): the thickness values of each polyline
+                  and the flattened [x, y, x, y, ...] pixels they were taken from
+        """
+        polyline_data = [] # Holds all polylines after the data has been pulled out
+        for vertices in polylines:
+            i = 1
+            xPrev = 0
+            yPrev = 0
+            temp = [] # Holds each individual polyline temporarily
+            for x, y in vertices:
+                if i % 2 == 0: # Every other loop (every other line)
+                    temp.append(self.bresenham_line(int(xPrev), int(yPrev), int(x), int(y)))
+                i += 1
+                xPrev = x
+                yPrev = y
+            polyline_data.append(temp)
+
+        # Example of array structure
+        # polyline_data = [ [pl1 [ ] [ ] [ ] ] , [pl2 [ ] [ ] ] , [pl3 [ ] [ ] [ ] [ ] ] ]
+        # Join together all sub-arrays per polyline
+        for i in xrange(len(polyline_data)):
+            polyline_data[i] = list(self.flatten(polyline_data[i]))
+
+        # Get the grayscale value of each pixel
+        grayscales = []
+        for pl in polyline_data:
+            temp = []
+            flag = False
+            for x in xrange(len(pl)):
+                if flag:
+                    flag = False
+                    continue
+                # Get grayscale value at pixel (x,x+1)
+                gs = model.get_intensity(pl[x+1], pl[x]) # y, x
+
+                # Append grayscale to temp array
+                new_value = ( (gs - 0) / (1 - 0) ) * (255 - 0) + 0
+                temp.append(int(new_value))
+                
+                # Set flag so that we will skip next loop iteration
+                flag = True
+            grayscales.append(temp)
+
+        max_val = float(max_thick)
+        min_val = float(min_thick)
+
+        # Convert each grayscale to equivalent aluminum thickness; the
+        # regression of the wedge is the same for every pixel
+        regression = self.lin_regress(averages, False)
+        for pl in grayscales:
+            for x in xrange(len(pl)):
+                val = self.grayscale_to_thickness(pl[x], regression, min_val, max_val, length)
+                if val > max_val or val < min_val:
+                    val = np.NAN
+                pl[x] = val
+                
+        # Flip the values
+        for pl in grayscales:
+            for x in xrange(len(pl)):
+                pl[x] = max_val - pl[x] + min_val
+
+        return grayscales, polyline_data
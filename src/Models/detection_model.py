@@ -0,0 +1,153 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+from lib import profiler
+import numpy as np
+
+class Model():
+    """ Proposes the target area (the coral slab) and the calibration
+    region (the aluminum wedge) of an image from its thumbnail: the
+    thumbnail is thresholded (Otsu), cleaned up with a morphological
+    opening and closing, and the bounding boxes of its largest connected
+    parts are scaled back up to the image.
+
+    The proposals are only a starting point for the user to review and
+    adjust.
+    """
+
+    BINS = 256           # histogram bins of the threshold
+    RADIUS = 0.006       # of the thumbnail's longest side, of the opening and closing
+    MIN_AREA = 0.01      # of the thumbnail, of a part that's proposed
+    INSET = 0.05         # of a part's size, trimmed off each side of its box
+
+    @profiler.timed('region detection')
+    def detect(self, model):
+        """ Returns a dictionary of 'coral' and 'calibration', each the
+        [x1, y1, x2, y2] region proposed in the displayed image, or None
+
+        @var model - the dicom_model; its (rotated) thumbnail is used
+        """
+        thumbnail = model.thumbnail
+        mask = self.get_foreground(thumbnail)
+        radius = max(int(round(max(thumbnail.shape) * self.RADIUS)), 1)
+        mask = self.dilate(self.erode(mask, radius), radius)     # opening: drop specks
+        mask = self.erode(self.dilate(mask, radius), radius)     # closing: fill holes
+        parts = [part for part in self.get_parts(mask) if part[0] >= self.MIN_AREA * mask.size]
+
+        factor = self.get_factor(model.get_display_shape(), model.THUMBNAIL_SIZE)
+        regions = {'coral': None, 'calibration': None}
+        if parts:
+            regions['coral'] = self.scale(self.inset(parts[0][1], self.INSET), factor, model.get_display_shape())
+        if len(parts) > 1:
+            regions['calibration'] = self.scale(self.inset(parts[1][1], self.INSET), factor, model.get_display_shape())
+        return regions
+
+    def threshold(self, image):
+        """ Returns Otsu's threshold of the image: the value that best
+        separates its histogram into two classes
+        """
+        counts, edges = np.histogram(image, self.BINS)
+        centers = (edges[:-1] + edges[1:]) / 2.0
+        weight = np.cumsum(counts).astype(np.double)
+        total = weight[-1]
+        mass = np.cumsum(counts * centers)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_below = mass / weight
+            mean_above = (mass[-1] - mass) / (total - weight)
+            between = weight * (total - weight) * (mean_below - mean_above) ** 2
+        between[~np.isfinite(between)] = 0
+        return edges[np.argmax(between) + 1]
+
+    def get_foreground(self, image):
+        """ Returns the mask of the objects in the image: the class of the
+        threshold that covers less of the image's border (the background)
+        """
+        mask = image > self.threshold(image)
+        border = np.concatenate((mask[0], mask[-1], mask[:, 0], mask[:, -1]))
+        if border.mean() > 0.5:
+            mask = ~mask
+        return mask
+
+    def dilate(self, mask, radius):
+        """ Grows the mask by a square of the given radius """
+        out = mask.copy()
+        for shift in xrange(1, radius + 1):
+            out[shift:] |= mask[:-shift]
+            out[:-shift] |= mask[shift:]
+        rows = out.copy()
+        for shift in xrange(1, radius + 1):
+            out[:, shift:] |= rows[:, :-shift]
+            out[:, :-shift] |= rows[:, shift:]
+        return out
+
+    def erode(self, mask, radius):
+        """ Shrinks the mask by a square of the given radius """
+        return ~self.dilate(~mask, radius)
+
+    def get_runs(self, row):
+        """ Returns the (start, stop) columns of the runs of the mask row """
+        edges = np.diff(np.concatenate(([0], row.view(np.int8), [0])))
+        return zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1))
+
+    def get_parts(self, mask):
+        """ Returns the (area, [x1, y1, x2, y2]) of the 8-connected parts
+        of the mask, largest first. Labels runs of each row and joins
+        those that touch runs of the row above.
+        """
+        parent = []
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        runs = [] # (label, y, start, stop)
+        above = []
+        for y in xrange(mask.shape[0]):
+            row = []
+            for start, stop in self.get_runs(mask[y]):
+                label = len(parent)
+                parent.append(label)
+                for other, o_start, o_stop in above:
+                    if o_start <= stop and start <= o_stop: # touching, diagonals included
+                        root, other = find(label), find(other)
+                        if root != other:
+                            parent[max(root, other)] = min(root, other)
+                row.append((label, start, stop))
+                runs.append((label, y, start, stop))
+            above = row
+
+        parts = {}
+        for label, y, start, stop in runs:
+            root = find(label)
+            area, box = parts.get(root, (0, [start, y, stop, y + 1]))
+            box = [min(box[0], start), min(box[1], y), max(box[2], stop), max(box[3], y + 1)]
+            parts[root] = (area + stop - start, box)
+        return sorted(parts.values(), reverse=True)
+
+    def inset(self, box, fraction):
+        """ Trims fraction of the box's size off each of its sides """
+        x1, y1, x2, y2 = box
+        dx = int((x2 - x1) * fraction)
+        dy = int((y2 - y1) * fraction)
+        return [x1 + dx, y1 + dy, x2 - dx, y2 - dy]
+
+    def get_factor(self, shape, size):
+        """ Returns the image pixels per thumbnail pixel of a thumbnail
+        of at most size pixels on its longest side (see
+        dicom_model.create_thumbnail())
+        """
+        return max(int(np.ceil(max(shape) / float(size))), 1)
+
+    def scale(self, box, factor, shape):
+        """ Returns the thumbnail box in image pixels, within the image """
+        x1, y1, x2, y2 = box
+        y, x = shape
+        return [min(x1 * factor, x), min(y1 * factor, y), min(x2 * factor, x), min(y2 * factor, y)]
@@ -11,39 +11,137 @@
 #             US Geological Survey (USGS),
 #             Department of Interior (DOI)
 #########################################################
-import dicom
+from lib import memory_tracker
+from lib import profiler
+import hashlib
 import numpy as np
-import ctypes
 import os
 
 class Model():
 
+    THUMBNAIL_SIZE = 512 # Longest side of the overview thumbnail (pixels)
+    FILL_STRIPS = 8      # Strips the display buffer is filled in while loading
+
     def __init__(self):
         """Model attributes"""
-        self.ds = None
         self.image_array = None
+        self.pixel_array = None # native pixel data, as stored in the file (unrotated)
+        self.raw_array = None   # native pixel data, rotated with the display buffer
+        self.shape = None
+        self.raw_min = 0
+        self.raw_max = 1
+        self.thumbnail = None
         self.path = None
+        self.digest = None # hash of the native pixel data, once computed
 
     def load_dicom_image(self, path):
         """Loads DICOM file and return the image associated with it"""
+        self.read_dicom(path)
+        return self.raw_array.astype(np.double)
+
+    @profiler.timed('load')
+    def read_dicom(self, path):
+        """ Reads and decodes the pixel data of the DICOM file and creates
+        its thumbnail; the display buffer is left to fill_display_data().
+        Safe to call from a background thread.
+        """
+        import dicom # pydicom is slow to import; keep it off of the startup path
         self.path = path
-        self.ds = dicom.read_file(self.path)
-        return self.ds.pixel_array.astype(np.double)
-
-    def allocate_array(self, shape):
-        """Allocates array using Python C API function PyMem_Malloc"""
-        y, x, z = shape
-        num_of_elements = y * x * z
-        size_of_element = ctypes.sizeof(ctypes.c_float)    # 8 bytes on all platforms
-        ptr = ctypes.pythonapi.PyMem_Malloc(num_of_elements*size_of_element)
-        ptr = ctypes.cast(ptr, ctypes.POINTER(ctypes.c_float*num_of_elements))
-        rgba = np.ctypeslib.as_array(ptr.contents)
-        rgba = rgba.reshape(y, x, z)
-        return (rgba, ptr)
-
-    def deallocate_array(self, ptr):
-        """Deallocates array using Python C API function PyMem_Free"""
-        ctypes.pythonapi.PyMem_Free(ptr)
+        # Only the decoded pixel data is kept; the dataset (and the encoded
+        # copy of the pixel data it holds) is released once it's decoded.
+        self.pixel_array = dicom.read_file(self.path).pixel_array
+        self.raw_array = self.pixel_array
+        self.digest = None
+        self.shape = self.pixel_array.shape
+        self.raw_min = self.raw_array.min()
+        self.raw_max = self.raw_array.max()
+        self.thumbnail = self.create_thumbnail(self.raw_array)
+        memory_tracker.track('image', 'native', self.pixel_array)
+        memory_tracker.track('image', 'thumbnail', self.thumbnail)
+
+    def fill_display_data(self, rgba, token=None, progress=None):
+        """ Fills the RGBA display buffer with the normalized, inverted
+        native pixel data in FILL_STRIPS horizontal strips. Gives the
+        same values as normalize_intensity(), invert_grayscale() and
+        set_display_data() without a double copy of the whole image.
+
+        @var token - jobs.CancelToken checked between strips
+        @var progress - called with the fraction (0.0 - 1.0) filled so far
+        """
+        y = self.raw_array.shape[0]
+        scale = float(max(self.raw_max - self.raw_min, 1))
+        step = max(-(-y // self.FILL_STRIPS), 1)
+        for row in xrange(0, y, step):
+            if token is not None:
+                token.check()
+            data = self.raw_array[row:row+step].astype(np.double)
+            data -= self.raw_min
+            data /= scale
+            self.set_display_data(rgba[row:row+step], 1 - data, 1.0)
+            if progress is not None:
+                progress(min(row + step, y) / float(y))
+        return rgba
+
+    def close(self):
+        """ Releases the image's arrays so their memory is freed now,
+        rather than when the next image replaces them.
+        """
+        self.image_array = None
+        self.pixel_array = None
+        self.raw_array = None
+        self.thumbnail = None
+        self.shape = None
+        self.path = None
+        self.digest = None
+        memory_tracker.untrack('image')
+
+    def get_state(self, rotations=0):
+        """ Returns the image's arrays and values, so the image can be put
+        aside and restored later without decoding the file again. The
+        arrays are returned unrotated (as views, not copies), to be rotated
+        again when the session's rotations are re-applied.
+
+        @var rotations - number of times the image has been rotated
+        """
+        unrotate = lambda a: np.rot90(a, -rotations) if rotations % 4 else a
+        return {'path': self.path,
+                'digest': self.digest,
+                'shape': self.shape,
+                'raw_min': self.raw_min,
+                'raw_max': self.raw_max,
+                'pixel_array': self.pixel_array,
+                'raw_array': unrotate(self.raw_array),
+                'image_array': unrotate(self.image_array),
+                'thumbnail': unrotate(self.thumbnail)}
+
+    def set_state(self, state):
+        """ Restores an image put aside by get_state() """
+        for name, value in state.items():
+            setattr(self, name, value)
+        memory_tracker.track('image', 'native', self.pixel_array)
+        memory_tracker.track('image', 'display', self.image_array)
+        memory_tracker.track('image', 'thumbnail', self.thumbnail)
+
+    def get_normalized_region(self, x, y, dx, dy, rotations=0):
+        """ Returns the [y:dy, x:dx] region of the native pixel data,
+        rotated by 90 degrees counter-clockwise 'rotations' times, as
+        normalized doubles (0.0 - 1.0 over the whole image). Equal to
+        normalizing the whole image and then cutting out the region,
+        without making a double copy of the whole image.
+        """
+        region = np.rot90(self.pixel_array, rotations)[y:dy, x:dx].astype(np.double)
+        region -= self.raw_min
+        region /= (self.raw_max - self.raw_min)
+        return region
+
+    def get_digest(self):
+        """ Returns a hash of the native pixel data, identifying the image
+        by its contents (e.g. to look up its cached filter overlays)
+        """
+        if self.digest is None:
+            with profiler.Timer('image digest'):
+                self.digest = hashlib.sha1(np.ascontiguousarray(self.pixel_array)).hexdigest()
+        return self.digest
 
     def rotate_image(self, img):
         """ Rotates the given image by 90 degrees (counter-clockwise) three times;
@@ -52,7 +150,12 @@ class Model():
         @var img - The image array to rotate
         """
         self.image_array = np.rot90(img)
+        self.raw_array = np.rot90(self.raw_array)
+        self.thumbnail = np.rot90(self.thumbnail)
+        memory_tracker.track('image', 'display', self.image_array)
+        memory_tracker.track('image', 'thumbnail', self.thumbnail)
 
+    @profiler.timed('normalize')
     def normalize_intensity(self, img):
         """Normalizes raw intensity values to real values between 0.0 and 1.0"""
         img -= img.min()
@@ -64,6 +167,7 @@ class Model():
         img = 1 - img
         return img
 
+    @profiler.timed('display buffer fill')
     def set_display_data(self, rgba, data, alpha):
         """Sets values in data to the RGBA bands of rgba with specified alpha mask"""
         try:
@@ -75,16 +179,66 @@ class Model():
             pass
         return rgba
 
+    def get_intensity(self, y, x):
+        """ Returns the normalized, inverted grayscale intensity (0.0 - 1.0)
+        of the native pixel data at (x, y). Unlike the display buffer, this
+        isn't affected by the contrast the user has applied.
+        """
+        value = float(self.raw_array[y][x] - self.raw_min)
+        return 1 - (value / max(self.raw_max - self.raw_min, 1))
+
+    def create_thumbnail(self, img, size=THUMBNAIL_SIZE):
+        """ Reduces the given 2D image to at most 'size' pixels on its
+        longest side by averaging blocks of pixels. Edge blocks that don't
+        divide evenly are averaged over the pixels they do contain, so the
+        thumbnail still covers the entire image.
+
+        @return: the thumbnail as a 2D array of doubles
+        """
+        y, x = img.shape
+        factor = max(int(np.ceil(max(y, x) / float(size))), 1)
+        cols = np.arange(0, x, factor)
+        widths = np.diff(np.append(cols, x))
+        thumbnail = np.empty((len(np.arange(0, y, factor)), len(cols)), dtype=np.double)
+        for i, row in enumerate(xrange(0, y, factor)):
+            block = img[row:row+factor].sum(axis=0, dtype=np.double)
+            height = min(factor, y - row)
+            thumbnail[i] = np.add.reduceat(block, cols) / (widths * height)
+        return thumbnail
+
+    def get_thumbnail(self, transfer=None):
+        """ Returns the RGBA overview thumbnail of the image.
+
+        @var transfer - maps native pixel values to display intensities
+                        (0.0 - 1.0); defaults to the normalized, inverted
+                        mapping used when the image is loaded
+        """
+        if transfer is None:
+            data = 1 - ((self.thumbnail - self.raw_min) / max(self.raw_max - self.raw_min, 1))
+        else:
+            data = transfer(self.thumbnail)
+        y, x = self.thumbnail.shape
+        rgba = np.empty((y, x, 4), dtype=np.float32)
+        return self.set_display_data(rgba, data, 1.0)
+
     def get_image(self):
         """Returns raw RGBA array from memory"""
         return self.image_array
 
+    def get_display_shape(self):
+        """ Returns the (y, x) shape of the image as displayed, i.e. after
+        any rotations
+        """
+        if self.image_array is None: # still loading; only a preview is shown
+            return self.shape
+        return self.image_array.shape[:2]
+
     def get_image_shape(self):
         """Returns the shape of the dicom pixel array
         
         @returns: (y, x) form. NOTE: y is first value, x is second
         """
-        return self.ds.pixel_array.shape
+        return self.shape
 
     def get_dicom_path(self):
         """Returns the full path of the current DICOM file"""
@@ -95,8 +249,9 @@ class Model():
         return self.path.split(os.sep)[-1]
 
     def print_data_usage(self):
-        """Prints the size of the image in memory (MB)"""
-        print 'image_array:', self.image_array.nbytes/1000000, 'MB @', id(self.image_array)
+        """Prints the memory held by each subsystem (MB)"""
+        for subsystem, nbytes in memory_tracker.get_usage().items():
+            print subsystem + ':', nbytes/1000000, 'MB'
 
     def get_meta_description(self, data_element):
         """Returns description of a meta data element"""
@@ -9,6 +9,7 @@
 #             Department of Interior (DOI)
 #########################################################
 from dxfwrite import DXFEngine as dxf
+from lib import profiler
 import wx
 
 class Model():
@@ -20,25 +21,10 @@ class Model():
     def create_dxf(self, file_path, polyline_controller, model, calib_controller):
         """ Creates a DXF file at the given 'file_path' location """
         if polyline_controller:
-            # Create a DXF object
-            drawing = dxf.drawing(file_path)
-            points = []
-
-            # Header information
-            self.add_header(drawing, '$ACADVER', 'AC1014')
-
-            # Add the polylines
-            drawing.add_layer('POLYLINES', color=2)
-
-            # DGZ 16 Aug 2012
-            # Bug fix for DXF y-axis flipping error
-            # code provided by Adam Childs
-            # Convert (0, 0) to bottom-left instead of upper-left for drill program
-            #
-            sY, sX = model.get_image_shape()
-
+            polylines = []
             # Loops through all polylines
             for polyline in polyline_controller.polylines:
+                vertices = []
                 # Loops through all verticies of each polyline
                 for vertex in polyline.verticies:
                     try:
@@ -52,30 +38,62 @@ class Model():
                         # Adam Childs (11/17/2012)
                         x = int(vertex.get_xdata()[0])
                         y = int(vertex.get_ydata()[0])
+                    vertices.append((x, y))
+                polylines.append(vertices)
 
-                    y = sY - y
-                    
-                    x /= float(calib_controller.pixels_per_unit)
-                    y /= float(calib_controller.pixels_per_unit)
+            sY, sX = model.get_image_shape()
+            self.write_dxf(file_path, polylines, sY, calib_controller.pixels_per_unit, calib_controller.unit)
+        else:
+            wx.MessageBox('No polylines have been found. Please add some.', 'No polylines!', wx.OK | wx.ICON_ERROR)
+            return
 
-                    # Set the units in mm
-                    if calib_controller.unit == 'cm':
-                        x *= 10
-                        y *= 10
-                    elif calib_controller.unit == 'in':
-                        x *= 25.4
-                        y *= 25.4
+    @profiler.timed('dxf export')
+    def write_dxf(self, file_path, polylines, image_height, pixels_per_unit, unit):
+        """ Writes the given polylines to a DXF file, in millimeters.
 
-                    points.append((x, y))
+        @var polylines - a list of [(x, y), ...] vertex lists (pixels)
+        @var image_height - height of the image (pixels); DXF's origin is
+                            the bottom-left of the image instead of upper-left
+        @var pixels_per_unit - calibrated number of pixels per 'unit'
+        @var unit - 'mm', 'cm' or 'in'
+        """
+        # Create a DXF object
+        drawing = dxf.drawing(file_path)
+        points = []
+
+        # Header information
+        self.add_header(drawing, '$ACADVER', 'AC1014')
+
+        # Add the polylines
+        drawing.add_layer('POLYLINES', color=2)
+
+        for vertices in polylines:
+            for x, y in vertices:
+                # DGZ 16 Aug 2012
+                # Bug fix for DXF y-axis flipping error
+                # code provided by Adam Childs
+                # Convert (0, 0) to bottom-left instead of upper-left for drill program
+                #
+                y = image_height - y
                 
-                # Adds the points to a polyline object, which is added to the DXF file
-                drawing.add(dxf.polyline(points))
-                points = [] # Reset points for the next polyline to use
+                x /= float(pixels_per_unit)
+                y /= float(pixels_per_unit)
 
-            drawing.save()
-        else:
-            wx.MessageBox('No polylines have been found. Please add some.', 'No polylines!', wx.OK | wx.ICON_ERROR)
-            return
+                # Set the units in mm
+                if unit == 'cm':
+                    x *= 10
+                    y *= 10
+                elif unit == 'in':
+                    x *= 25.4
+                    y *= 25.4
+
+                points.append((x, y))
+            
+            # Adds the points to a polyline object, which is added to the DXF file
+            drawing.add(dxf.polyline(points))
+            points = [] # Reset points for the next polyline to use
+
+        drawing.save()
 
     def add_header(self, drawing, header_type, value):
         """ Adds the specified header information to the supplied drawing instance """
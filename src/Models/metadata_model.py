@@ -0,0 +1,87 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+from lib import memory_tracker
+import collections
+import dicom
+import os
+
+# Parsed headers shared by every Model instance, keyed by file path.
+# Each entry holds the file's modification time so edited files are re-read.
+_headers = collections.OrderedDict()
+
+# Approximate size of a parsed header, for memory accounting
+HEADER_BYTES = 16 * 1024
+
+def _cache_size():
+    return len(_headers) * HEADER_BYTES
+
+def _evict():
+    """ Drops the least recently used header """
+    if not _headers:
+        return False
+    _headers.popitem(last=False)
+    return True
+
+memory_tracker.register_cache('dicom headers', _cache_size, _evict)
+
+class Model():
+    """ Reads the meta data of DICOM files without decoding their pixel
+    data. Parsing stops before the PixelData element, so this is cheap
+    enough to run over whole folders of scans.
+    """
+
+    MAX_ENTRIES = 1024
+
+    def get_header(self, path):
+        """ Returns the header-only dataset of the given DICOM file,
+        reading it from disk only if it isn't cached or has changed.
+        """
+        mtime = os.path.getmtime(path)
+        try:
+            cached_mtime, ds = _headers.pop(path)
+            if cached_mtime == mtime:
+                _headers[path] = (mtime, ds)   # most recently used
+                return ds
+        except KeyError:
+            pass
+        ds = dicom.read_file(path, stop_before_pixels=True)
+        _headers[path] = (mtime, ds)
+        while len(_headers) > self.MAX_ENTRIES:
+            _headers.popitem(last=False)
+        return ds
+
+    def get_elements(self, path):
+        """ Returns a list of (description, value) pairs for every
+        meta data element in the given DICOM file.
+        """
+        return [(self.get_description(data_element), self.get_value(data_element))
+                for data_element in self.get_header(path)]
+
+    def get_value_by_name(self, path, name, default=None):
+        """ Returns the value of a single named element (e.g. 'PatientID')
+        from the given DICOM file, or default if it isn't present.
+        """
+        return getattr(self.get_header(path), name, default)
+
+    def get_description(self, data_element):
+        """ Returns description of a meta data element """
+        return data_element.description()
+
+    def get_value(self, data_element):
+        """ Returns value of a meta data element """
+        return data_element._get_repval()
+
+    def forget(self, path=None):
+        """ Drops the cached header of the given file, or of all files """
+        if path is None:
+            _headers.clear()
+        else:
+            _headers.pop(path, None)
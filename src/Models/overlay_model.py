@@ -0,0 +1,160 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+from lib import profiler
+import numpy as np
+
+# Precisions the filtered overlays can be kept in
+PRECISIONS = {'double': np.double, 'float32': np.float32, 'uint16': np.uint16}
+DEFAULT_PRECISION = 'float32'
+
+BLOCK_ROWS = 256 # rows converted and composited at a time
+PROXY_SIZE = 512 # longest side of the overlays composited while dragging
+
+def iter_blocks(rows, block=BLOCK_ROWS):
+    """ Yields slices of at most block rows covering rows """
+    for row in xrange(0, rows, block):
+        yield slice(row, min(row + block, rows))
+
+class QuantizedOverlay():
+    """ An overlay stored as 16-bit steps between its minimum and maximum,
+    a quarter of the memory of doubles. The steps are 1/65535 of the
+    overlay's range apart, far finer than the 8 bits the display shows.
+
+    @var base - the uint16 steps (so memory_tracker finds the memory)
+    @var offset - value of step 0
+    @var scale - value of one step
+    """
+
+    LEVELS = 65535
+
+    def __init__(self, overlay):
+        overlay = np.asarray(overlay)
+        self.shape = overlay.shape
+        self.offset = float(overlay.min()) if overlay.size else 0.0
+        top = float(overlay.max()) if overlay.size else 0.0
+        self.scale = (top - self.offset) / self.LEVELS or 1.0
+        self.base = np.empty(self.shape, dtype=np.uint16)
+        for rows in iter_blocks(self.shape[0]):
+            block = overlay[rows] - self.offset
+            block /= self.scale
+            block += 0.5 # round to the nearest step
+            self.base[rows] = block
+        self.dtype = self.base.dtype
+        self.nbytes = self.base.nbytes
+
+    def get_rows(self, rows, out, cols=slice(None)):
+        """ Writes the values of the given rows (and columns) to out """
+        np.multiply(self.base[rows, cols], self.scale, out=out)
+        out += self.offset
+        return out
+
+    def __array__(self, dtype=np.float32):
+        out = np.empty(self.shape, dtype=dtype)
+        for rows in iter_blocks(self.shape[0]):
+            self.get_rows(rows, out[rows])
+        return out
+
+class Model():
+    """ Combines the filtered overlays of the target area into the single
+    overlay that's displayed, independent of the overlay view.
+
+    The overlays are kept in the model's precision (see store()): doubles,
+    float32 or uint16, for 1/2 or 1/4 of the memory. They're composited
+    block by block into an accumulator that's reused from one composite to
+    the next. While the user drags an opacity slider, reduced proxies of
+    the overlays are composited instead (see composite_proxy()).
+    """
+
+    def __init__(self, model, precision=DEFAULT_PRECISION):
+        """ @var model - the dicom_model of the image being filtered
+            @var precision - one of PRECISIONS
+        """
+        self.model = model
+        self.precision = precision
+        self.accumulators = {} # 'full' or 'proxy' -> accumulator
+        self.sources = []      # overlays the proxies were reduced from
+        self.proxies = []
+
+    def store(self, overlay):
+        """ Returns the overlay as it's kept, in the model's precision """
+        if self.precision == 'uint16':
+            return QuantizedOverlay(overlay)
+        return np.asarray(overlay, dtype=PRECISIONS[self.precision])
+
+    def get_accumulator(self, shape, which='full'):
+        """ Returns the accumulator the overlays are composited in """
+        dtype = np.double if self.precision == 'double' else np.float32
+        accumulator = self.accumulators.get(which)
+        if accumulator is None or accumulator.shape != shape or accumulator.dtype != dtype:
+            accumulator = self.accumulators[which] = np.empty(shape, dtype=dtype)
+        return accumulator
+
+    def reduce(self, overlay, size=PROXY_SIZE):
+        """ Returns the overlay reduced to at most size pixels on its
+        longest side by averaging blocks of pixels
+        """
+        if isinstance(overlay, QuantizedOverlay):
+            proxy = self.model.create_thumbnail(overlay.base, size)
+            proxy *= overlay.scale
+            proxy += overlay.offset
+        else:
+            proxy = self.model.create_thumbnail(overlay, size)
+        return proxy.astype(np.float32)
+
+    def get_proxies(self, overlays):
+        """ Returns the reduced proxies of the given overlays, reducing
+        them only when the overlays have changed
+        """
+        if len(overlays) != len(self.sources) or any(a is not b for a, b in zip(overlays, self.sources)):
+            with profiler.Timer('overlay proxies'):
+                self.proxies = [self.reduce(overlay) for overlay in overlays]
+            self.sources = list(overlays)
+        return self.proxies
+
+    @profiler.timed('overlay proxy composite')
+    def composite_proxy(self, overlays, alphas):
+        """ Returns the composite of reduced proxies of the overlays, at
+        most PROXY_SIZE pixels on its longest side: fast enough to follow
+        a slider however large the slab is.
+        """
+        return self.composite(self.get_proxies(overlays), alphas, 'proxy')
+
+    @profiler.timed('overlay composite')
+    def composite(self, overlays, alphas, which='full', rect=None):
+        """ Returns the linear combination of the given overlays, each
+        weighted by its alpha (0 - 100), in inverted grayscale. The result
+        is the model's accumulator, overwritten by the next composite.
+
+        @var rect - only composite this [x1, y1, x2, y2] rect of the
+                    overlays; all of them if None
+        """
+        if not overlays:
+            return self.model.invert_grayscale(0.0)
+        if rect is None:
+            rect = (0, 0, overlays[0].shape[1], overlays[0].shape[0])
+        x1, y1, x2, y2 = rect
+        cols = slice(x1, x2)
+        weighted = [(overlay, alpha / 100.0) for overlay, alpha in zip(overlays, alphas) if alpha]
+        overlay = self.get_accumulator((y2 - y1, x2 - x1), which)
+        scratch = np.empty((min(BLOCK_ROWS, overlay.shape[0]),) + overlay.shape[1:], dtype=overlay.dtype)
+        for rows in iter_blocks(overlay.shape[0]):
+            block = overlay[rows]
+            part = scratch[:block.shape[0]]
+            source = slice(y1 + rows.start, y1 + rows.stop)
+            block.fill(1.0) # inverted: 1 - sum(weight * overlay)
+            for ov, weight in weighted:
+                if isinstance(ov, QuantizedOverlay):
+                    ov.get_rows(source, part, cols)
+                    part *= weight
+                else:
+                    np.multiply(ov[source, cols], weight, out=part)
+                block -= part
+        return overlay
@@ -20,6 +20,7 @@ class Polyline():
         self.axes = axes
         self.verticies = []
         self.lines = []
+        self.trace = None # dense (N, 2) path of a traced polyline's band
         self.color = '#00FF00'
         self.label = self.axes.text(0, 0, 't', color=self.color,
                                     ha='center', va='center',
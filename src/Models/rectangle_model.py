@@ -166,6 +166,11 @@ class Model():
     def get_rect_pos(self):
         return [self.sx, self.sy, self.dx, self.dy]
 
+    def get_extent(self):
+        """ Returns the (x1, y1, x2, y2) data extent of this rect """
+        return (min(self.sx, self.dx), min(self.sy, self.dy),
+                max(self.sx, self.dx), max(self.sy, self.dy))
+
     def on_pick(self, event):
         if self.left.contains(event)[0]:
             self.adjust = True
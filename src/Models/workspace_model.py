@@ -0,0 +1,124 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+from lib import memory_tracker
+import collections
+
+class Scan():
+    """ A scan that is open in the workspace but not currently shown.
+
+    @var path - path of the DICOM file
+    @var session - session dictionary of its annotations, zoom and
+                   scroll position (see SaveSession.get_session())
+    @var state - the image's arrays (see dicom_model.Model.get_state()),
+                 or None once they've been evicted
+    @var overlays - None, or a dictionary of the filtered overlays
+                    ('overlays', 'alphas', 'shown'); evicted with the state
+    @var changed - does the scan have unsaved changes?
+    @var save_session - the SaveSession the scan was opened from or saved
+                        to, if any
+    @var journal - the scan's edit journal (see lib.journal)
+    """
+
+    def __init__(self, path, session, state, overlays=None, changed=False, save_session=None, journal=None):
+        self.path = path
+        self.session = session
+        self.state = state
+        self.overlays = overlays
+        self.changed = changed
+        self.save_session = save_session
+        self.journal = journal
+
+    def is_loaded(self):
+        return self.state is not None
+
+    def get_size(self):
+        """ Returns the number of bytes held by the scan's arrays """
+        arrays = []
+        if self.state is not None:
+            arrays.extend(value for value in self.state.values() if hasattr(value, 'nbytes'))
+        if self.overlays is not None:
+            arrays.extend(self.overlays['overlays'])
+        owners = dict((id(owner), owner) for owner in map(memory_tracker.owner, arrays))
+        return sum(owner.nbytes for owner in owners.values())
+
+    def save(self):
+        """ Saves the scan's session through its journal """
+        if self.journal is None:
+            from Controllers import xml_controller
+            xml_controller.Controller(self.save_session.path).create_session(self.session)
+        else:
+            self.journal.record(self.session)
+            self.journal.mark_saved()
+        self.changed = False
+
+    def release(self):
+        """ Drops the scan's arrays. The session is kept, so the scan can
+        still be reopened (decoding the file again) with its annotations.
+        """
+        self.state = None
+        self.overlays = None
+
+class Model():
+    """ The scans open in the workspace besides the one being shown, in
+    least recently used order. Switching back to a scan restores its
+    arrays instead of decoding the file again. The arrays are registered
+    with the memory tracker as a cache, so the least recently used scans
+    are released when CXV goes over its memory budget; at most
+    MAX_LOADED scans keep their arrays regardless.
+    """
+
+    MAX_LOADED = 4
+
+    def __init__(self):
+        self.scans = collections.OrderedDict() # path -> Scan, least recently used first
+        memory_tracker.register_cache('workspace', self.get_size, self.evict)
+
+    def store(self, scan):
+        """ Adds the scan as the most recently used one """
+        self.scans.pop(scan.path, None)
+        self.scans[scan.path] = scan
+        loaded = [each for each in self.scans.values() if each.is_loaded()]
+        for each in loaded[:-self.MAX_LOADED]:
+            each.release()
+
+    def get(self, path):
+        """ Returns the scan of the given file, or None """
+        return self.scans.get(path)
+
+    def take(self, path):
+        """ Removes and returns the scan of the given file, or None """
+        return self.scans.pop(path, None)
+
+    def get_paths(self):
+        return self.scans.keys()
+
+    def get_changed(self):
+        """ Returns the scans with unsaved changes """
+        return [scan for scan in self.scans.values() if scan.changed]
+
+    def get_journals(self):
+        return [scan.journal for scan in self.scans.values() if scan.journal is not None]
+
+    def get_size(self):
+        return sum(scan.get_size() for scan in self.scans.values())
+
+    def evict(self):
+        """ Releases the arrays of the least recently used loaded scan;
+        returns False if no scan holds any.
+        """
+        for scan in self.scans.values():
+            if scan.is_loaded():
+                scan.release()
+                return True
+        return False
+
+    def clear(self):
+        self.scans.clear()
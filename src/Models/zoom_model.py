@@ -10,6 +10,14 @@
 #########################################################
 import math
 
+MIN_ASPECT = 0.1   # 10%
+MAX_ASPECT = 16.0  # 1600%, enough to inspect individual growth bands
+ZOOM_STEP = 1.25   # zoom factor of one mouse wheel notch
+
+def clamp_aspect(aspect):
+    """ Limits the given zoom factor to MIN_ASPECT - MAX_ASPECT """
+    return min(max(aspect, MIN_ASPECT), MAX_ASPECT)
+
 class Model():
     
     def __init__(self):
@@ -57,6 +65,21 @@ class Model():
         """
         return [math.fabs(center_points[0] - center_points[2]) / 100, math.fabs(center_points[1] - center_points[3]) / 100]
 
+    def anchored_scroll(self, scroll, anchor, aspect, new_aspect):
+        """ Calculates the scroll position (pixels) that keeps the image
+        point under the anchor in place when zooming.
+
+        @var scroll: the current (x, y) scroll position
+        @var anchor: the (x, y) position of the anchor within the window
+        @var aspect: the current zoom factor
+        @var new_aspect: the zoom factor being zoomed to
+        """
+        sx, sy = scroll
+        ax, ay = anchor
+        x = (sx + ax) / aspect * new_aspect - ax
+        y = (sy + ay) / aspect * new_aspect - ay
+        return max(int(round(x)), 0), max(int(round(y)), 0)
+
     def get_viewable_rect(self, view):
         """ Calculates the currently viewable portion of
         the image in the wx.ScrolledWindow.
@@ -4,6 +4,9 @@
 # @author:    Luke Mueller
 # @contact:   muellelj@eckerd.edu or lmueller62@gmail.com
 #
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
 # @copyright: owned and maintained by the
 #             US Geological Survey (USGS),
 #             Department of Interior (DOI)
@@ -11,32 +14,94 @@
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg
 import wx
-import numpy as np
 
 class View(wx.MiniFrame):
-    
+
     def __init__(self, controller, dicom_view, model):
         self.controller = controller
         self.model = model
-        
+        self.sliders = {}
+        self.window_lines = []
+
         wx.MiniFrame.__init__(self,
                               parent=dicom_view,
                               title='Contrast Tool',
-                              size=(550, 250),
+                              size=(550, 400),
                               style=wx.DEFAULT_FRAME_STYLE & ~ (wx.RESIZE_BORDER | wx.RESIZE_BOX | wx.MAXIMIZE_BOX))
-        self.init_plot()
+        panel = wx.Panel(self)
+        panel_sizer = wx.BoxSizer(wx.VERTICAL)
+        self.init_plot(panel)
+        panel_sizer.Add(self.canvas, 1, wx.EXPAND)
+        panel_sizer.AddSpacer(5)
+        for each in self.slider_data():
+            self.add_slider(panel, panel_sizer, *each)
+
+        bs = wx.BoxSizer(wx.HORIZONTAL)
+        self.invert = wx.CheckBox(panel, -1, ' Invert')
+        self.invert.SetValue(self.model.invert)
+        self.Bind(wx.EVT_CHECKBOX, self.controller.on_slider, self.invert)
+        reset = wx.Button(panel, -1, 'Reset')
+        self.Bind(wx.EVT_BUTTON, self.controller.on_reset, reset)
+        bs.Add(self.invert, 0, wx.ALIGN_CENTER_VERTICAL)
+        bs.AddSpacer(10)
+        bs.Add(reset)
+        panel_sizer.Add(bs, 0, wx.ALIGN_CENTER)
+        panel_sizer.AddSpacer(5)
+        panel.SetSizer(panel_sizer)
+
         self.histogram()
+        self.update_window()
+        self.Bind(wx.EVT_CLOSE, self.controller.on_close)
         self.Show()
-        
+
+    def slider_data(self):
+        """ (LABEL, VALUE, MIN, MAX) """
+        return (('Window', int(self.model.window), 1, max(self.model.vmax - self.model.vmin, 1)),
+                ('Level', int(self.model.level), self.model.vmin, self.model.vmax),
+                ('Gamma', int(self.model.gamma * 100), 10, 500))
+
+    def add_slider(self, panel, sizer, label, value, minimum, maximum):
+        bs = wx.BoxSizer(wx.HORIZONTAL)
+        st = wx.StaticText(panel, -1, label + ': ', size=(60, -1))
+        s = wx.Slider(panel, -1, value, minimum, maximum)
+        self.Bind(wx.EVT_SLIDER, self.controller.on_slider, s)
+        s.Bind(wx.EVT_SCROLL_THUMBRELEASE, self.controller.on_release)
+        self.sliders[label] = s
+        bs.Add(st, 0, wx.ALIGN_CENTER_VERTICAL)
+        bs.Add(s, 1, wx.EXPAND)
+        sizer.Add(bs, 0, wx.EXPAND|wx.LEFT|wx.RIGHT, 5)
+
+    def get_values(self):
+        """ Returns the (window, level, gamma, invert) set by the user """
+        return (self.sliders['Window'].GetValue(),
+                self.sliders['Level'].GetValue(),
+                self.sliders['Gamma'].GetValue() / 100.0,
+                self.invert.GetValue())
+
+    def set_values(self, model):
+        self.sliders['Window'].SetValue(int(model.window))
+        self.sliders['Level'].SetValue(int(model.level))
+        self.sliders['Gamma'].SetValue(int(model.gamma * 100))
+        self.invert.SetValue(model.invert)
+
     def histogram(self):
-        img = self.model.ds.pixel_array.astype(np.double)
-        img -= img.min()
-        img /= img.max()
-        img = 1 - img
-        img = img.flatten()
-        self.axes.hist(img, 1000, range=(0.0,1.0))
-        
-    def init_plot(self):
+        values, counts = self.model.histogram()
+        self.axes.fill_between(values, counts, color='b')
+        self.axes.set_xlim(values[0], values[-1])
+        self.axes.set_autoscale_on(False)
+
+    def update_window(self):
+        """ Marks the low and high ends of the window on the histogram """
+        for line in self.window_lines:
+            line.remove()
+        low = self.model.level - (self.model.window / 2.0)
+        high = self.model.level + (self.model.window / 2.0)
+        self.window_lines = [self.axes.axvline(low, color='r'),
+                             self.axes.axvline(high, color='r')]
+        self.canvas.draw()
+
+    def init_plot(self, panel):
         self.figure = Figure()
-        self.canvas = FigureCanvasWxAgg(self, -1, self.figure)
-        self.axes = self.figure.add_axes([0.0, 0.0, 1.0, 1.0])
\ No newline at end of file
+        self.canvas = FigureCanvasWxAgg(panel, -1, self.figure)
+        self.axes = self.figure.add_axes([0.0, 0.0, 1.0, 1.0])
+        self.axes.set_axis_off()
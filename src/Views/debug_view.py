@@ -0,0 +1,59 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+import wx
+
+class View(wx.MiniFrame):
+
+    def __init__(self, controller, dicom_view):
+        self.controller = controller
+
+        wx.MiniFrame.__init__(self,
+                              parent=dicom_view,
+                              title='Debug',
+                              size=(520, 400),
+                              style=wx.DEFAULT_FRAME_STYLE)
+        panel = wx.Panel(self)
+        panel_sizer = wx.BoxSizer(wx.VERTICAL)
+
+        self.list = wx.ListCtrl(panel, -1, style=wx.LC_REPORT|wx.LC_HRULES|wx.LC_VRULES)
+        for i, (label, width) in enumerate(self.column_data()):
+            self.list.InsertColumn(i, label, width=width)
+        panel_sizer.Add(self.list, 1, wx.EXPAND)
+
+        bs = wx.BoxSizer(wx.HORIZONTAL)
+        reset = wx.Button(panel, -1, 'Reset')
+        self.Bind(wx.EVT_BUTTON, self.controller.on_reset, reset)
+        save = wx.Button(panel, -1, 'Save Trace...')
+        self.Bind(wx.EVT_BUTTON, self.controller.on_save, save)
+        bs.Add(reset)
+        bs.AddSpacer(10)
+        bs.Add(save)
+        panel_sizer.Add(bs, 0, wx.ALIGN_RIGHT|wx.ALL, 5)
+        panel.SetSizer(panel_sizer)
+
+        self.Bind(wx.EVT_CLOSE, self.controller.on_close)
+        self.Show()
+
+    def column_data(self):
+        """ (LABEL, WIDTH) """
+        return (('Name', 170),
+                ('Count', 60),
+                ('Total (ms)', 75),
+                ('Mean (ms)', 70),
+                ('Max (ms)', 70),
+                ('Last (ms)', 70))
+
+    def set_rows(self, rows):
+        self.list.DeleteAllItems()
+        for row in rows:
+            index = self.list.InsertStringItem(self.list.GetItemCount(), row[0])
+            for column, value in enumerate(row[1:]):
+                self.list.SetStringItem(index, column + 1, value)
@@ -11,12 +11,11 @@
 #             US Geological Survey (USGS),
 #             Department of Interior (DOI)
 #########################################################
-from Controllers import xml_controller
 from Controllers import zoom_controller
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg
 from matplotlib.widgets import RectangleSelector
-from yapsy.PluginManager import PluginManager
+from lib import plugin_loader
 import imp
 import os
 import sys
@@ -32,9 +31,12 @@ class View(wx.Frame):
         self.toolbar_ids = {}
         self.menubar_ids = {}
         self.connect_ids = []
-        self.ov_axes = ''
         self.toggle_selector = None
         self.figure = None
+        self.image = None # the image's artist
+        self.plugin_menu = None
+        self.plugin_items = None # Filter Plugins submenu items, None until first shown
+        self.window_menu = None
 
         wx.Frame.__init__(self,
                           parent=None,
@@ -45,6 +47,9 @@ class View(wx.Frame):
 
         self.scroll = wx.ScrolledWindow(self, -1)
         self.scroll.SetBackgroundColour('grey')    
+        # The canvas only covers the visible part of the image; scrolling
+        # moves the view within the image instead of moving the canvas.
+        self.scroll.EnableScrolling(False, False)
         
         self.create_menubar()
         self.create_toolbar()
@@ -56,6 +61,7 @@ class View(wx.Frame):
         self.Bind(wx.EVT_ACTIVATE, self.controller.cleanup)
         self.Bind(wx.EVT_CLOSE, self.controller.on_quit)
         self.Bind(wx.EVT_CONTEXT_MENU, self.controller.on_show_popup)
+        self.Bind(wx.EVT_MENU_OPEN, self.on_menu_open)
 
         self.Center()
         self.Show()
@@ -71,6 +77,8 @@ class View(wx.Frame):
             for each in self.menu_options()[self.menu_names().index(name)]:
                 self.add_menu_option(menu, *each)
             self.menubar.Append(menu, name)
+            if name == 'Window':
+                self.window_menu = menu
         self.SetMenuBar(self.menubar)
         
     def add_menu_option(self, menu, label, accel, handler, enabled, has_submenu, submenu):
@@ -92,7 +100,7 @@ class View(wx.Frame):
             self.Bind(wx.EVT_MENU, handler, option)
         
     def menu_names(self):
-        return ('File', 'Tools', 'Help')
+        return ('File', 'Tools', 'Window', 'Help')
     
     def menu_options(self):
         """ ('TEXT', (ACCELERATOR), HANDLER, ENABLED, HAS_SUBMENU, SUBMENU METHOD """
@@ -115,9 +123,10 @@ class View(wx.Frame):
                   ('Zoom In', (), self.zoom_controller.on_zoom_in_menu, False, False, None),
                   ('Zoom Out', (), self.zoom_controller.on_zoom_out, False, False, None),
                   ('', '', '', True, False, None),
-#                  ('Adjust Contrast', (), self.controller.on_contrast, False, False, None),
-#                  ('', '', '', True, False, None),
+                  ('Adjust Contrast', (), self.controller.on_contrast, False, False, None),
+                  ('', '', '', True, False, None),
                   ('Adjust Target Area', (), self.controller.on_coral_menu, False, False, None),
+                  ('Detect Regions', (), self.controller.on_detect_regions, False, False, None),
                   ('', '', '', True, False, None),
                   ('Filtered Overlays', (), self.controller.on_overlay, False, False, None),
                   ('Filter Plugins', (), self.controller.on_plugin, True, True, None),
@@ -127,6 +136,9 @@ class View(wx.Frame):
                   ('Show Density Chart', (), self.controller.on_show_density_chart, False, False, None),
                   ('', '', '', True, False, None),
                   ('Draw Polylines', (), self.controller.on_polyline_menu, False, False, None),
+                  ('Trace Bands', (), self.controller.on_trace_menu, False, False, None),
+                  ],
+                 [ # Window; filled by update_window_menu()
                   ],
                  [ # Help
                   ('Help', (), self.controller.on_help, True, False, None),
@@ -154,33 +166,43 @@ class View(wx.Frame):
 
         menu.AppendSeparator()
 
-        # Get the default plugin directory, using XML
-        path = os.path.expanduser('~')
-        xml = xml_controller.Controller(path + '\.cxvrc.xml')
-        xml.load_file()
-
-        if os.path.exists(os.path.expanduser('~') + os.sep + "plugins"):
-            default_dir = os.path.expanduser('~') + os.sep + "plugins"
-        else:
-            default_dir = self.get_main_dir() + os.sep + "plugins"
+        # The plugins are only looked up once the menu is first opened,
+        # since scanning the plugin directories imports every plugin.
+        self.plugin_menu = menu
+        self.plugin_items = None
 
-        if xml.get_plugin_directory() == "" or xml.get_plugin_directory() is None:
-            directory = [default_dir]
-        else:
-            directory = [default_dir, xml.get_plugin_directory()]
+        return menu
 
-        # Load the plugins from the specified plugin directory/s.
-        manager = PluginManager()
-        manager.setPluginPlaces(directory)
-        manager.setPluginInfoExtension('plugin')
-        manager.collectPlugins()
+    def on_menu_open(self, event):
+        event.Skip()
+        if self.plugin_items is None:
+            self.load_plugin_menu()
 
-        for plugin in manager.getAllPlugins():
-            item = wx.MenuItem(menu, wx.ID_ANY, plugin.name)
-            menu.AppendItem(item)
+    def load_plugin_menu(self):
+        """ Adds an item for every plugin found to the plugin submenu """
+        self.plugin_items = []
+        for plugin in plugin_loader.get_plugins(self.get_main_dir()):
+            item = wx.MenuItem(self.plugin_menu, wx.ID_ANY, plugin.name)
+            self.plugin_menu.AppendItem(item)
             self.better_bind(wx.EVT_MENU, item, self.controller.on_about_filter, plugin)
+            self.plugin_items.append(item)
 
-        return menu
+    def update_window_menu(self, current, paths):
+        """ Lists the open scans in the Window menu, the one being shown
+        (checked) first and then the others, most recently used first.
+
+        @var current - path of the scan being shown, or None
+        @var paths - paths of the other scans open in the workspace
+        """
+        for item in self.window_menu.GetMenuItems():
+            self.window_menu.DestroyItem(item)
+        if current is not None:
+            item = self.window_menu.AppendCheckItem(wx.ID_ANY, current.split(os.sep)[-1])
+            item.Check(True)
+            self.better_bind(wx.EVT_MENU, item, self.controller.on_switch_scan, current)
+        for path in reversed(paths):
+            item = self.window_menu.AppendCheckItem(wx.ID_ANY, path.split(os.sep)[-1])
+            self.better_bind(wx.EVT_MENU, item, self.controller.on_switch_scan, path)
 
     def better_bind(self, evt_type, instance, handler, *args, **kwargs):
         self.Bind(evt_type, lambda event: handler(event, *args, **kwargs), instance)
@@ -208,7 +230,7 @@ class View(wx.Frame):
             self.Bind(wx.EVT_MENU, handler, tool)
         
     def toolbar_data(self):
-        aspects = ['100%', '75%', '50%', '25%', '10%', 'Zoom to fit']
+        aspects = ['1600%', '800%', '400%', '200%', '100%', '75%', '50%', '25%', '10%', 'Zoom to fit']
         self.aspect_cb = wx.ComboBox(self.toolbar, -1, '100%',
                                      choices=aspects,
                                      style=wx.CB_DROPDOWN)
@@ -230,8 +252,8 @@ class View(wx.Frame):
                 ('simple', 'Zoom Out', 'images' + os.sep + 'zoom_out_toolbar.png', self.zoom_controller.on_zoom_out, False),
                 ('control', self.aspect_cb, '', '', ''),
                 ('separator', '', '', '', ''),
-#                ('simple', 'Adjust Contrast', 'images' + os.sep + 'contrast.png', self.controller.on_contrast, False),
-#                ('separator', '', '', '', ''),
+                ('simple', 'Adjust Contrast', 'images' + os.sep + 'contrast.png', self.controller.on_contrast, False),
+                ('separator', '', '', '', ''),
                 ('toggle', 'Adjust Target Area', 'images' + os.sep + 'coral.png', self.controller.on_coral, False),
 #                ('simple', 'Lock Target Area', 'images' + os.sep + 'lock_coral.png', self.controller.on_lock_coral, False),
 #                ('separator', '', '', '', ''),
@@ -273,19 +295,27 @@ class View(wx.Frame):
                 ('key_release_event', self.controller.on_key_release)
                 ]
         
-    def init_plot(self, new):
+    def init_plot(self, new, preview=None):
+        """ Plots the image, or the given preview (e.g. the thumbnail)
+        stretched over the image's extent while it's still loading.
+        """
         y, x = self.model.get_image_shape()
         if new:
             self.figure = Figure(figsize=(x*2/72.0, y*2/72.0), dpi=72)
             self.canvas = FigureCanvasWxAgg(self.scroll, -1, self.figure)
             self.canvas.SetBackgroundColour('grey')
+            self.canvas.Bind(wx.EVT_MOUSEWHEEL, self.controller.on_mouse_wheel)
         self.axes = self.figure.add_axes([0.0, 0.0, 1.0, 1.0])
         self.axes.set_axis_off()
-        self.axes.imshow(self.model.get_image(), aspect='auto') # aspect='auto' sets image aspect to match the size of axes
+        if preview is None:
+            self.image = self.axes.imshow(self.model.get_image(), aspect='auto') # aspect='auto' sets image aspect to match the size of axes
+        else:
+            iy, ix = self.model.get_display_shape()
+            self.image = self.axes.imshow(preview, aspect='auto', extent=(-0.5, ix - 0.5, iy - 0.5, -0.5))
         self.axes.set_autoscale_on(False)   # do not apply autoscaling on plot commands - VERY IMPORTANT!
         self.mpl_bindings()
         y, = self.scroll.GetSizeTuple()[-1:]
-        iHt, = self.model.get_image_shape()[:-1]
+        iHt, = self.model.get_display_shape()[:-1]
         self.aspect = (float(y)/float(iHt))
         self.controller.resize_image()
 
@@ -301,6 +331,12 @@ class View(wx.Frame):
                                         spancoords='data')
         self.toggle_selector.set_active(False)
         
+    def set_image(self, image):
+        """ Replaces the plotted preview with the full resolution image """
+        y, x = image.shape[:2]
+        self.image.set_data(image)
+        self.image.set_extent((-0.5, x - 0.5, y - 0.5, -0.5))
+
     def main_is_frozen(self):
         return (hasattr(sys, "frozen") or # new py2exe
             hasattr(sys, "importers") or # old py2exe
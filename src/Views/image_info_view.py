@@ -12,9 +12,8 @@ import wx.grid
 
 class View(wx.MiniFrame):
     
-    def __init__(self, controller, model):
+    def __init__(self, controller, rows):
         self.controller = controller
-        self.model = model
         
         wx.MiniFrame.__init__(self,
                               parent=None,
@@ -23,10 +22,10 @@ class View(wx.MiniFrame):
                               style=wx.DEFAULT_FRAME_STYLE)
         self.Bind(wx.EVT_MOVE, self.controller.dicom_controller.cleanup)
         
-        self.grid = SimpleGrid(self, self.model)
+        self.grid = SimpleGrid(self, rows)
         
 class SimpleGrid(wx.grid.Grid):
     
-    def __init__(self, parent, model):
+    def __init__(self, parent, rows):
         wx.grid.Grid.__init__(self, parent, -1)
-        self.CreateGrid(len(model.ds), 1)
\ No newline at end of file
+        self.CreateGrid(rows, 1)
\ No newline at end of file
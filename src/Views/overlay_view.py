@@ -11,9 +11,7 @@
 #             US Geological Survey (USGS),
 #             Department of Interior (DOI)
 #########################################################
-from Controllers import xml_controller
-from yapsy.PluginManager import PluginManager
-import os
+from lib import plugin_loader
 import wx
 
 class View(wx.MiniFrame):
@@ -86,6 +84,7 @@ class View(wx.MiniFrame):
         s = wx.Slider(panel, s_id, percent, 0, 100)
         s.Enable(enabled)
         self.Bind(wx.EVT_SLIDER, self.controller.find_items, s)
+        s.Bind(wx.EVT_SCROLL_THUMBRELEASE, self.controller.on_release)
         bs3.Add(s, 1, wx.EXPAND)
         sbs.Add(bs3, 1, wx.EXPAND)
         
@@ -95,29 +94,8 @@ class View(wx.MiniFrame):
     def pane_data(self):
         list = [] # Holds the filter tuples (name, activated=True)
         
-        # Get the default plugin directory, using XML
-        path = os.path.expanduser('~')
-        xml = xml_controller.Controller(path + '\.cxvrc.xml')
-        xml.load_file()
-
-        if os.path.exists(os.path.expanduser('~') + os.sep + "plugins"):
-            default_dir = os.path.expanduser('~') + os.sep + "plugins"
-        else:
-            default_dir = self.dicom_view.get_main_dir() + os.sep + "plugins"
-
-        if xml.get_plugin_directory() == "" or xml.get_plugin_directory() is None:
-            directory = [default_dir]
-        else:
-            directory = [default_dir, xml.get_plugin_directory()]
-
-        # Load the plugins from the default plugin directory.
-        manager = PluginManager()
-        manager.setPluginPlaces(directory)
-        manager.setPluginInfoExtension('plugin')
-        manager.collectPlugins()
-
         # Append tuple with plugin name and enabled=True to the list
-        for plugin in manager.getAllPlugins():
+        for plugin in plugin_loader.get_plugins(self.dicom_view.get_main_dir()):
             list.append((plugin.name, True))
         
         return list
@@ -14,7 +14,7 @@ from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg
 
 class View(wx.MiniFrame):
     
-    def __init__(self, controller, model):
+    def __init__(self, controller, model, transfer=None):
         self.controller = controller
         self.model = model
         
@@ -28,12 +28,24 @@ class View(wx.MiniFrame):
         self.figure = plt.figure(figsize=(x/72.0, y/72.0), dpi=72)
         self.canvas = FigureCanvasWxAgg(self, -1, self.figure)
         self.axes = self.figure.add_axes([0.0, 0.0, 1.0, 1.0])
-        self.axes.imshow(self.model.get_image(), aspect='auto')
-        self.axes.set_axis_off()
+        self.show_image(transfer)
         self.mpl_bindings()
         self.Bind(wx.EVT_MOVE, self.controller.dicom_view.controller.cleanup)
         self.Show()
         
+    def show_image(self, transfer=None):
+        """ Shows the low resolution thumbnail of the image. The extent
+        maps it onto full resolution pixel coordinates, so mouse events in
+        the overview are in the same coordinates as the main image.
+        """
+        y, x = self.model.get_image().shape[:2]
+        self.axes.cla()
+        self.axes.imshow(self.model.get_thumbnail(transfer), aspect='auto', extent=(0, x, y, 0))
+        self.axes.set_xlim(0, x)
+        self.axes.set_ylim(y, 0)
+        self.axes.set_autoscale_on(False)
+        self.axes.set_axis_off()
+
     def mpl_bindings(self):
         for each in self.mpl_binds():
             self.connect(*each)
@@ -0,0 +1,248 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+""" Times CXV's model-level hot paths on synthetic coral slab DICOMs,
+without opening any windows.
+
+    python benchmark.py                        # default sizes
+    python benchmark.py -s 4096x2048 -r 5      # one size, 5 runs each
+    python benchmark.py -o new.json -c old.json
+
+The report is written as JSON; comparing against an earlier report
+prints the change in the best time of every benchmark.
+"""
+from Models import dicom_model
+from lib import buffer_pool
+from lib import synthetic_dicom
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+import numpy as np
+
+DEFAULT_SIZES = ['1024x512', '2048x1024']
+
+class Benchmark():
+
+    def __init__(self, rows, cols, repeat, directory):
+        self.rows = rows
+        self.cols = cols
+        self.repeat = repeat
+        self.directory = directory
+        self.path = os.path.join(directory, 'synthetic_%dx%d.dcm' % (rows, cols))
+        self.info = synthetic_dicom.create_dicom(self.path, rows, cols)
+        self.model = dicom_model.Model()
+        self.model.image_array = self.model.load_dicom_image(self.path)
+        self.overlays = []
+        self.averages = []
+        self.results = {}
+
+    def run(self):
+        """ Runs every benchmark, in order, and returns the results """
+        for name, function in self.benchmarks():
+            try:
+                times = []
+                for i in xrange(self.repeat):
+                    start = time.time()
+                    function()
+                    times.append(time.time() - start)
+                self.results[name] = {'runs': times,
+                                      'min': min(times),
+                                      'mean': sum(times) / len(times),
+                                      'max': max(times)}
+            except ImportError, e: # optional dependency isn't installed
+                self.results[name] = {'skipped': str(e)}
+            print '  %-22s %s' % (name, format_result(self.results[name]))
+        return self.results
+
+    def benchmarks(self):
+        """ (NAME, FUNCTION) """
+        return (('load', self.load),
+                ('normalize', self.normalize),
+                ('display buffer fill', self.display_buffer_fill),
+                ('contrast render', self.contrast_render),
+                ('plugin filters', self.plugin_filters),
+                ('highpass filter', self.highpass_filter),
+                ('highpass tiled', self.highpass_tiled),
+                ('overlay composite', self.overlay_composite),
+                ('overlay composite uint16', self.overlay_composite_uint16),
+                ('calibration averages', self.calibration_averages),
+                ('density profile', self.density_profile),
+                ('dxf export', self.dxf_export),
+                ('session round-trip', self.session_round_trip))
+
+    def load(self):
+        dicom_model.Model().load_dicom_image(self.path)
+
+    def normalize(self):
+        self.model.normalize_intensity(self.model.raw_array.astype(np.double))
+
+    def display_buffer_fill(self):
+        rgba = buffer_pool.acquire((self.rows, self.cols, 4))
+        self.model.fill_display_data(rgba)
+
+    def contrast_render(self):
+        from Models import contrast_model
+        contrast = contrast_model.Model(self.model.raw_array)
+        rgba = buffer_pool.acquire((self.rows, self.cols, 4))
+        contrast.set_contrast(contrast.window / 2, contrast.level, 1.5, True)
+        contrast.render(rgba)
+
+    def get_slab(self):
+        """ Returns the normalized target area, as the plugins receive it """
+        x, y, dx, dy = self.info['target_area']
+        return self.model.get_normalized_region(x, y, dx, dy)
+
+    def plugin_filters(self):
+        from lib import filter_pipeline
+        from lib import plugin_loader
+        directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plugins')
+        slab = self.get_slab()
+        filters = filter_pipeline.get_filters(plugin_loader.collect_plugins([directory]), self.model)
+        self.overlays = filter_pipeline.Pipeline(filters).run(slab) + [slab]
+
+    def highpass_filter(self):
+        from lib import fast_fft
+        fast_fft.butterworth_highpass(self.get_slab())
+
+    def highpass_tiled(self):
+        from lib import fast_fft
+        from lib import tiling
+        slab = self.get_slab()
+        halo = fast_fft.butterworth_halo(slab.shape)
+        tiling.overlap_save(slab, lambda region: fast_fft.butterworth_highpass(region, reference_shape=slab.shape),
+                            halo, tile=tiling.TILE_SIZE / 4)
+
+    def overlay_composite(self):
+        from Models import overlay_model
+        overlays = self.overlays
+        if not overlays: # the plugins couldn't be run; composite copies of the slab
+            overlays = [self.get_slab() for i in xrange(3)]
+        alphas = [100 / len(overlays)] * len(overlays)
+        overlay_model.Model(self.model, 'double').composite(overlays, alphas)
+
+    def overlay_composite_uint16(self):
+        from Models import overlay_model
+        overlays = self.overlays
+        if not overlays:
+            overlays = [self.get_slab() for i in xrange(3)]
+        alphas = [100 / len(overlays)] * len(overlays)
+        model = overlay_model.Model(self.model, 'uint16')
+        model.composite([model.store(overlay) for overlay in overlays], alphas)
+
+    def calibration_averages(self):
+        from Models import density_model
+        self.averages = density_model.Model().column_averages(self.model, *self.info['calibration_region'])
+
+    def density_profile(self):
+        from Models import density_model
+        if not self.averages:
+            self.calibration_averages()
+        x, y, dx, dy = self.info['calibration_region']
+        density_model.Model().profiles(self.model, self.info['polylines'], self.averages,
+                                       self.info['min_thickness'], self.info['max_thickness'],
+                                       max(dx - x, dy - y))
+
+    def dxf_export(self):
+        from Models import dxf_model
+        dxf_model.Model().write_dxf(os.path.join(self.directory, 'export.dxf'),
+                                    self.info['polylines'], self.rows, 10.0, 'mm')
+
+    def session_round_trip(self):
+        from Controllers import xml_controller
+        path = os.path.join(self.directory, 'session.cxv')
+        session = {'filename': self.path,
+                   'aspect': 1.0,
+                   'scroll': (0, 0),
+                   'rotations': 0,
+                   'calibration': {'region': self.info['calibration_region'],
+                                   'min_thickness': self.info['min_thickness'],
+                                   'max_thickness': self.info['max_thickness'],
+                                   'dw_grayscales': [0.2, 0.8],
+                                   'dw_linfit': [1.0, 2.0, 0.99],
+                                   'dw_reldenfit': [1.0, 2.0, 0.99],
+                                   'density': 2.79,
+                                   'pixels_per_unit': 10.0,
+                                   'unit': 'mm'},
+                   'target_area': self.info['target_area'],
+                   'polylines': [{'name': 't' + str(i + 1), 'color': '#FF6600', 'vertices': vertices}
+                                 for i, vertices in enumerate(self.info['polylines'])]}
+        xml_controller.Controller(path).create_session(session)
+        loaded = xml_controller.Controller(path).load_session()
+        if len(loaded['polylines']) != len(session['polylines']):
+            raise RuntimeError('Session round-trip lost polylines')
+
+def format_result(result):
+    if 'skipped' in result:
+        return 'skipped (%s)' % result['skipped']
+    return 'min %9.2f ms   mean %9.2f ms' % (result['min'] * 1000, result['mean'] * 1000)
+
+def compare(report, baseline):
+    """ Prints the change in the best time of every benchmark in both reports """
+    print
+    print 'Compared to %s:' % baseline['timestamp']
+    for size in sorted(report['results']):
+        if size not in baseline['results']:
+            continue
+        print ' ', size
+        for name, result in sorted(report['results'][size].items()):
+            old = baseline['results'][size].get(name)
+            if old is None or 'min' not in old or 'min' not in result:
+                continue
+            ratio = result['min'] / max(old['min'], 1e-9)
+            print '    %-22s %9.2f ms -> %9.2f ms  (%.2fx)' % (name, old['min'] * 1000, result['min'] * 1000, ratio)
+
+def parse_size(size):
+    rows, cols = size.lower().split('x')
+    return int(rows), int(cols)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks CXV on synthetic coral slab DICOMs')
+    parser.add_argument('-s', '--size', action='append', help='image size as ROWSxCOLS (repeatable)')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='runs per benchmark')
+    parser.add_argument('-o', '--output', default='benchmark.json', help='report file to write')
+    parser.add_argument('-c', '--compare', help='earlier report to compare against')
+    args = parser.parse_args()
+
+    report = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'platform': platform.platform(),
+              'python': platform.python_version(),
+              'numpy': np.__version__,
+              'repeat': args.repeat,
+              'results': {}}
+    directory = tempfile.mkdtemp(prefix='cxv_benchmark_')
+    try:
+        for size in args.size or DEFAULT_SIZES:
+            rows, cols = parse_size(size)
+            print '%dx%d:' % (rows, cols)
+            benchmark = Benchmark(rows, cols, args.repeat, directory)
+            report['results']['%dx%d' % (rows, cols)] = benchmark.run()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    f = open(args.output, 'w')
+    try:
+        json.dump(report, f, indent=1, sort_keys=True)
+    finally:
+        f.close()
+    print 'Report written to', args.output
+
+    if args.compare:
+        f = open(args.compare)
+        try:
+            compare(report, json.load(f))
+        finally:
+            f.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 from Controllers import xml_controller
-import os
+from lib import plugin_loader
 import wx
 import wx.lib.filebrowsebutton as filebrowse
 
@@ -19,8 +19,7 @@ class BrowseDialog(wx.Dialog):
         # Load the XML file so that we can access some data.
         # It should have already been created. If not, dicom_controller
         # should have taken care of that by now.
-        path = os.path.expanduser('~')
-        self.xml = xml_controller.Controller(path + '\.cxvrc.xml')
+        self.xml = xml_controller.Controller(plugin_loader.get_config_path())
         self.xml.load_file()
         self.plugin_directory = self.xml.get_plugin_directory()
 
@@ -0,0 +1,106 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+from lib import memory_tracker
+from lib import profiler
+import collections
+import sys
+import threading
+import numpy as np
+
+# Display buffers shared by the whole application, keyed by (shape, dtype).
+# The buffers are ordinary NumPy arrays, so NumPy owns (and frees) their
+# memory. A buffer is only handed out again once nothing else references
+# it - not the caller, a view of it or a matplotlib artist - so a buffer
+# can never be overwritten while it's still on screen.
+MAX_IDLE = 2                      # idle buffers kept per (shape, dtype)
+MAX_IDLE_BYTES = 512 * 1024 * 1024 # idle bytes kept across every (shape, dtype)
+
+_buffers = collections.OrderedDict()
+_lock = threading.RLock() # buffers are also acquired by background jobs
+
+def _idle(buffers):
+    """ Returns the indices of the buffers that nothing outside the pool
+    references. An idle buffer has exactly two references while
+    getrefcount() looks at it: the pool's list and the argument itself.
+    """
+    return [i for i in xrange(len(buffers)) if sys.getrefcount(buffers[i]) <= 2]
+
+def acquire(shape, dtype=np.float32):
+    """ Returns an uninitialized array of the given shape and dtype,
+    reusing a pooled buffer that is no longer referenced if there is one.
+    The buffer returns to the pool by itself once the caller (and anything
+    the caller gave it to) drops its last reference.
+    """
+    key = (tuple(shape), np.dtype(dtype).str)
+    with _lock:
+        buffers = _buffers.pop(key, [])
+        if buffers:
+            _buffers[key] = buffers # most recently used last
+        idle = _idle(buffers)
+        if idle:
+            profiler.count('display buffers reused')
+            return buffers[idle[0]]
+        trim()
+        array = np.empty(shape, dtype=dtype)
+        _buffers.setdefault(key, []).append(array)
+        profiler.count('display buffers allocated')
+        return array
+
+def trim(max_idle=MAX_IDLE, max_bytes=MAX_IDLE_BYTES):
+    """ Frees idle buffers beyond max_idle per (shape, dtype), then the
+    least recently used idle buffers until at most max_bytes are idle
+    """
+    with _lock:
+        for key, buffers in _buffers.items():
+            for i in reversed(_idle(buffers)[max_idle:]):
+                del buffers[i]
+        while size() > max_bytes and evict():
+            pass
+        for key, buffers in _buffers.items():
+            if not buffers:
+                del _buffers[key]
+
+def size():
+    """ Returns the number of bytes held by idle buffers """
+    with _lock:
+        return sum(sum(buffers[i].nbytes for i in _idle(buffers)) for buffers in _buffers.values())
+
+def evict():
+    """ Frees one idle buffer; returns False if every buffer is in use """
+    with _lock:
+        for buffers in _buffers.values():
+            idle = _idle(buffers)
+            if idle:
+                del buffers[idle[0]]
+                return True
+        return False
+
+def discard(array):
+    """ Forgets the given buffer, so it's freed once its last reference
+    is dropped rather than kept idle for reuse
+    """
+    with _lock:
+        for key, buffers in _buffers.items():
+            for i in xrange(len(buffers)):
+                if buffers[i] is array:
+                    del buffers[i]
+                    if not buffers:
+                        del _buffers[key]
+                    return
+
+def clear():
+    """ Forgets every buffer. Buffers that are still in use stay valid;
+    they're simply no longer reused.
+    """
+    with _lock:
+        _buffers.clear()
+
+memory_tracker.register_cache('display buffers', size, evict)
@@ -0,0 +1,129 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+""" Real-input FFTs for the frequency-domain filter plugins.
+
+The slabs are real, so only half of their spectrum is computed
+(rfft2/irfft2), and they're zero padded to the next 5-smooth length
+(2^a 3^b 5^c) rather than the next power of two. pyFFTW is used, on
+every core, when it's installed; NumPy's FFT otherwise.
+
+Overlays of slabs whose height and width are powers of two are the same
+as those of the plugins' original filter. Other slabs' are not: that
+filter only computed the distance D within the slab's extent of the
+(shifted) power of two spectrum and left it at 1 elsewhere, all but
+removing the frequencies there, so its response was lopsided. D now
+covers the whole spectrum, which changes those overlays by up to a
+third or more of their range. The shorter padding also changes them
+within about 64 pixels of the slab's edges.
+"""
+from lib import profiler
+import math
+import multiprocessing
+import numpy as np
+
+try:
+    import pyfftw
+    import pyfftw.interfaces.numpy_fft as backend
+    pyfftw.interfaces.cache.enable() # keep the FFTW plans between calls
+    THREADS = multiprocessing.cpu_count()
+except ImportError:
+    backend = np.fft
+    THREADS = 1
+
+def next_fast_len(n):
+    """ Returns the smallest 5-smooth number (2^a 3^b 5^c) >= n """
+    if n <= 6:
+        return max(n, 1)
+    best = 2 ** int(math.ceil(math.log(n, 2)))
+    f5 = 1
+    while f5 < best:
+        f35 = f5
+        while f35 < best:
+            f = f35
+            while f < n:
+                f *= 2
+            best = min(best, f)
+            f35 *= 3
+        f5 *= 5
+    return best
+
+def get_fast_shape(shape):
+    return tuple(next_fast_len(n) for n in shape)
+
+def rfft2(image, shape):
+    """ Returns the half spectrum of the real image, zero padded to shape """
+    if THREADS > 1:
+        return backend.rfft2(image, s=shape, threads=THREADS)
+    return backend.rfft2(image, s=shape)
+
+def irfft2(spectrum, shape):
+    """ Returns the real image of the given half spectrum """
+    if THREADS > 1:
+        return backend.irfft2(spectrum, s=shape, threads=THREADS)
+    return backend.irfft2(spectrum, s=shape)
+
+def get_pow2_shape(shape):
+    return [2 ** int(math.ceil(math.log(n, 2))) for n in shape]
+
+def butterworth_halo(reference_shape, cutoff=25, order=2, tolerance=1e-4):
+    """ Returns the (rows, columns) beyond which the kernel of the
+    Butterworth filter has decayed below tolerance: the halo a block
+    needs to be filtered on its own (see tiling.overlap_save()).
+
+    The low frequencies the filter removes, 1 / (1 + (D / cutoff)^(2 * order)),
+    have poles at D = cutoff * e^(i * pi / (2 * order)), so the kernel
+    decays as exp(-2 * pi * sin(pi / (2 * order)) * fc * r), with fc the
+    cutoff in cycles per pixel.
+    """
+    halo = []
+    for n in get_pow2_shape(reference_shape):
+        fc = float(cutoff) / n
+        decay = 1.0 / (2 * math.pi * math.sin(math.pi / (2 * order)) * fc)
+        halo.append(int(math.ceil(decay * math.log(1.0 / tolerance))))
+    return tuple(halo)
+
+@profiler.timed('butterworth highpass')
+def butterworth_highpass(image, cutoff=25, order=2, reference_shape=None):
+    """ Returns the magnitude of the Butterworth highpass filtered image.
+
+    The cutoff is in frequency steps of the slab zero padded to the next
+    power of two on both axes, as the plugins used to pad it, so the
+    response doesn't change with the (shorter) length it's padded to now,
+    nor with the size of the tile being filtered.
+
+    @var cutoff - distance from the zero frequency at which the filter
+                  lets half through
+    @var order - the higher the order, the sharper the cutoff
+    @var reference_shape - shape of the whole slab when the image is a
+                           tile of it; the image's own shape if None
+    """
+    iht, iwd = image.shape
+    shape = get_fast_shape(image.shape)
+    spectrum = rfft2(image, shape)
+
+    # Distance of every frequency from the zero frequency, in steps of
+    # the power of two padded spectrum
+    pow2 = get_pow2_shape(reference_shape or image.shape)
+    rows = np.fft.fftfreq(shape[0]) * pow2[0]
+    cols = np.arange(shape[1] // 2 + 1) * (pow2[1] / float(shape[1]))
+    H = rows[:, np.newaxis] ** 2 + cols[np.newaxis, :] ** 2 # D^2
+    H[0, 0] = 1e-16 # avoid zero-division warning
+
+    # H = 1 / (1 + (cutoff / D)^(2 * order)), in place
+    np.divide(float(cutoff) ** 2, H, out=H)
+    H **= order
+    H += 1
+    np.reciprocal(H, out=H)
+    spectrum *= H
+    del H
+
+    filtered = irfft2(spectrum, shape)[:iht, :iwd]
+    return np.abs(filtered, out=filtered)
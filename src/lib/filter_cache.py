@@ -0,0 +1,125 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+from lib import profiler
+import os
+import threading
+import numpy as np
+
+DEFAULT_SIZE = 1024 # MB
+
+# The cache shared by every filter pipeline (see get_cache())
+_cache = {'cache': None}
+
+def get_cache_dir():
+    """ Returns the directory the cached overlays are kept in """
+    return os.path.expanduser('~') + os.sep + '.cxv_cache'
+
+def get_cache(max_size=DEFAULT_SIZE):
+    """ Returns the shared overlay cache, limited to max_size (MB) """
+    if _cache['cache'] is None:
+        _cache['cache'] = DiskCache(get_cache_dir(), max_size)
+    _cache['cache'].max_size = max_size
+    return _cache['cache']
+
+class DiskCache():
+    """ Content-addressed cache of filter overlays on disk, one .npy file
+    per key, kept under a size limit by evicting the least recently used
+    overlays. A file's modification time is its last use.
+
+    The overlays are stored uncompressed: zlib shrinks the noise of
+    floating point overlays by only a few percent, at a hundred times the
+    time it takes to write them.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_SIZE):
+        """ @var directory - where the overlays are kept
+            @var max_size - size limit (MB)
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.lock = threading.Lock() # filters may finish on several threads
+
+    def get_path(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+    def get(self, key):
+        """ Returns the overlay stored under the key, or None """
+        path = self.get_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with profiler.Timer('filter cache load'):
+                overlay = np.load(path)
+            os.utime(path, None) # most recently used
+        except (IOError, OSError, ValueError): # evicted meanwhile, or a partial file
+            return None
+        return overlay
+
+    def put(self, key, overlay):
+        """ Stores the overlay under the key """
+        path = self.get_path(key)
+        temp = path + '.%d.tmp' % threading.current_thread().ident
+        with self.lock:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+        with profiler.Timer('filter cache store'):
+            f = open(temp, 'wb')
+            try:
+                np.save(f, overlay)
+            finally:
+                f.close()
+        with self.lock:
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path) # rename() doesn't replace files on Windows
+            os.rename(temp, path)
+            self.trim()
+
+    def get_entries(self):
+        """ Returns (last use, bytes, path) of every cached overlay, least
+        recently used first
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npy'):
+                path = os.path.join(self.directory, name)
+                try:
+                    entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+                except OSError: # removed meanwhile
+                    pass
+        return sorted(entries)
+
+    def get_size(self):
+        """ Returns the number of bytes the cached overlays take up """
+        return sum(size for mtime, size, path in self.get_entries())
+
+    def trim(self):
+        """ Evicts the least recently used overlays beyond the size limit """
+        entries = self.get_entries()
+        total = sum(size for mtime, size, path in entries)
+        limit = self.max_size * 1024 * 1024
+        for mtime, size, path in entries:
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+                profiler.count('filter cache evictions')
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for mtime, size, path in self.get_entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,151 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+from lib import plugin_api
+from lib import profiler
+from lib import tiling
+import hashlib
+import multiprocessing
+import sys
+import threading
+import numpy as np
+
+class Pipeline():
+    """ Runs a list of filters (see plugin_api.Filter) over a coral slab,
+    without touching the GUI. Deterministic filters' overlays are looked
+    up in (and added to) the cache, tileable filters are tiled over slabs
+    larger than a tile, and thread-safe filters run side by side, the most
+    expensive ones first. The overlays are returned in the filters' order
+    either way.
+    """
+
+    def __init__(self, filters, cache=None, workers=None):
+        """ @var filters - list of (name, Filter)
+            @var cache - None, or an object with get(key) (returning None
+                         if it doesn't have the key) and put(key, overlay)
+            @var workers - threads running filters at once; the number of
+                           CPUs if None
+        """
+        self.filters = filters
+        self.cache = cache
+        self.workers = workers or multiprocessing.cpu_count()
+
+    def get_key(self, name, filter, params, digest):
+        """ Returns the cache key of a filter's overlay of the slab with
+        the given digest
+        """
+        key = repr((name, filter.version, np.dtype(filter.dtype).str, sorted(params.items()), digest))
+        return hashlib.sha1(key).hexdigest()
+
+    @profiler.timed('filter pipeline')
+    def run(self, slab, params=None, progress=None, token=None, digest=None, store=None):
+        """ Returns the overlay of every filter
+
+        @var params - dictionary of filter name -> parameters; the filters'
+                      defaults are used for the rest
+        @var progress - called with the fraction (0.0 - 1.0) of the filters
+                        done so far and a message (or None to keep the
+                        last one) as each filter starts and completes, and
+                        after each tile (from the thread running the filter)
+        @var token - checked between filters and tiles (see jobs.CancelToken)
+        @var digest - identifies the slab's contents in cache keys; a hash
+                      of the slab if None
+        @var store - called with each overlay as it's done, returning what's
+                     kept in its place (e.g. a copy in reduced precision),
+                     so the full overlays aren't all held at once
+        """
+        params = params or {}
+        overlays = [None] * len(self.filters)
+        if self.cache is None:
+            digest = None
+        elif digest is None:
+            digest = hashlib.sha1(np.ascontiguousarray(slab)).hexdigest() + str(slab.shape)
+
+        # Most expensive first; filters with unknown costs last
+        order = sorted(xrange(len(self.filters)), key=lambda i: -(self.filters[i][1].cost or 0))
+        parallel = [i for i in order if self.filters[i][1].thread_safe]
+        serial = [i for i in order if not self.filters[i][1].thread_safe]
+        errors = []
+        done = [0.0] * len(self.filters)
+
+        def report(i, fraction, message=None):
+            if token is not None:
+                token.check()
+            done[i] = fraction
+            if progress is not None:
+                progress(sum(done) / len(done), message)
+
+        def work(queue):
+            while True:
+                with lock:
+                    if not queue or errors:
+                        return
+                    i = queue.pop(0)
+                try:
+                    if token is not None:
+                        token.check()
+                    overlay = self.run_filter(i, slab, params, digest,
+                                              lambda fraction, message=None, i=i: report(i, fraction, message))
+                    overlays[i] = overlay if store is None else store(overlay)
+                    del overlay
+                except Exception:
+                    with lock:
+                        errors.append(sys.exc_info())
+                    return
+
+        lock = threading.Lock()
+        threads = [threading.Thread(target=work, args=(parallel,))
+                   for t in xrange(min(self.workers, len(parallel)) - 1)]
+        for thread in threads:
+            thread.start()
+        work(parallel) # this thread works too
+        for thread in threads:
+            thread.join()
+        work(serial)
+        if errors:
+            raise errors[0][0], errors[0][1], errors[0][2]
+        return overlays
+
+    def run_filter(self, i, slab, params, digest, report):
+        """ Returns the overlay of the i-th filter
+
+        @var report - called with the fraction (0.0 - 1.0) of the filter
+                      done so far and a message, or None
+        """
+        name, filter = self.filters[i]
+        values = filter.get_params()
+        values.update(params.get(name, {}))
+        key = None
+        if digest is not None and filter.deterministic:
+            key = self.get_key(name, filter, values, digest)
+            overlay = self.cache.get(key)
+            if overlay is not None:
+                profiler.count('filter cache hits')
+                report(1.0, 'Loaded ' + name)
+                return overlay
+
+        report(0.0, 'Applying ' + name + ' to overlay ' + str(i))
+        with profiler.Timer('filter: ' + name):
+            if filter.tileable and tiling.needs_tiling(slab.shape):
+                overlay = tiling.apply(slab, lambda region: filter.apply(region, values, slab.shape),
+                                       filter.get_halo(slab.shape, values), dtype=filter.dtype,
+                                       progress=lambda fraction: report(0.95 * fraction))
+            else:
+                overlay = filter.apply(slab, values, slab.shape)
+            overlay = filter.finish(np.asarray(overlay, dtype=filter.dtype), values)
+        report(1.0, 'Completed ' + name)
+
+        if key is not None:
+            self.cache.put(key, overlay)
+        return overlay
+
+def get_filters(plugins, model):
+    """ Returns the (name, Filter) of each of the given yapsy plugin infos """
+    return [(plugin.name, plugin_api.get_filter(plugin.plugin_object, model)) for plugin in plugins]
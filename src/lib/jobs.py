@@ -0,0 +1,137 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+from lib import profiler
+import sys
+import threading
+import traceback
+import wx
+
+class Cancelled(Exception):
+    """ Raised by CancelToken.check() once the job has been cancelled """
+    pass
+
+class CancelToken():
+    """ Shared between a job and whoever may cancel it. The job checks
+    the token between steps, so cancelling takes effect at the next check.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    def is_cancelled(self):
+        return self.event.is_set()
+
+    def check(self):
+        """ Raises Cancelled if the job has been cancelled """
+        if self.event.is_set():
+            raise Cancelled()
+
+class Job(threading.Thread):
+    """ Runs work(token) on a background thread. The outcome is reported
+    on the GUI thread through exactly one of the callbacks:
+
+        on_done(result)     - work returned normally
+        on_error(error)     - work raised an exception
+        on_cancelled()      - the job was cancelled
+
+    The work must not touch wx; anything the GUI needs to see while the
+    job runs (progress, previews) is handed over with post().
+    """
+
+    def __init__(self, name, work, on_done=None, on_error=None, on_cancelled=None):
+        threading.Thread.__init__(self, name=name)
+        self.daemon = True # never keep the application alive
+        self.work = work
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancelled = on_cancelled
+        self.token = CancelToken()
+        self.superseded = False # cancelled by a JobScheduler, not the user
+
+    def cancel(self):
+        self.token.cancel()
+
+    def is_cancelled(self):
+        return self.token.is_cancelled()
+
+    def post(self, function, *args):
+        """ Calls function(*args) on the GUI thread, unless the job has
+        been cancelled by the time it gets there.
+        """
+        wx.CallAfter(self.deliver, function, *args)
+
+    def deliver(self, function, *args):
+        if not self.token.is_cancelled():
+            function(*args)
+
+    def run(self):
+        try:
+            with profiler.Timer('job: ' + self.name):
+                result = self.work(self.token)
+            self.token.check()
+        except Cancelled:
+            if self.on_cancelled is not None:
+                wx.CallAfter(self.on_cancelled)
+        except Exception, e:
+            traceback.print_exception(*sys.exc_info())
+            if self.on_error is not None:
+                wx.CallAfter(self.on_error, e)
+        else:
+            wx.CallAfter(self.finish, result)
+
+    def finish(self, result):
+        # The job may have been cancelled after the work had finished
+        if self.token.is_cancelled():
+            if self.on_cancelled is not None:
+                self.on_cancelled()
+        elif self.on_done is not None:
+            self.on_done(result)
+
+class JobScheduler():
+    """ Runs at most one job of each kind. Submitting a job cancels the
+    one of the same kind still running, which is then superseded: its
+    posts are dropped and its on_done is never called, so its results are
+    never shown.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+
+    def submit(self, kind, job):
+        """ Starts the job, superseding the running job of the same kind """
+        self.cancel(kind)
+        self.jobs[kind] = job
+        job.start()
+        return job
+
+    def cancel(self, kind):
+        """ Supersedes the running job of the given kind, if any """
+        job = self.jobs.pop(kind, None)
+        if job is not None:
+            job.superseded = True
+            job.cancel()
+            profiler.count('jobs superseded: ' + kind)
+
+    def cancel_all(self):
+        for kind in self.jobs.keys():
+            self.cancel(kind)
+
+    def is_current(self, kind, job):
+        """ Is the job the latest of its kind, and not yet finished? """
+        return self.jobs.get(kind) is job
+
+    def finished(self, kind, job):
+        """ Forgets the job, unless it has been superseded already """
+        if self.jobs.get(kind) is job:
+            del self.jobs[kind]
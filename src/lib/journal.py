@@ -0,0 +1,323 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+""" Append-only edit journal of a session, kept so saving costs time in
+proportion to the edit and an interrupted session can be recovered.
+
+The journal is a file of JSON lines in the recovery directory, one per
+DICOM file. The first line holds the whole session dictionary (see
+SaveSession.get_session()); every later line holds one change to it:
+
+    {"op": "base", "session": {...}, "source": PATH, "saved": true}
+    {"op": "set", "key": "target_area", "value": [x, y, dx, dy]}
+    {"op": "polyline", "index": 2, "value": {"name": ..., "vertices": ...}}
+    {"op": "polylines", "count": 2}          - polylines past 'count' deleted
+    {"op": "saved"}                          - the session was saved here
+
+Saving only appends a "saved" line. The saved state is written to the
+session (XML) file, and the journal rewritten as a single base line,
+when the journal is compacted.
+
+Beside each journal, an ".owner" file holds the process id of the CXV
+keeping it, so another CXV running at the same time leaves it alone.
+"""
+from lib import profiler
+import errno
+import hashlib
+import json
+import os
+
+COMPACT_ENTRIES = 500 # journal lines beyond which record() compacts
+
+def get_recovery_dir():
+    """ Returns the directory the journals are kept in """
+    return os.path.expanduser('~') + os.sep + '.cxv_recovery'
+
+def get_journal_path(dicom_path):
+    """ Returns the path of the journal of the given DICOM file """
+    name = os.path.basename(dicom_path).split('.')[0]
+    digest = hashlib.md5(os.path.abspath(dicom_path).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(get_recovery_dir(), '%s_%s.journal' % (name, digest))
+
+def find_journals():
+    """ Returns the paths of the journals left behind by sessions that
+    weren't closed (i.e. CXV exited unexpectedly), leaving out those of
+    a CXV that's still running
+    """
+    directory = get_recovery_dir()
+    if not os.path.isdir(directory):
+        return []
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.journal'))
+    return [path for path in paths if not is_running(get_owner(path))]
+
+def get_owner_path(path):
+    """ Returns the path of the file holding the owner of the journal """
+    return path + '.owner'
+
+def get_owner(path):
+    """ Returns the process id of the CXV keeping the journal, or None """
+    try:
+        f = open(get_owner_path(path))
+        try:
+            return int(f.read())
+        finally:
+            f.close()
+    except (IOError, ValueError):
+        return None
+
+def is_running(pid):
+    """ Is the process of the given id running? """
+    if pid is None:
+        return False
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt': # os.kill() would terminate the process
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x0400, False, pid) # PROCESS_QUERY_INFORMATION
+        if not handle:
+            return kernel32.GetLastError() == 5 # ERROR_ACCESS_DENIED; someone else's
+        code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        kernel32.CloseHandle(handle)
+        return code.value == 259 # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except OSError as error:
+        return error.errno == errno.EPERM # someone else's
+    return True
+
+def remove(path):
+    """ Removes the journal and its owner file """
+    for each in (path, get_owner_path(path)):
+        if os.path.exists(each):
+            os.remove(each)
+
+def to_json(value):
+    """ Converts NumPy values (e.g. coordinates taken from matplotlib) for json """
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(repr(value) + ' is not JSON serializable')
+
+def dumps(value):
+    return json.dumps(value, default=to_json, sort_keys=True)
+
+class Journal():
+    """ The journal of one session
+
+    @var path - path of the journal file
+    @var source - path of the session file the session is saved to, or None
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.source = None
+        self.parts = {}      # session key -> JSON of its value (polylines excepted)
+        self.polylines = None # JSON of each polyline, or None
+        self.saved = None     # (parts, polylines) as of the last save
+        self.written = True   # has the saved state been written to the source?
+        self.entries = 0
+        self.compacted = 0    # entries right after the last compaction
+        self.file = None
+
+    def start(self, session, source=None, saved=True):
+        """ Starts the journal with the given session as its base
+
+        @var saved - is the session as saved in the source file?
+        """
+        self.write_source() # a save to the previous source that's still pending
+        self.source = source
+        self.set_session(session)
+        self.saved = (dict(self.parts), self.polylines) if saved else None
+        self.written = True
+        self.compact()
+
+    def set_session(self, session):
+        session = dict(session)
+        polylines = session.pop('polylines', None)
+        self.parts = dict((key, dumps(value)) for key, value in session.items())
+        self.polylines = None if polylines is None else [dumps(polyline) for polyline in polylines]
+
+    def get_session(self, saved=False):
+        """ Returns the session dictionary, as of now or as of the last save """
+        parts, polylines = self.saved if saved else (self.parts, self.polylines)
+        session = dict((key, json.loads(value)) for key, value in parts.items())
+        session['polylines'] = None if polylines is None else [json.loads(polyline) for polyline in polylines]
+        return session
+
+    def record(self, session):
+        """ Appends whatever changed in the given session since the last
+        record() to the journal.
+
+        @return - the number of lines appended
+        """
+        lines = self.changes(session)
+        self.append(lines)
+        return len(lines)
+
+    def changes(self, session):
+        """ Takes on the given session; returns the journal lines of what
+        changed in it
+        """
+        lines = []
+        session = dict(session)
+        polylines = session.pop('polylines', None)
+        for key, value in session.items():
+            value = dumps(value)
+            if self.parts.get(key) != value:
+                self.parts[key] = value
+                lines.append('{"op": "set", "key": %s, "value": %s}' % (json.dumps(key), value))
+        if polylines is None:
+            if self.polylines is not None:
+                self.polylines = None
+                lines.append('{"op": "set", "key": "polylines", "value": null}')
+        else:
+            polylines = [dumps(polyline) for polyline in polylines]
+            previous = self.polylines or []
+            if len(polylines) < len(previous):
+                lines.append('{"op": "polylines", "count": %d}' % len(polylines))
+            for i, polyline in enumerate(polylines):
+                if i >= len(previous) or previous[i] != polyline:
+                    lines.append('{"op": "polyline", "index": %d, "value": %s}' % (i, polyline))
+            self.polylines = polylines
+        return lines
+
+    def mark_saved(self):
+        """ Records that the session, as of the last record(), was saved """
+        self.saved = (dict(self.parts), self.polylines)
+        self.written = False
+        self.append(['{"op": "saved"}'], sync=True)
+
+    def is_saved(self):
+        """ Is the session as of the last record() saved? """
+        return self.saved is not None and self.saved == (self.parts, self.polylines)
+
+    def needs_compaction(self):
+        return not self.written or self.entries > self.compacted
+
+    def append(self, lines, sync=False):
+        if not lines:
+            return
+        if self.entries + len(lines) > COMPACT_ENTRIES:
+            self.compact() # the compacted journal includes the lines
+            return
+        with profiler.Timer('journal append'):
+            if self.file is None:
+                self.file = open(self.path, 'a')
+            self.file.write('\n'.join(lines) + '\n')
+            self.file.flush()
+            if sync:
+                os.fsync(self.file.fileno())
+        self.entries += len(lines)
+
+    @profiler.timed('journal compact')
+    def compact(self):
+        """ Writes the saved state to the source session file, if it hasn't
+        been yet, and rewrites the journal as a single base line (plus the
+        edits since the save).
+        """
+        self.write_source()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        lines = ['{"op": "base", "session": %s, "source": %s, "saved": %s}' %
+                 (dumps(self.get_session(saved=self.saved is not None)), json.dumps(self.source),
+                  json.dumps(self.saved is not None))]
+        if self.saved is not None and not self.is_saved():
+            current = self.get_session()
+            self.parts, self.polylines = dict(self.saved[0]), self.saved[1]
+            lines.extend(self.changes(current)) # the unsaved edits
+        temp = self.path + '.tmp'
+        f = open(temp, 'w')
+        try:
+            f.write('\n'.join(lines) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            f.close()
+        if os.name == 'nt' and os.path.exists(self.path):
+            os.remove(self.path) # rename() doesn't replace files on Windows
+        os.rename(temp, self.path)
+        self.entries = self.compacted = len(lines)
+        self.claim()
+
+    def claim(self):
+        """ Marks the journal as kept by this CXV """
+        if get_owner(self.path) == os.getpid():
+            return
+        f = open(get_owner_path(self.path), 'w')
+        try:
+            f.write(str(os.getpid()))
+        finally:
+            f.close()
+
+    def write_source(self):
+        """ Writes the saved state to the source session file """
+        if self.written or self.source is None or self.saved is None:
+            return
+        from Controllers import xml_controller
+        xml_controller.Controller(self.source).create_session(self.get_session(saved=True))
+        self.written = True
+
+    def close(self):
+        """ Writes any saved state to the source session file and removes
+        the journal; the session ended normally.
+        """
+        self.write_source()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        remove(self.path)
+
+def replay(path):
+    """ Reads a journal left behind by an interrupted session. A partly
+    written last line is ignored.
+
+    @return - a Journal holding the session as it was when CXV exited,
+              with the saved state (if any) still to be written to its
+              source session file
+    """
+    journal = Journal(path)
+    f = open(path)
+    try:
+        lines = f.read().splitlines()
+    finally:
+        f.close()
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except ValueError: # interrupted while writing this line
+            break
+        op = entry['op']
+        if op == 'base':
+            journal.source = entry['source']
+            journal.set_session(entry['session'])
+            journal.saved = (dict(journal.parts), journal.polylines) if entry['saved'] else None
+        elif op == 'set':
+            if entry['key'] == 'polylines':
+                journal.polylines = None if entry['value'] is None else [dumps(polyline) for polyline in entry['value']]
+            else:
+                journal.parts[entry['key']] = dumps(entry['value'])
+        elif op == 'polyline':
+            polylines = list(journal.polylines or [])
+            polylines.extend([dumps(None)] * (entry['index'] + 1 - len(polylines)))
+            polylines[entry['index']] = dumps(entry['value'])
+            journal.polylines = polylines
+        elif op == 'polylines':
+            journal.polylines = (journal.polylines or [])[:entry['count']]
+        elif op == 'saved':
+            journal.saved = (dict(journal.parts), journal.polylines)
+            journal.written = False
+        journal.entries += 1
+    journal.compacted = min(journal.entries, 1)
+    return journal
@@ -0,0 +1,115 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+import collections
+import threading
+import weakref
+
+# Large arrays held by each subsystem ('image', 'overlays', ...), tracked by
+# weak reference so tracking never keeps an array alive. Arrays that share
+# memory (views, rotations) are only counted once.
+_arrays = collections.OrderedDict()
+
+# Caches that can give memory back: name -> (size, evict), where size()
+# returns the bytes held and evict() frees the least recently used entry,
+# returning False once the cache is empty.
+_caches = collections.OrderedDict()
+
+# Arrays are also tracked by background jobs (e.g. loading an image)
+_lock = threading.RLock()
+
+DEFAULT_BUDGET = 2048 # MB
+
+def track(subsystem, name, array):
+    """ Starts accounting for the given array under subsystem/name,
+    replacing whatever array was tracked under that name before.
+    """
+    if array is None:
+        untrack(subsystem, name)
+        return
+    with _lock:
+        _arrays.setdefault(subsystem, collections.OrderedDict())[name] = weakref.ref(array)
+
+def untrack(subsystem, name=None):
+    """ Stops accounting for the named array, or for every array of the subsystem """
+    with _lock:
+        if name is None:
+            _arrays.pop(subsystem, None)
+        else:
+            _arrays.get(subsystem, {}).pop(name, None)
+
+def register_cache(name, size, evict):
+    """ Registers a cache that can be evicted when over budget
+
+    @var size - returns the number of bytes the cache holds
+    @var evict - frees the least recently used entry of the cache;
+                 returns False if there was nothing to free
+    """
+    _caches[name] = (size, evict)
+
+def owner(array):
+    """ Returns the array that owns the memory of the given array """
+    while getattr(array, 'base', None) is not None and hasattr(array.base, 'nbytes'):
+        array = array.base
+    return array
+
+def get_arrays():
+    """ Returns a list of (subsystem, name, bytes) of every live array """
+    arrays = []
+    with _lock:
+        for subsystem, entries in _arrays.items():
+            for name, ref in entries.items():
+                array = ref()
+                if array is None: # released
+                    del entries[name]
+                else:
+                    arrays.append((subsystem, name, owner(array).nbytes))
+    return arrays
+
+def get_usage():
+    """ Returns an ordered dictionary of subsystem -> live bytes, with the
+    registered caches listed as 'cache: NAME'.
+    """
+    usage = collections.OrderedDict()
+    seen = set()
+    with _lock:
+        for subsystem, entries in _arrays.items():
+            usage[subsystem] = 0
+            for name, ref in entries.items():
+                array = ref()
+                if array is None: # released
+                    del entries[name]
+                    continue
+                array = owner(array)
+                if id(array) not in seen:
+                    seen.add(id(array))
+                    usage[subsystem] += array.nbytes
+    for name, (size, evict) in _caches.items():
+        usage['cache: ' + name] = size()
+    return usage
+
+def get_total():
+    """ Returns the total number of live bytes tracked """
+    return sum(get_usage().values())
+
+def enforce(budget=DEFAULT_BUDGET):
+    """ Evicts cache entries, in the order the caches were registered,
+    until the tracked memory fits within the budget (MB).
+
+    @return - the number of bytes freed
+    """
+    limit = budget * 1024 * 1024
+    before = total = get_total()
+    for name, (size, evict) in _caches.items():
+        while total > limit and evict():
+            total = get_total()
+        if total <= limit:
+            break
+    return before - total
@@ -0,0 +1,142 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+""" The filter plugin interface.
+
+Version 2 filters are pure functions from a coral slab (and parameters)
+to an overlay array, and declare what the filter pipeline needs to know
+to cache, tile and schedule them. A plugin module provides one by
+subclassing both yapsy's IPlugin (so it's found) and Filter:
+
+    class Filters(IPlugin, plugin_api.Filter):
+        dtype = np.float32
+        tileable = True
+        cost = 2.0
+
+        def get_halo(self, shape, params):
+            return (1, 1)
+
+        def apply(self, region, params, shape):
+            return ...
+
+Version 1 plugins (initPlugin() and calc_filter(), appending to the
+overlay controller's lists) keep working through LegacyFilter.
+"""
+import numpy as np
+
+API_VERSION = 2
+
+class Filter():
+    """ A filter plugin (version 2).
+
+    @var api_version - the plugin API version the filter implements
+    @var dtype - dtype of the overlay the filter returns
+    @var deterministic - does the same slab and parameters always give
+                         the same overlay? (only these are cached)
+    @var tileable - can the filter be applied to tiles of the slab (with
+                    a halo of get_halo() pixels)?
+    @var thread_safe - can the filter run alongside other filters?
+    @var cost - estimated seconds per megapixel of slab, used to schedule
+                the most expensive filters first
+    @var version - bumped whenever the filter's output changes, so cached
+                   overlays of earlier versions aren't used
+    """
+
+    api_version = API_VERSION
+    dtype = np.double
+    deterministic = True
+    tileable = False
+    thread_safe = True
+    cost = 1.0
+    version = 1
+
+    def get_params(self):
+        """ Returns the filter's parameters and their default values """
+        return {}
+
+    def get_halo(self, shape, params):
+        """ Returns the (rows, columns) of context a tile of a slab of the
+        given shape needs on each side; only used if tileable
+        """
+        return (0, 0)
+
+    def apply(self, region, params, shape):
+        """ Returns the overlay of the given region of a slab; must not
+        modify the region or keep any state.
+
+        @var region - the whole slab, or a tile of it with its halo
+        @var params - the filter's parameters (see get_params())
+        @var shape - shape of the whole slab
+        """
+        raise NotImplementedError('Filter.apply() needs to be implemented!')
+
+    def finish(self, overlay, params):
+        """ Completes the overlay of the whole slab once every tile is
+        done, for steps that need all of it (e.g. normalizing). May work
+        in place.
+        """
+        return overlay
+
+    def get_metadata(self):
+        return {'api_version': self.api_version,
+                'dtype': np.dtype(self.dtype).name,
+                'deterministic': self.deterministic,
+                'tileable': self.tileable,
+                'thread_safe': self.thread_safe,
+                'cost': self.cost,
+                'version': self.version,
+                'params': self.get_params()}
+
+class OverlaySink():
+    """ Receives the overlays a version 1 plugin appends, in place of the
+    overlay controller it's written against
+    """
+
+    def __init__(self):
+        self.overlays = []
+        self.alphas = []
+
+class LegacyFilter(Filter):
+    """ Adapts a version 1 plugin (initPlugin() and calc_filter()) to the
+    Filter interface. Nothing is known about such a plugin, so it's never
+    cached, tiled or run alongside others.
+    """
+
+    api_version = 1
+    deterministic = False
+    thread_safe = False
+    cost = None
+
+    def __init__(self, plugin, model):
+        """ @var plugin - the plugin object
+            @var model - the dicom_model the plugin is given
+        """
+        self.plugin = plugin
+        self.model = model
+
+    def apply(self, region, params, shape):
+        """ Runs a fresh instance of the plugin, so a run of a superseded
+        job (which can't be interrupted) can't share its state
+        """
+        sink = OverlaySink()
+        plugin = self.plugin.__class__()
+        plugin.initPlugin(sink, region, self.model, None, 0, None)
+        plugin.calc_filter()
+        if not sink.overlays:
+            raise ValueError('The plugin did not create an overlay')
+        return sink.overlays[-1]
+
+def get_filter(plugin, model):
+    """ Returns the Filter of the given plugin object, adapting version 1
+    plugins
+    """
+    if getattr(plugin, 'api_version', 1) >= 2:
+        return plugin
+    return LegacyFilter(plugin, model)
@@ -0,0 +1,75 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+from lib import profiler
+import os
+
+# Plugins found by the last scan, shared by every caller. Keyed by the
+# plugin directories and their modification times, so adding or removing
+# a plugin (or changing the user's plugin directory) triggers a rescan.
+_cache = {'key': None, 'plugins': []}
+
+def get_config_path():
+    """ Returns the path of the user's XML config file """
+    return os.path.expanduser('~') + os.sep + '.cxvrc.xml'
+
+def get_plugin_directories(main_dir):
+    """ Returns the list of directories to search for plugins: the
+    default plugin directory followed by the user's plugin directory
+    from the XML config file, if one has been set.
+
+    @var main_dir - CXV's install directory (dicom_view.get_main_dir())
+    """
+    from Controllers import xml_controller
+
+    # Get the default plugin directory, using XML
+    xml = xml_controller.Controller(get_config_path())
+    xml.load_file()
+
+    if os.path.exists(os.path.expanduser('~') + os.sep + "plugins"):
+        default_dir = os.path.expanduser('~') + os.sep + "plugins"
+    else:
+        default_dir = main_dir + os.sep + "plugins"
+
+    if xml.get_plugin_directory() == "" or xml.get_plugin_directory() is None:
+        return [default_dir]
+    return [default_dir, xml.get_plugin_directory()]
+
+def get_plugins(main_dir):
+    """ Returns the yapsy plugin infos of every plugin found in the plugin
+    directories. The directories are only scanned the first time this is
+    called, or after one of them has changed.
+
+    @var main_dir - CXV's install directory (dicom_view.get_main_dir())
+    """
+    return collect_plugins(get_plugin_directories(main_dir))
+
+def collect_plugins(directory):
+    """ Returns the yapsy plugin infos of every plugin found in the given
+    list of directories, rescanning them only if they've changed.
+    """
+    key = tuple((path, os.path.getmtime(path)) for path in directory if os.path.isdir(path))
+    if _cache['key'] != key:
+        from yapsy.PluginManager import PluginManager
+        profiler.count('plugin scans')
+
+        # Load the plugins from the specified plugin directory/s.
+        manager = PluginManager()
+        manager.setPluginPlaces(directory)
+        manager.setPluginInfoExtension('plugin')
+        manager.collectPlugins()
+        _cache['plugins'] = manager.getAllPlugins()
+        _cache['key'] = key
+    return _cache['plugins']
+
+def forget():
+    """ Drops the cached plugins so the next call to get_plugins() rescans """
+    _cache['key'] = None
+    _cache['plugins'] = []
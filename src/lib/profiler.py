@@ -0,0 +1,114 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+import collections
+import json
+import threading
+import time
+
+# Lightweight timers and counters shared by the whole application.
+# Timing a section costs two calls to time.time() and a dictionary update,
+# so instrumentation is always on. Individual timings are also kept in a
+# bounded trace that can be dumped to JSON and opened in chrome://tracing.
+MAX_EVENTS = 10000
+
+_lock = threading.Lock()
+_start = time.time()
+_timers = collections.OrderedDict()
+_counters = collections.OrderedDict()
+_events = collections.deque(maxlen=MAX_EVENTS)
+
+class Timer():
+    """ Times the enclosed block and records it under the given name:
+
+        with profiler.Timer('normalize'):
+            ...
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record(self.name, self.start, time.time())
+        return False
+
+def timed(name):
+    """ Decorator that times every call of the decorated function """
+    def decorator(function):
+        def wrapper(*args, **kwargs):
+            with Timer(name):
+                return function(*args, **kwargs)
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+    return decorator
+
+def record(name, start, end):
+    """ Records a single timing of the named section (times in seconds) """
+    elapsed = end - start
+    with _lock:
+        try:
+            stats = _timers[name]
+        except KeyError:
+            stats = _timers[name] = {'count': 0, 'total': 0.0, 'min': elapsed, 'max': elapsed, 'last': elapsed}
+        stats['count'] += 1
+        stats['total'] += elapsed
+        stats['min'] = min(stats['min'], elapsed)
+        stats['max'] = max(stats['max'], elapsed)
+        stats['last'] = elapsed
+        _events.append((name, start, elapsed, threading.current_thread().name))
+
+def count(name, n=1):
+    """ Adds n to the named counter """
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+def get_timers():
+    """ Returns a list of (name, count, total, mean, min, max, last) tuples,
+    with times in seconds.
+    """
+    with _lock:
+        return [(name, s['count'], s['total'], s['total'] / s['count'], s['min'], s['max'], s['last'])
+                for name, s in _timers.items()]
+
+def get_counters():
+    """ Returns a list of (name, value) tuples """
+    with _lock:
+        return _counters.items()
+
+def reset():
+    """ Clears every timer, counter and trace event """
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+        _events.clear()
+
+def dump(path):
+    """ Writes the timers, counters and trace events to the given path as
+    JSON. The file is in the Trace Event Format, so the 'traceEvents' can
+    be viewed in chrome://tracing; 'timers' and 'counters' hold the summary.
+    """
+    with _lock:
+        trace = {'traceEvents': [{'name': name, 'ph': 'X', 'pid': 1, 'tid': thread,
+                                  'ts': (start - _start) * 1e6, 'dur': elapsed * 1e6}
+                                 for name, start, elapsed, thread in _events],
+                 'timers': dict((name, dict(s)) for name, s in _timers.items()),
+                 'counters': dict(_counters),
+                 'displayTimeUnit': 'ms'}
+    f = open(path, 'w')
+    try:
+        json.dump(trace, f, indent=1)
+    finally:
+        f.close()
@@ -16,15 +16,32 @@ import wx
 class ProgressBar(wx.ProgressDialog):
     """Simple sub class of wx.ProgressDialog for various modules to use"""
     
-    def __init__(self, title, first, maximum, parent):
-        wx.ProgressDialog.__init__(self, title, first, maximum, parent, style=wx.PD_AUTO_HIDE)
+    def __init__(self, title, first, maximum, parent, cancellable=False):
+        style = wx.PD_AUTO_HIDE
+        if cancellable:
+            style |= wx.PD_CAN_ABORT
+        wx.ProgressDialog.__init__(self, title, first, maximum, parent, style=style)
         self.counter = 1
         self.max = maximum
         self.SetSizeWH(400, 150)
         
     def update(self, msg):
-        self.Update(self.counter, msg)
+        """ Advances the bar by one step; returns False if the user has
+        pressed Cancel
+        """
+        keep_going = self.poll(msg)
         self.counter += 1
+        return keep_going
+
+    def poll(self, msg=''):
+        """ Processes the dialog's events without advancing the bar (an
+        empty msg keeps the current message); returns False if the user
+        has pressed Cancel
+        """
+        result = self.Update(min(self.counter, self.max), msg)
+        if isinstance(result, tuple): # (continue, skip) on newer wxPython
+            result = result[0]
+        return result
         
     def finish(self, msg):
         while self.counter < self.max:
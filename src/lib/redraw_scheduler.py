@@ -0,0 +1,78 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+from matplotlib.transforms import Bbox
+import wx
+
+class RedrawScheduler():
+    """ Coalesces redraw requests so the canvas is redrawn at most once
+    per frame, no matter how many mouse, scroll or resize events arrive
+    in between. Work that only needs to happen once per frame can be
+    scheduled as a task; requesting the same task twice runs it once.
+    """
+
+    FRAME_INTERVAL = 16 # milliseconds (~60 Hz)
+
+    def __init__(self, draw):
+        """ @var draw - called as draw(bbox) once per frame; bbox is the
+                        union of the dirty regions in display coordinates,
+                        or None if the entire canvas needs redrawing
+        """
+        self.draw = draw
+        self.timer = None
+        self.tasks = []
+        self.dirty = None
+        self.full = False
+
+    def invalidate(self, bbox=None):
+        """ Marks the given region (display coordinates) as needing to be
+        redrawn. A bbox of None marks the entire canvas.
+        """
+        if bbox is None:
+            self.full = True
+        elif self.dirty is None:
+            self.dirty = bbox
+        else:
+            self.dirty = Bbox.union([self.dirty, bbox])
+        self.start()
+
+    def schedule(self, task):
+        """ Runs the given callable once at the start of the next frame """
+        if task not in self.tasks:
+            self.tasks.append(task)
+        self.start()
+
+    def start(self):
+        if self.timer is None:
+            self.timer = wx.CallLater(self.FRAME_INTERVAL, self.flush)
+
+    def flush(self):
+        """ Runs the pending tasks and redraws the dirty region now """
+        if self.timer is not None:
+            self.timer.Stop()
+            self.timer = None
+        tasks, self.tasks = self.tasks, []
+        for task in tasks:
+            task()
+        if self.full:
+            self.draw(None)
+        elif self.dirty is not None:
+            self.draw(self.dirty)
+        self.dirty = None
+        self.full = False
+
+    def cancel(self):
+        """ Drops every pending task and redraw """
+        if self.timer is not None:
+            self.timer.Stop()
+            self.timer = None
+        self.tasks = []
+        self.dirty = None
+        self.full = False
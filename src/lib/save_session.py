@@ -16,7 +16,9 @@ from Controllers import polyline_controller
 from Controllers import calibrate_controller
 from Controllers import xml_controller
 from Models import polyline_model
+from lib import profiler
 import chilkat # XML API
+import wx
 
 class SaveSession():
     
@@ -31,199 +33,169 @@ class SaveSession():
         xml.UnzipTree()
         return xml.getChildContent("filename")
 
-    def load(self, pb):
+    @profiler.timed('session load')
+    def load(self, pb, session=None):
         """ Loads the data (polylines, target area, calibration region,
         zoom factor, scrollbars, etc.) from the saved session (*.xml) file.
+
+        @var session - session dictionary to load instead of the file's
+                       (see get_session())
         """
-        xml = chilkat.CkXml()
-        path = self.path.encode('ascii', 'ignore')
-        xml.LoadXmlFile(path)
+        if session is None:
+            session = xml_controller.Controller(self.path).load_session()
 
         # Load Rotations
-        rot = xml.getChildContent("rotations")
-        self.controller.rotations = int(rot)
-        if int(rot) > 0:
+        rot = session['rotations']
+        self.controller.rotations = rot
+        if rot > 0:
             pb.update("Loading image and rotations...")
         else:
             pb.update("Loading image...")
-        self.controller.on_rotate(None, int(rot))
+        self.controller.on_rotate(None, rot)
 
         # Load Calibration Region
         pb.update("Loading calibration region")
-        calib = xml.SearchForContent(xml, "calibration_region", "")
-        calib = calib.attr("exists")
-        if calib == "True":
-            calib = xml.SearchForTag(xml, "calibration_region") # Reset calib
-
-
+        calibration = session['calibration']
+        if calibration is not None:
             self.controller.view.toolbar.ToggleTool(self.controller.view.toolbar_ids['Adjust Calibration Region'], True)
             #self.controller.on_calibrate(None)
             self.controller.calibrate_controller = calibrate_controller.Controller(self.controller.view, self.controller.background)
-
-            # Thickness Range
-            thickness = xml.SearchForTag(calib, "thickness_range")
-            if thickness is not None:
-                self.controller.calibrate_controller.min_thickness = float(thickness.getChildContent("min"))
-                self.controller.calibrate_controller.max_thickness = float(thickness.getChildContent("max"))
-
-            # AL Grayscale Range
-            range = xml.SearchForTag(calib, "al_grayscale_range")
-            if range is not None:
-                i = 0
-                data = []
-                while xml.SearchForTag(range, str(i)):
-                    data.append(range.getChildContent(str(i)))
-                    i = i + 1
-                self.controller.calibrate_controller.dw_grayscales = data
-
-            # Grayscale to AL Thickness
-            range = xml.SearchForTag(calib, "grayscale_to_al_thick")
-            if range is not None:
-                i = 0
-                data = []
-                while xml.SearchForTag(range, str(i)) is not None:
-                    data.append(range.getChildContent(str(i)))
-                    i = i + 1
-                self.controller.calibrate_controller.dw_linfit = data
-
-            # Grayscale to Relative Density
-            range = xml.SearchForTag(calib, "grayscale_to_relative_density")
-            if range is not None:
-                i = 0
-                data = []
-                while range.SearchForTag(range, str(i)) is not None:
-                    data.append(range.getChildContent(str(i)))
-                    i = i + 1
-                self.controller.calibrate_controller.dw_reldenfit = data
-
-            # Density
-            density = xml.SearchForTag(calib, "density")
-            if density is not None:
-                self.controller.calibrate_controller.density = float(calib.getChildContent("density"))
-
-            # Pixels Per Unit
-            ppu = xml.SearchForTag(calib, "pixels_per_unit")
-            if ppu is not None:
-                self.controller.calibrate_controller.pixels_per_unit = float(calib.getChildContent("pixels_per_unit"))
+            calibrate = self.controller.calibrate_controller
+
+            calibrate.min_thickness = calibration.get('min_thickness', calibrate.min_thickness)
+            calibrate.max_thickness = calibration.get('max_thickness', calibrate.max_thickness)
+            calibrate.dw_grayscales = calibration.get('dw_grayscales', calibrate.dw_grayscales)
+            calibrate.dw_linfit = calibration.get('dw_linfit', calibrate.dw_linfit)
+            calibrate.dw_reldenfit = calibration.get('dw_reldenfit', calibrate.dw_reldenfit)
+            calibrate.density = calibration.get('density', calibrate.density)
+            calibrate.unit = calibration.get('unit', calibrate.unit)
+            if 'pixels_per_unit' in calibration:
+                calibrate.pixels_per_unit = calibration['pixels_per_unit']
                 self.controller.set_pixels_per_unit = True
 
-            # Unit selected
-            unit = xml.SearchForTag(calib, "unit_selected")
-            if unit is not None:
-                self.controller.calibrate_controller.unit = calib.getChildContent("unit_selected")
-    
-            # Region (x, y, width, height)
-            region = xml.SearchForTag(calib, "region")
-            if region is not None:
-                data = []
-                data.append(float(region.getChildContent("x_pos")))
-                data.append(float(region.getChildContent("y_pos")))
-                data.append(float(region.getChildContent("width")))
-                data.append(float(region.getChildContent("height")))
-                data[2] = data[2] + data[0]
-                data[3] = data[3] + data[1]
+            # Region (x, y, dx, dy)
+            if 'region' in calibration:
+                data = calibration['region']
                 self.controller.calib_region = data
-                self.controller.calibrate_controller.model.sx = data[0]
-                self.controller.calibrate_controller.model.sy = data[1]
-                self.controller.calibrate_controller.model.dx = data[2]
-                self.controller.calibrate_controller.model.dy = data[3]
+                calibrate.model.sx, calibrate.model.sy, calibrate.model.dx, calibrate.model.dy = data
 
             self.controller.enable_tools(['Set Calibration Parameters'], True)
             self.controller.view.toolbar.ToggleTool(self.controller.view.toolbar_ids['Adjust Calibration Region'], False)
 
         # Load Target Area
         pb.update("Loading overlay region")
-        target = xml.SearchForContent(xml, "target_area", "")
-        target = target.attr("exists")
-        if target == 'True':
-            target = xml.SearchForTag(xml, "target_area") # Reset target
-
+        coords = session['target_area']
+        if coords is not None:
             self.controller.enable_tools(['Adjust Target Area', 'Filtered Overlays'], True)
 #            self.controller.view.toolbar.ToggleTool(self.controller.view.toolbar_ids['Adjust Target Area'], True)
 #            self.controller.view.toolbar.ToggleTool(self.controller.view.toolbar_ids['Filtered Overlays'], True)
 #            self.controller.on_coral(None)
             self.controller.coral_controller  = coral_controller.Controller(self.controller.view, self.controller.background)
 
-            coords = []
-            coords.append(float(target.getChildContent("x_pos")))
-            coords.append(float(target.getChildContent("y_pos")))
-            dx = float(target.getChildContent("width")) + float(target.getChildContent("x_pos"))
-            coords.append(dx)
-            dy = float(target.getChildContent("height")) + float(target.getChildContent("y_pos"))
-            coords.append(dy)
             self.controller.coral_slab = coords
-            self.controller.coral_controller.model.sx = coords[0]
-            self.controller.coral_controller.model.sy = coords[1]
-            self.controller.coral_controller.model.dx = coords[2]
-            self.controller.coral_controller.model.dy = coords[3]
+            model = self.controller.coral_controller.model
+            model.sx, model.sy, model.dx, model.dy = coords
 
             #self.controller.enable_tools(['Lock Target Area'], True)
             self.controller.view.toolbar.ToggleTool(self.controller.view.toolbar_ids['Adjust Target Area'], False)
 
         # Load Polylines
         pb.update("Loading polylines")
-        poly = xml.SearchForContent(xml, "polylines", "")
-        poly = poly.attr("exists")
-        if poly == 'True':
-            poly = xml.SearchForTag(xml, "polylines")
-
+        if session['polylines']:
             polylines = []
-            num_of_lines = poly.NumChildrenHavingTag("poly")
-            if num_of_lines > 0:
-                # Loop over all the lines in the XML file
-                for i in xrange(num_of_lines):
-                    polyline = polyline_model.Polyline(self.controller, self.controller.view.axes)
-                    x_pos = 0
-                    y_pos = 0
-                    vertex = None
-                    line = poly.GetNthChildWithTag("poly", i)
-                    name = line.attr("name")
-                    color = line.attr("color")
-                    num_of_vertices = line.NumChildrenHavingTag("vertex")
-                    if num_of_vertices > 0:
-                        # Loop over all the vertices for each line
-                        for v in xrange(num_of_vertices):
-                            vertex = line.GetNthChildWithTag("vertex", v)
-                            x_pos = vertex.getChildContent("x_pos")
-                            y_pos = vertex.getChildContent("y_pos")
-                            
-                            if v != 0:
-                                prev_vertex = polyline.get_vertex(v-1)
-                                polyline.add_line([prev_vertex.get_xdata()[0], float(x_pos)],
-                                                  [prev_vertex.get_ydata()[0], float(y_pos)])
-                            polyline.add_vertex(float(x_pos), float(y_pos))
-                            polyline.color = color
-                            polyline.set_colors()
-                        polylines.append(polyline)
-                for polyline in polylines:
-                    polyline.set_label(polylines.index(polyline))
-                self.controller.polyline_controller = polyline_controller.Controller(
-                                                                self.controller, 
-                                                                self.controller.view, 
-                                                                self.controller.background)
-                self.controller.polyline_controller.polylines = polylines
-                self.controller.polyline_controller.curr_pl = polylines[0]
+            # Loop over all the lines in the session
+            for line in session['polylines']:
+                if not line['vertices']:
+                    continue
+                polyline = polyline_model.Polyline(self.controller, self.controller.view.axes)
+                # Loop over all the vertices for each line
+                for v, (x_pos, y_pos) in enumerate(line['vertices']):
+                    if v != 0:
+                        prev_vertex = polyline.get_vertex(v-1)
+                        polyline.add_line([prev_vertex.get_xdata()[0], x_pos],
+                                          [prev_vertex.get_ydata()[0], y_pos])
+                    polyline.add_vertex(x_pos, y_pos)
+                    polyline.color = line['color']
+                    polyline.set_colors()
+                polylines.append(polyline)
+            for polyline in polylines:
+                polyline.set_label(polylines.index(polyline))
+            self.controller.polyline_controller = polyline_controller.Controller(
+                                                            self.controller, 
+                                                            self.controller.view, 
+                                                            self.controller.background)
+            self.controller.polyline_controller.polylines = polylines
+            self.controller.polyline_controller.curr_pl = polylines[0]
 
         # Set the zoom ratio and scrollbar positions
         pb.update("Loading zoom ratio and scrollbar positions")
-        screen = xml.SearchForTag(xml, "screen")
-        aspect = screen.getChildContent("aspect")
-        scrollbars = xml.SearchForTag(screen, "scrollbars")
-        scroll_x = scrollbars.getChildContent("x_pos")
-        scroll_y = scrollbars.getChildContent("y_pos")
+        aspect = session['aspect']
+        scroll_x, scroll_y = session['scroll']
 
         # Redraw and resize the screen
         pb.update("Resizing image")
-        self.controller.view.aspect = float(aspect)
-        self.controller.view.aspect_cb.SetValue(str(int(round(float(aspect)*100.0)))+'%')
-        self.controller.on_aspect(None, int(scroll_x), int(scroll_y))
-
+        self.controller.view.aspect = aspect
+        self.controller.view.aspect_cb.SetValue(str(int(round(aspect*100.0)))+'%')
+        self.controller.on_aspect(None, scroll_x, scroll_y)
+
+    def get_session(self):
+        """ Returns the state of the workspace as a session dictionary:
+
+            filename    - path of the DICOM file
+            aspect      - zoom factor
+            scroll      - (x, y) scrollbar positions, in pixels
+            rotations   - number of 90 degree rotations
+            calibration - None, or a dictionary of the calibration parameters
+                          and region ([x, y, dx, dy])
+            target_area - None, or [x, y, dx, dy]
+            polylines   - None, or a list of {name, color, vertices: [(x, y), ...]}
+        """
+        dc = self.controller
+        session = {'filename': dc.model.get_dicom_path(),
+                   'aspect': dc.view.aspect,
+                   'scroll': (dc.view.scroll.GetScrollPos(wx.HORIZONTAL), dc.view.scroll.GetScrollPos(wx.VERTICAL)),
+                   'rotations': dc.rotations,
+                   'calibration': None,
+                   'target_area': None,
+                   'polylines': None}
+
+        if dc.calibrate_controller:
+            calibrate = dc.calibrate_controller
+            calibration = {'region': dc.calib_region}
+            if calibrate.dw_grayscales is not None:
+                calibration.update({'min_thickness': calibrate.min_thickness,
+                                    'max_thickness': calibrate.max_thickness,
+                                    'dw_grayscales': calibrate.dw_grayscales,
+                                    'dw_linfit': calibrate.dw_linfit,
+                                    'dw_reldenfit': calibrate.dw_reldenfit,
+                                    'density': calibrate.density,
+                                    'pixels_per_unit': calibrate.pixels_per_unit,
+                                    'unit': calibrate.unit})
+            session['calibration'] = calibration
+
+        if dc.coral_controller:
+            session['target_area'] = dc.coral_slab
+
+        if dc.polyline_controller:
+            session['polylines'] = []
+            for polyline in dc.polyline_controller.polylines:
+                vertices = []
+                for vertex in polyline.verticies:
+                    x, = vertex.get_xdata()
+                    y, = vertex.get_ydata()
+                    vertices.append((x, y))
+                session['polylines'].append({'name': polyline.label.get_text(),
+                                             'color': polyline.get_color(),
+                                             'vertices': vertices})
+        return session
+
+    @profiler.timed('session save')
     def write(self):
         """ Write the contents of the workspace to an external XML file. """
 
         # Save the session to the given xml file (self.path)
         xml = xml_controller.Controller(self.path)
-        xml.create_session(self.controller)
+        xml.create_session(self.get_session())
 
         # No changes have occurred since saving
-        self.controller.changed = False
\ No newline at end of file
+        self.controller.changed = False
@@ -0,0 +1,106 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+import numpy as np
+
+# Native pixel values of the synthetic X-ray. Higher values are more dense.
+AIR = 400
+SLAB = 2200
+BAND_AMPLITUDE = 350
+AL_PER_MM = 500
+NOISE = 25
+
+def create_image(rows, cols, band_period=60, min_thickness=1.0, max_thickness=5.0, seed=0):
+    """ Creates the pixel data of a synthetic coral slab X-ray: a slab with
+    annual density bands (a sine wave along its growth axis, y) next to an
+    aluminum calibration wedge whose thickness increases linearly from
+    min_thickness at its top to max_thickness at its bottom.
+
+    @return - (pixels, info): the uint16 pixel array and a dictionary with
+              the slab's target area and wedge's calibration region
+              ([x, y, dx, dy]), the wedge thicknesses and polylines
+              ([(x, y), ...] vertex lists) running down the slab
+    """
+    random = np.random.RandomState(seed)
+    pixels = np.empty((rows, cols), dtype=np.double)
+    pixels.fill(AIR)
+
+    # Coral slab: the middle of the image, banded along y
+    margin = max(min(rows, cols) // 20, 4)
+    slab = [cols // 4, margin, cols - margin, rows - margin]
+    x, y, dx, dy = slab
+    bands = SLAB + BAND_AMPLITUDE * np.sin(2 * np.pi * np.arange(dy - y) / float(band_period))
+    pixels[y:dy, x:dx] = bands[:, np.newaxis]
+
+    # Aluminum wedge: a strip left of the slab, thickest at the bottom
+    wedge = [margin, margin, margin + max((cols // 4 - 2 * margin) // 2, 2), rows - margin]
+    x, y, dx, dy = wedge
+    thickness = np.linspace(min_thickness, max_thickness, dy - y)
+    pixels[y:dy, x:dx] = (AIR + AL_PER_MM * thickness)[:, np.newaxis]
+
+    pixels += random.normal(0, NOISE, pixels.shape)
+    np.clip(pixels, 0, 65535, pixels)
+
+    # Transects down the growth axis of the slab, two segments each
+    x, y, dx, dy = slab
+    polylines = []
+    for i in xrange(1, 4):
+        px = x + ((dx - x) * i) // 4
+        polylines.append([(px, y + margin), (px, (y + dy) // 2),
+                          (px + margin, (y + dy) // 2 + margin), (px + margin, dy - margin)])
+
+    info = {'target_area': slab,
+            'calibration_region': wedge,
+            'min_thickness': min_thickness,
+            'max_thickness': max_thickness,
+            'polylines': polylines}
+    return pixels.astype(np.uint16), info
+
+def write_dicom(path, pixels):
+    """ Writes the given uint16 pixel array to a DICOM file (Explicit VR
+    Little Endian, MONOCHROME2) that CXV can open.
+    """
+    import dicom
+    from dicom.dataset import Dataset, FileDataset
+
+    uid = '1.2.826.0.1.3680043.8.498.' + str(abs(hash(path)) % (10 ** 12))
+    file_meta = Dataset()
+    file_meta.add_new(0x00020002, 'UI', '1.2.840.10008.5.1.4.1.1.1') # CR Image Storage
+    file_meta.add_new(0x00020003, 'UI', uid)
+    file_meta.add_new(0x00020010, 'UI', '1.2.840.10008.1.2.1') # Explicit VR Little Endian
+    file_meta.add_new(0x00020012, 'UI', '1.2.826.0.1.3680043.8.498.1')
+
+    ds = FileDataset(path, {}, file_meta=file_meta, preamble='\0' * 128)
+    ds.is_little_endian = True
+    ds.is_implicit_VR = False
+    ds.add_new(0x00080016, 'UI', '1.2.840.10008.5.1.4.1.1.1') # SOP Class
+    ds.add_new(0x00080018, 'UI', uid) # SOP Instance
+    ds.add_new(0x00080060, 'CS', 'CR') # Modality
+    ds.add_new(0x00100010, 'PN', 'Synthetic^Coral')
+    ds.add_new(0x00100020, 'LO', 'CXV-BENCHMARK')
+    ds.add_new(0x00280002, 'US', 1) # Samples per Pixel
+    ds.add_new(0x00280004, 'CS', 'MONOCHROME2')
+    ds.add_new(0x00280010, 'US', pixels.shape[0]) # Rows
+    ds.add_new(0x00280011, 'US', pixels.shape[1]) # Columns
+    ds.add_new(0x00280100, 'US', 16) # Bits Allocated
+    ds.add_new(0x00280101, 'US', 16) # Bits Stored
+    ds.add_new(0x00280102, 'US', 15) # High Bit
+    ds.add_new(0x00280103, 'US', 0) # Pixel Representation (unsigned)
+    ds.add_new(0x7fe00010, 'OW', pixels.astype('<u2').tostring())
+    dicom.write_file(path, ds)
+
+def create_dicom(path, rows, cols, **kwargs):
+    """ Creates a synthetic coral slab DICOM file (see create_image()).
+
+    @return - the info dictionary of the image
+    """
+    pixels, info = create_image(rows, cols, **kwargs)
+    write_dicom(path, pixels)
+    return info
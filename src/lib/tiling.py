@@ -0,0 +1,88 @@
+#########################################################
+# CXV - Coral X-Ray Viewer
+#
+# @author:    Adam Childs
+# @contact:   adchilds@eckerd.edu
+#
+# @copyright: owned and maintained by the
+#             US Geological Survey (USGS),
+#             Department of Interior (DOI)
+#########################################################
+""" Tiled execution of the filter plugins, so the memory a filter works
+in is bounded by the tile size rather than the slab size.
+
+Each tile is filtered together with a halo of the pixels around it and
+only its inside is kept. For local filters (e.g. Sobel) the halo is the
+filter's radius. For frequency-domain filters the same scheme is
+overlap-save: the halo is the distance over which the filter's kernel
+has decayed below a tolerance, so the wrap-around of each tile's FFT
+only corrupts the part that's thrown away.
+"""
+from lib import profiler
+import numpy as np
+
+TILE_SIZE = 2048 # inside of a tile (pixels per side)
+
+def needs_tiling(shape, tile=TILE_SIZE):
+    """ Is the slab larger than a single tile? """
+    return shape[0] * shape[1] > tile * tile
+
+def get_halo(halo):
+    """ Returns the halo as (rows, columns) """
+    if isinstance(halo, (tuple, list)):
+        return int(halo[0]), int(halo[1])
+    return int(halo), int(halo)
+
+def iter_tiles(shape, halo, tile=TILE_SIZE):
+    """ Yields the (inside, outside) slices of every tile, where the
+    outside is the inside grown by the halo and clipped to the slab
+    """
+    rows, cols = shape
+    hy, hx = get_halo(halo)
+    for y0 in xrange(0, rows, tile):
+        y1 = min(y0 + tile, rows)
+        for x0 in xrange(0, cols, tile):
+            x1 = min(x0 + tile, cols)
+            inside = (slice(y0, y1), slice(x0, x1))
+            outside = (slice(max(y0 - hy, 0), min(y1 + hy, rows)),
+                       slice(max(x0 - hx, 0), min(x1 + hx, cols)))
+            yield inside, outside
+
+@profiler.timed('tiled filter')
+def apply(image, function, halo, tile=TILE_SIZE, out=None, dtype=np.double, progress=None):
+    """ Applies function to the image tile by tile.
+
+    The function is given one region of the image (a tile and its halo;
+    clipped at the image's edges, which the function sees as its own
+    edges) and must return an array of the region's shape.
+
+    @var image - 2D array, or anything that slices like one (e.g. a
+                 numpy.memmap); only one region of it is read at a time
+    @var halo - pixels (or (rows, columns)) of context the function needs
+                on each side of a tile
+    @var out - array to write the result to; allocated if None
+    @var progress - called with the fraction (0.0 - 1.0) done so far
+    @return - out
+    """
+    if out is None:
+        out = np.empty(image.shape[:2], dtype=dtype)
+    tiles = list(iter_tiles(image.shape[:2], halo, tile))
+    for i, (inside, outside) in enumerate(tiles):
+        result = function(np.asarray(image[outside]))
+        y = inside[0].start - outside[0].start
+        x = inside[1].start - outside[1].start
+        out[inside] = result[y:y + (inside[0].stop - inside[0].start),
+                             x:x + (inside[1].stop - inside[1].start)]
+        del result
+        profiler.count('filter tiles')
+        if progress is not None:
+            progress((i + 1) / float(len(tiles)))
+    return out
+
+def overlap_save(image, function, halo, tile=TILE_SIZE, out=None, dtype=np.double, progress=None):
+    """ Applies a frequency-domain filter to the image in blocks, using
+    overlap-save. The halo must cover the filter kernel's support (see
+    fast_fft.butterworth_halo()), and the filter's response must not
+    depend on the size of the block it's given.
+    """
+    return apply(image, function, halo, tile, out, dtype, progress)
@@ -8,16 +8,33 @@
 #             US Geological Survey (USGS),
 #             Department of Interior (DOI)
 #########################################################
+import time
+start = time.time() # before the (slow) imports below
+
 import wx
 from Controllers import dicom_controller
+from lib import profiler
+
+STARTUP_BUDGET = 2.0 # seconds from launch until the main window is usable
 
 class App(wx.App):
     """subclass of wx.App necessary for main event loop"""
     def onInit(self):
         return True
 
+def on_startup_finished():
+    """ Called once the event loop is idle, i.e. the main window is
+    shown and responsive. Records the startup time (shown in the debug
+    panel), counting startups that took longer than budgeted.
+    """
+    end = time.time()
+    profiler.record('startup', start, end)
+    if end - start > STARTUP_BUDGET:
+        profiler.count('startups over budget')
+
 if __name__ == '__main__':
     """Starts the main event loop for the app"""
     app = App(redirect=False)
     mainFrame = dicom_controller.Controller()
+    wx.CallAfter(on_startup_finished)
     app.MainLoop()
\ No newline at end of file
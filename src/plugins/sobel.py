@@ -1,75 +1,37 @@
 from yapsy.IPlugin import IPlugin
-import math
+from lib import fast_fft
+from lib import plugin_api
 import numpy as np
 import scipy.ndimage.filters as sp
-import wx
 
-class Filters(IPlugin):
+class Filters(IPlugin, plugin_api.Filter):
     """ Sobel filter """
 
-    def __init__(self):
-        pass
+    dtype = np.double
+    tileable = True
+    cost = 0.1 # seconds per megapixel
 
-    def initPlugin(self, overlay_controller, coral_slab, model, progress_bar, overlay, alphas=None):
-        self.overlay_controller = overlay_controller    # Overlay Controller
-        self.coral_slab = coral_slab                    # The coral slab we're filtering
-        self.model = model                              # The model (image)
-        self.pb = progress_bar                          # The progress bar to update
-        self.overlay_num = overlay                      # The overlay this filter is added to
-        self.alphas = alphas                            # The transparency of the filter (if not None, don't append!)
+    def get_params(self):
+        return {'cutoff': 25, 'order': 2}
 
-    def print_information(self):
-        print 'Running Sobel plugin...'
-        print '   Applying to overlay ' + str(self.overlay_num)
+    def get_halo(self, shape, params):
+        rows, cols = fast_fft.butterworth_halo(shape, params['cutoff'], params['order'])
+        return (rows + 1, cols + 1) # the highpass's kernel plus the Sobel's
 
-    def calc_filter(self):
-        """ Must provide an implementation for the run method """
-        if self.pb is not None:
-            wx.CallAfter(self.pb.update, 'Applying Sobel Filter to overlay ' + str(self.overlay_num))
-
-        iht, iwd = self.coral_slab.shape      
-  
-        #zero pad image to a power of 2 to speed up FFT
-        vpad = 2**(int(math.ceil(math.log(iht, 2))))
-        hpad = 2**(int(math.ceil(math.log(iwd, 2))))
-        fImg = np.zeros(shape=(vpad, hpad), dtype=np.double, order='C')
-        fImg[0:iht, 0:iwd] = self.coral_slab
-
-        #FFT
-        fImg = np.fft.fftshift(np.fft.fft2(fImg))
-
-        #find center row and column
-        cr = fImg.shape[0]/2
-        cc = fImg.shape[1]/2
-
-        #compute distance for every pixel from center
-        D = np.ones(shape=(vpad, hpad), dtype=np.double, order='C')
-        for row in range(iht):
-            for col in range(iwd):
-                D[row][col] = math.sqrt((col-cc)**2 + (row-cr)**2)
-        D[cr][cc] = 0.00000001  # avoid zero-division warning 
-
-        #Create the Butterworth, high-pass filter
-        Do = 25
-        p = 2
-        H = 1/(1 + (Do/D)**(2*p))
-
-        #Highpass filter the source image & strip off the zero-padded regions
-        fi = H*fImg
-        fi = np.fft.ifftshift(fi)
-        fi = np.abs(np.fft.ifft2(fi))
-        fi = fi[0:iht, 0:iwd]
+    def apply(self, region, params, shape):
+        """ Returns the (unnormalized) Sobel filter of the highpass
+        filtered region
+        """
+        # Butterworth highpass filter the slab (real-input FFT, padded to a fast length)
+        fi = fast_fft.butterworth_highpass(region, params['cutoff'], params['order'], reference_shape=shape)
 
         # SOBEL
-        ov2 = np.empty(shape=(iht, iwd), dtype=np.double, order='C')
-        sp.sobel(self.coral_slab-fi, output=ov2, mode='nearest')
-        ov2 = self.model.normalize_intensity(ov2)
-
-        # Create the overlay and append it to the list
-        self.overlay_controller.overlays.append(ov2)
-        
-        if self.alphas is None:
-            self.overlay_controller.alphas.append(0)
-
-        if self.pb is not None:
-            wx.CallAfter(self.pb.update, 'Completed Sobel Filter')
\ No newline at end of file
+        ov2 = np.empty(shape=region.shape, dtype=np.double, order='C')
+        sp.sobel(region-fi, output=ov2, mode='nearest')
+        return ov2
+
+    def finish(self, overlay, params):
+        """ Normalizes the whole overlay to 0.0 - 1.0 """
+        overlay -= overlay.min()
+        overlay /= overlay.max()
+        return overlay